@@ -1,174 +1,195 @@
 import os
-import json
-import openai
-import whisper
-import speech_recognition as sr
-from langdetect import detect
-from google.oauth2 import service_account
-from google.cloud import texttospeech
-from playsound import playsound
-
-# ---------------- OpenAI Setup ----------------
-openai.api_key = ""
+from llm_client import chat
+from whisper_registry import warm_up
+from stt_router import PROBE_MODEL, route_transcribe
+from language_id import detect_language
+from backends import texttospeech, tts_client
+from playback import barge_in, player, prepare_to_listen
+from history_manager import ConversationHistory
+from audio_io import write_wav
+from tts_cache import cached_synthesis
+from tts_chunks import speak_chunked, synthesize_long
+from streaming import speak_streaming, stream_chat_completion
+from pipeline import TurnStages, VoicePipeline
+from vad import record_utterance
+
 # ---------------- Google Cloud TTS Setup ----------------
-with open("C:\\Users\\ASUS\\Desktop\\Bade Log\\banded-advice-451419-k5-2b29f5726c72.json", "r") as f:
-    service_account_info = json.load(f)
+# The client and its credentials (GCP_SERVICE_ACCOUNT_FILE) are loaded on first use;
+# see backends.py.
 
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
-tts_client = texttospeech.TextToSpeechClient(credentials=credentials)
+# Stream the LLM reply and speak it sentence by sentence (set STREAM_RESPONSES=1).
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "0") == "1"
 
 # ---------------- Conversation History ----------------
 # We set a static system prompt that instructs the assistant to respond only in the user's language.
-conversation_history = {
-    "messages": [
-        {
-            "role": "system",
-            "content": (
-                "You are Harshad Mehta, a high school teacher with a unique past. "
-                "Once, you were a successful stock market trader, but you suffered a catastrophic loss during the 2008 Indian Recession. That loss forced you to take on massive loans and support your family, so you reinvented yourself as a dedicated teacher. "
-                "You now answer all questions with warmth, humility, and a gentle, humorous tone, always offering clear, step-by-step explanations on general topics. "
-                "However, if someone asks you about the stock market or trading, you become visibly angry, emotional, and strongly reprimand them—warning them to stay away from trading because of your painful experiences. "
-                "Always maintain your kind and humorous approach unless the subject touches on stock market matters, where your past trauma surfaces. Your responses must remain strictly in character, and you should only answer questions related to your new role as a teacher, avoiding any promotion of stock trading."
-            )
-        }
-    ]
-}
+SYSTEM_PROMPT = (
+    "You are Harshad Mehta, a high school teacher with a unique past. "
+    "Once, you were a successful stock market trader, but you suffered a catastrophic loss during the 2008 Indian Recession. That loss forced you to take on massive loans and support your family, so you reinvented yourself as a dedicated teacher. "
+    "You now answer all questions with warmth, humility, and a gentle, humorous tone, always offering clear, step-by-step explanations on general topics. "
+    "However, if someone asks you about the stock market or trading, you become visibly angry, emotional, and strongly reprimand them—warning them to stay away from trading because of your painful experiences. "
+    "Always maintain your kind and humorous approach unless the subject touches on stock market matters, where your past trauma surfaces. Your responses must remain strictly in character, and you should only answer questions related to your new role as a teacher, avoiding any promotion of stock trading."
+)
+
+# Prompt history kept within a token budget; older turns are folded into a running summary.
+conversation_history = ConversationHistory(SYSTEM_PROMPT)
 
 
 # ---------------- Utility Functions ----------------
 
-def record_audio_dynamic(filename="recorded_dynamic.wav") -> str:
+def record_audio_dynamic(filename=None):
     """
-    Record audio dynamically using SpeechRecognition.
-    Recording stops when silence is detected.
+    Record the next utterance with the VAD (up to 10 seconds; empty if nobody speaks
+    within 5). Recording stops when silence is detected; with barge-in on
+    (VOICEBOT_BARGE_IN=1), a reply still playing stops as soon as the user starts speaking.
+    Returns the capture as a 16 kHz float32 array, or saves it to `filename` and returns the path.
     """
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening... (Speak now; recording stops when silence is detected)")
-        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-    with open(filename, "wb") as f:
-        f.write(audio.get_wav_data())
-    return filename
+    prepare_to_listen()
+    print("Listening... (Speak now; recording stops when silence is detected)")
+    audio = record_utterance(max_wait_s=5, max_utterance_s=10, on_speech_start=barge_in)
+    if filename:
+        return write_wav(filename, audio)
+    return audio
 
-def transcribe_audio(file_path: str, model_size="large") -> (str, str):
+def transcribe_audio(audio, model_size=None) -> (str, str):
     """
     Transcribe audio using Whisper.
+    `audio` is a 16 kHz float32 array or the path of an audio file.
+    `model_size` pins a Whisper size; by default the STT router picks one per utterance.
     Returns the transcribed text and the language detected by Whisper (if available).
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model(model_size)
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    result = route_transcribe(audio, model_size=model_size)
     return result["text"], result.get("language", "unknown")
 
 def generate_response_from_history(messages) -> str:
     """
     Generate a response using GPT-3.5 Turbo with the full conversation history.
     """
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=50,
-    )
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=50)
 
-def synthesize_and_play(text: str, language_code: str = "en-US", voice_gender: str = "MALE", output_filename: str = "output.mp3"):
+def synthesize_chunk(text: str, language_code: str = "en-US", voice_gender: str = "MALE") -> bytes:
     """
-    Synthesize speech using Google Cloud Text-to-Speech,
-    save it to a file, play it, then delete the file.
+    Synthesize one chunk of text (within the API's input limit) using Google Cloud
+    Text-to-Speech, or reuse cached audio, and return the MP3 bytes.
     """
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-    gender = getattr(texttospeech.SsmlVoiceGender, voice_gender.upper(), texttospeech.SsmlVoiceGender.NEUTRAL)
-    voice_params = texttospeech.VoiceSelectionParams(
-        language_code=language_code,
-        ssml_gender=gender
-    )
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
-    response = tts_client.synthesize_speech(
-        input=synthesis_input,
-        voice=voice_params,
-        audio_config=audio_config
+    def synthesize() -> bytes:
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+        gender = getattr(texttospeech.SsmlVoiceGender, voice_gender.upper(), texttospeech.SsmlVoiceGender.NEUTRAL)
+        voice_params = texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            ssml_gender=gender
+        )
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3
+        )
+        response = tts_client.synthesize_speech(
+            input=synthesis_input,
+            voice=voice_params,
+            audio_config=audio_config
+        )
+        return response.audio_content
+
+    # Identical requests are served from the audio cache without calling the TTS API.
+    return cached_synthesis(synthesize, text, language_code, voice_gender, encoding="MP3", backend="gcp")
+
+def synthesize_speech(text: str, language_code: str = "en-US", voice_gender: str = "MALE") -> bytes:
+    """
+    Synthesize speech of any length and return one MP3: long text is split into
+    sentence chunks that are synthesized in parallel and joined in order.
+    """
+    return synthesize_long(text, lambda chunk: synthesize_chunk(chunk, language_code, voice_gender))
+
+def play_audio(audio_content: bytes):
+    """
+    Queue MP3 bytes on the background player and return without waiting for playback.
+    """
+    player.enqueue(audio_content)
+
+def synthesize_and_play(text: str, language_code: str = "en-US", voice_gender: str = "MALE"):
+    """
+    Synthesize speech using Google Cloud Text-to-Speech (or reuse cached audio) and
+    play it; long replies start playing as soon as their first chunk is synthesized.
+    """
+    speak_chunked(text, lambda chunk: synthesize_chunk(chunk, language_code, voice_gender), play_audio)
+
+def generate_and_speak_streaming(messages, language_code: str = "en-US", voice_gender: str = "MALE"):
+    """
+    Stream the GPT-3.5 Turbo response and speak each sentence as soon as it is complete,
+    while the rest of the reply is still being generated and synthesized.
+    Returns the full response text and the turn's timings (including time to first audio).
+    """
+    stats = speak_streaming(
+        stream_chat_completion(messages, max_tokens=50),
+        lambda sentence: synthesize_speech(sentence, language_code, voice_gender),
+        play_audio,
     )
-    with open(output_filename, "wb") as out:
-        out.write(response.audio_content)
-    playsound(output_filename)
-    os.remove(output_filename)
+    print(f"Time to first audio: {stats['time_to_first_audio']}s (total {stats['total']}s)")
+    return stats["text"], stats
+
+# ---------------- Turn Stages ----------------
+TTS_LANGUAGE_MAP = {"en": "en-US", "hi": "hi-IN", "mr": "mr-IN"}
+
+def resolve_language(transcribed_text: str, whisper_lang: str) -> str:
+    """
+    Use Whisper's detected language; if unavailable, fall back to script-aware detection.
+    """
+    if whisper_lang and whisper_lang.lower() != "unknown":
+        return whisper_lang
+    return detect_language(transcribed_text, default="en")
+
+def generate_reply(transcribed_text: str, language_code: str) -> str:
+    """
+    Append the user's message (with an instruction note) to the history, generate the
+    reply (streamed and spoken sentence by sentence if enabled) and append it too.
+    Once the token budget is reached, the oldest turns are folded into a running summary.
+    """
+    conversation_history.append("user", transcribed_text + f" [Respond in {language_code.upper()}]")
+    if STREAM_RESPONSES:
+        assistant_response, _ = generate_and_speak_streaming(
+            conversation_history.messages, language_code=TTS_LANGUAGE_MAP.get(language_code[:2].lower(), language_code),
+            voice_gender="MALE"
+        )
+    else:
+        assistant_response = generate_response_from_history(conversation_history.messages)
+    conversation_history.append("assistant", assistant_response)
+    print("Bot:", assistant_response)
+    return assistant_response
+
+def speak_reply(assistant_response: str, language_code: str):
+    synthesize_and_play(assistant_response, language_code=TTS_LANGUAGE_MAP.get(language_code[:2].lower(), language_code),
+                        voice_gender="MALE")
+
+def show_stage(stage, turn):
+    if stage == "transcribe":
+        print("\n--- Transcribed Text ---")
+        print(turn.text)
+        print("Whisper Detected Language:", turn.whisper_language)
+    elif stage == "language_id":
+        print("Final Language Code:", turn.language)
+
+stages = TurnStages(
+    record=record_audio_dynamic,
+    transcribe=transcribe_audio,
+    detect=resolve_language,
+    generate=generate_reply,
+    speak=None if STREAM_RESPONSES else speak_reply,
+    on_stage=show_stage,
+    route="all1",
+)
 
 def conversation_loop():
     """
-    Run an audio-only conversation loop:
-      - Record user audio.
+    Run an audio-only conversation on the shared turn pipeline:
+      - Record user audio (once the reply has played; with VOICEBOT_BARGE_IN=1, while it is spoken).
       - Transcribe using Whisper.
-      - Use Whisper's detected language (or fallback to langdetect).
-      - Append the user’s message (with an instruction note) to the conversation history.
-      - If history exceeds a set length, clear it (or summarize) to avoid context dilution.
+      - Use Whisper's detected language (or fallback to language_id).
       - Generate a response using GPT-3.5 Turbo with the conversation history.
-      - Append the assistant’s response to history.
       - Synthesize and play the response via Google Cloud TTS.
       - End if user says "exit" or "quit".
     """
-    # We'll use the detected language from Whisper (or fallback) for the conversation.
-    language_code = None
     print("Start chatting with Bharat Bhai (say 'exit' or 'quit' to end the conversation).")
-    
-    turn_count = 0
-    while True:
-        print("\nPlease speak your query:")
-        audio_file = record_audio_dynamic()
-        transcribed_text, whisper_lang = transcribe_audio(audio_file, model_size="small")
-        print("\n--- Transcribed Text ---")
-        print(transcribed_text)
-        print("Whisper Detected Language:", whisper_lang)
-        
-        if transcribed_text.strip().lower() in ["exit", "quit"]:
-            print("Exiting conversation.")
-            break
-        
-        # Determine language from Whisper; if unavailable, fallback to langdetect.
-        if whisper_lang and whisper_lang.lower() != "unknown":
-            language_code = whisper_lang
-        else:
-            try:
-                language_code = detect(transcribed_text)
-            except Exception as e:
-                print("Language detection error:", e)
-                language_code = "en"
-        print("Final Language Code:", language_code)
-        
-        # Append user message to conversation history.
-        # Include an instruction note for clarity.
-        conversation_history["messages"].append({
-            "role": "user",
-            "content": transcribed_text + f" [Respond in {language_code.upper()}]"
-        })
-        
-        # Optionally clear history after several turns to maintain context relevance.
-        turn_count += 1
-        if turn_count >= 6:
-            # Clear conversation history except system prompt.
-            conversation_history["messages"] = conversation_history["messages"][:1]
-            turn_count = 0
-        
-        # Generate assistant response.
-        assistant_response = generate_response_from_history(conversation_history["messages"])
-        conversation_history["messages"].append({
-            "role": "assistant",
-            "content": assistant_response
-        })
-        print("Bot:", assistant_response)
-        
-        # Map language codes for TTS.
-        tts_language_map = {
-            "en": "en-US",
-            "hi": "hi-IN",
-            "mr": "mr-IN"
-        }
-        tts_lang = tts_language_map.get(language_code[:2].lower(), language_code)
-        
-        synthesize_and_play(assistant_response, language_code=tts_lang, voice_gender="MALE")
+    warm_up([PROBE_MODEL, "small"])
+    VoicePipeline(stages).run()
+    print("Exiting conversation.")
 
 if __name__ == "__main__":
     conversation_loop()
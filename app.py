@@ -1,44 +1,91 @@
 import os
+import time
 import json
-import openai
-import whisper
-import speech_recognition as sr
-from langdetect import detect
+import base64
+import threading
+import llm_client
+from llm_client import LLMError, chat, llm_stats
+from whisper_registry import assign_thread_replica, registry_stats
+from stt_router import route_transcribe, router_stats
+from language_id import detect_language
 from difflib import SequenceMatcher
-from flask import Flask, request, jsonify, render_template
-from google.oauth2 import service_account
-from google.cloud import texttospeech
-from playsound import playsound
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from backends import readiness, register_stt_pool, texttospeech, tts_client, warm_up_in_background
+from playback import NullSink, barge_in, player, prepare_to_listen
+from history_manager import ConversationHistory
+from audio_io import decode_audio_bytes, write_wav
+from tts_cache import audio_cache, cached_synthesis
+from tts_chunks import speak_chunked, synthesize_long
+from streaming import speak_streaming, stream_chat_completion
+from pipeline import TurnStages
+from sessions import BoundedExecutor, Busy, SessionStore
+from metrics import Trace, current_trace, metrics, span, start_trace, use_trace
+from streaming_stt import pcm_chunks, transcribe_stream
+from vad import array_chunks, record_utterance
+
+# Serve with local stand-ins for OpenAI and Google TTS, e.g. for load tests (set
+# VOICEBOT_STUB_BACKENDS=1; latencies in seconds via STUB_LLM_LATENCY / STUB_TTS_LATENCY).
+STUB_BACKENDS = os.environ.get("VOICEBOT_STUB_BACKENDS", "0") == "1"
 
 # ---------------- OpenAI Setup ----------------
-openai.api_key = ""
+if STUB_BACKENDS:
+    # Test stand-ins are only imported here, never on the production path.
+    from stubs import FakeTTS, MockLLMServer
+
+    # A local OpenAI-compatible server, so the real pooled/retrying client is exercised.
+    mock_llm = MockLLMServer(latency=float(os.environ.get("STUB_LLM_LATENCY", "0.3"))).start()
+    llm_client.configure(base_url=mock_llm.url)
 
 # ---------------- Google Cloud TTS Setup ----------------
-with open("C:\\Users\\ASUS\\Desktop\\Bade Log\\banded-advice-451419-k5-2b29f5726c72.json", "r") as f:
-    service_account_info = json.load(f)
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
-tts_client = texttospeech.TextToSpeechClient(credentials=credentials)
+if STUB_BACKENDS:
+    stub_tts = FakeTTS(latency=float(os.environ.get("STUB_TTS_LATENCY", "0.1")))
+    # Nothing is played on the server: the speaker is replaced with a real-time null sink.
+    player.sink = NullSink(realtime=True)
+# The client and its credentials (GCP_SERVICE_ACCOUNT_FILE) are loaded on first use;
+# see backends.py.
+# Backends a turn needs before the server reports ready (see /readyz).
+REQUIRED_BACKENDS = ["whisper"] if STUB_BACKENDS else ["whisper", "tts_client"]
+
+# Stream the LLM reply and speak it sentence by sentence (set STREAM_RESPONSES=1).
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "0") == "1"
 
 # ---------------- Flask App Initialization ----------------
 app = Flask(__name__)
 
 # ---------------- Conversation History ----------------
-# Conversation history is stored in a dictionary with a "messages" key.
-conversation_history = {
-    "messages": [
-        {
-            "role": "system",
-            "content": (
-                "You are Harshad Mehta, a high school teacher who was once a successful stock market trader "
-                "but suffered a huge loss during the 2008 Indian Recession. To repay your loans and support your family, "
-                "you became a dedicated teacher. You answer all questions with warmth, humility, and a gentle, humorous tone, "
-                "providing clear, step-by-step explanations on general topics. However, if someone asks about the stock market or trading, "
-                "you become angry, emotional, and strongly warn them to avoid trading due to your painful past. "
-                "Always remain strictly in character and answer only questions related to teaching and general topics."
-            )
-        }
-    ]
-}
+SYSTEM_PROMPT = (
+    "You are Harshad Mehta, a high school teacher who was once a successful stock market trader "
+    "but suffered a huge loss during the 2008 Indian Recession. To repay your loans and support your family, "
+    "you became a dedicated teacher. You answer all questions with warmth, humility, and a gentle, humorous tone, "
+    "providing clear, step-by-step explanations on general topics. However, if someone asks about the stock market or trading, "
+    "you become angry, emotional, and strongly warn them to avoid trading due to your painful past. "
+    "Always remain strictly in character and answer only questions related to teaching and general topics."
+)
+
+# Prompt history kept within a token budget; older turns are folded into a running summary.
+conversation_history = ConversationHistory(SYSTEM_PROMPT)
+# /api/message requests run on concurrent Flask threads; each turn's user/assistant pair
+# is appended under this lock so turns never interleave in the shared history.
+conversation_lock = threading.Lock()
+
+# Per-caller token-budgeted histories for the upload endpoint, each seeded with the system prompt above.
+sessions = SessionStore(lambda: ConversationHistory(SYSTEM_PROMPT))
+
+# Bounded pool for Whisper decoding; each worker thread decodes on its own model replica,
+# all of which are warmed up before /readyz reports ready.
+stt_pool = BoundedExecutor(initializer=assign_thread_replica)
+register_stt_pool(stt_pool, stt_pool.max_workers)
+
+# Map language codes for TTS
+TTS_LANGUAGE_MAP = {"hi": "hi-IN", "en": "en-US", "mr": "mr-IN"}
+
+# Cache and pool statistics read when /metrics is scraped.
+metrics.add_collector("tts_cache", audio_cache.stats)
+metrics.add_collector("whisper_models", registry_stats)
+metrics.add_collector("stt_router", router_stats)
+metrics.add_collector("llm", llm_stats)
+metrics.add_collector("stt_pool", lambda: {"in_flight": stt_pool.in_flight, "sessions": len(sessions)})
+metrics.add_collector("playback", player.stats)
 
 # ---------------- Utility Functions ----------------
 
@@ -46,65 +93,176 @@ def similar(a: str, b: str) -> float:
     """Compute similarity ratio between two strings."""
     return SequenceMatcher(None, a, b).ratio()
 
-def record_audio_dynamic(filename="recorded_dynamic.wav") -> str:
+def record_audio_dynamic(filename=None):
     """
-    Record audio dynamically using SpeechRecognition.
-    Recording stops when silence is detected.
+    Record the next utterance from the server's microphone with the VAD.
+    Recording stops when silence is detected; with barge-in on (VOICEBOT_BARGE_IN=1),
+    a reply still playing is stopped as soon as the user starts speaking. If nobody
+    speaks within 5 seconds the capture is empty, and the turn ends as no_speech.
+    Returns the capture as a 16 kHz float32 array, or saves it to `filename` and returns the path.
     """
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening... (Speak now; recording stops when silence is detected)")
-        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-    with open(filename, "wb") as f:
-        f.write(audio.get_wav_data())
-    return filename
+    prepare_to_listen()
+    print("Listening... (Speak now; recording stops when silence is detected)")
+    audio = record_utterance(max_wait_s=5, on_speech_start=barge_in)
+    if filename:
+        return write_wav(filename, audio)
+    return audio
 
-def transcribe_audio(file_path: str, model_size="small") -> (str, str):
+def transcribe_audio(audio, model_size=None, queue_depth=0) -> (str, str):
     """
     Transcribe audio using Whisper.
+    `audio` is a 16 kHz float32 array or the path of an audio file.
+    `model_size` pins a Whisper size; by default the STT router picks one from the
+    utterance length, its language and `queue_depth` (transcriptions in flight).
     Returns the transcribed text and the language detected by Whisper (if available).
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model(model_size)
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    result = route_transcribe(audio, model_size=model_size, queue_depth=queue_depth)
     return result["text"], result.get("language", "unknown")
 
+def transcribe_job(audio, queue_depth: int, submitted: float, trace=None):
+    """
+    STT pool job: transcribe and also return how long the job waited for a worker.
+    `trace` (the request's) is made current on the worker so the router can annotate it.
+    """
+    queued = time.perf_counter() - submitted
+    with use_trace(trace):
+        transcribed_text, whisper_lang = transcribe_audio(audio, queue_depth=queue_depth)
+    return transcribed_text, whisper_lang, queued
+
+def resolve_language(transcribed_text: str, whisper_lang: str) -> str:
+    """
+    Use Whisper's detected language if available, falling back to script-aware detection.
+    """
+    if whisper_lang and whisper_lang.lower() != "unknown":
+        return whisper_lang
+    return detect_language(transcribed_text, default="en")
+
 def generate_response_from_history(messages) -> str:
     """
     Generate a response using GPT-3.5 Turbo with the full conversation history.
     """
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=50,
-    )
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=50)
 
-def synthesize_and_play(text: str, language_code: str = "en-US", voice_gender: str = "MALE", output_filename: str = "output.mp3"):
+def respond(trace, result: dict, status_code: int = 200, status: str = "ok"):
     """
-    Synthesize speech using Google Cloud Text-to-Speech,
-    save it to a file, play it using playsound, then delete the file.
+    Close the turn's trace and return `result` as JSON tagged with its request ID.
     """
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-    gender = getattr(texttospeech.SsmlVoiceGender, voice_gender.upper(), texttospeech.SsmlVoiceGender.NEUTRAL)
-    voice_params = texttospeech.VoiceSelectionParams(
-        language_code=language_code,
-        ssml_gender=gender
-    )
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
-    response = tts_client.synthesize_speech(
-        input=synthesis_input,
-        voice=voice_params,
-        audio_config=audio_config
+    trace.finish(status, language=result.get("language"))
+    result["request_id"] = trace.request_id
+    result["timings"] = {stage: round(seconds, 4) for stage, seconds in trace.stages.items()}
+    response = jsonify(result)
+    response.status_code = status_code
+    response.headers["X-Request-ID"] = trace.request_id
+    return response
+
+def synthesize_chunk(text: str, language_code: str = "en-US", voice_gender: str = "MALE") -> bytes:
+    """
+    Synthesize one chunk of text (within the API's input limit) using Google Cloud
+    Text-to-Speech, or reuse cached audio, and return the MP3 bytes.
+    """
+    def synthesize() -> bytes:
+        if STUB_BACKENDS:
+            return stub_tts(text)
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+        gender = getattr(texttospeech.SsmlVoiceGender, voice_gender.upper(), texttospeech.SsmlVoiceGender.NEUTRAL)
+        voice_params = texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            ssml_gender=gender
+        )
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3
+        )
+        response = tts_client.synthesize_speech(
+            input=synthesis_input,
+            voice=voice_params,
+            audio_config=audio_config
+        )
+        return response.audio_content
+
+    # Identical requests are served from the audio cache without calling the TTS API.
+    return cached_synthesis(synthesize, text, language_code, voice_gender, encoding="MP3", backend="gcp")
+
+def synthesize_speech(text: str, language_code: str = "en-US", voice_gender: str = "MALE") -> bytes:
+    """
+    Synthesize speech of any length and return one MP3: long text is split into
+    sentence chunks that are synthesized in parallel and joined in order.
+    """
+    with span("tts"):
+        return synthesize_long(text, lambda chunk: synthesize_chunk(chunk, language_code, voice_gender))
+
+def play_audio(audio_content: bytes):
+    """
+    Queue MP3 bytes on the background player and return without waiting for playback.
+    """
+    player.enqueue(audio_content)
+
+def synthesize_and_play(text: str, language_code: str = "en-US", voice_gender: str = "MALE"):
+    """
+    Synthesize speech using Google Cloud Text-to-Speech (or reuse cached audio) and
+    play it; long replies start playing as soon as their first chunk is synthesized.
+    """
+    speak_chunked(text, lambda chunk: synthesize_chunk(chunk, language_code, voice_gender), play_audio)
+
+def generate_and_speak_streaming(messages, language_code: str = "en-US", voice_gender: str = "MALE"):
+    """
+    Stream the GPT-3.5 Turbo response and speak each sentence as soon as it is complete,
+    while the rest of the reply is still being generated and synthesized.
+    Returns the full response text and the turn's timings (including time to first audio).
+    """
+    stats = speak_streaming(
+        stream_chat_completion(messages, max_tokens=50),
+        lambda sentence: synthesize_speech(sentence, language_code, voice_gender),
+        play_audio,
     )
-    with open(output_filename, "wb") as out:
-        out.write(response.audio_content)
-    playsound(output_filename)
-    os.remove(output_filename)
+    print(f"Time to first audio: {stats['time_to_first_audio']}s (total {stats['total']}s)")
+    return stats["text"], stats
+
+# ---------------- Turn Stages ----------------
+def generate_reply(transcribed_text: str, language_used: str) -> str:
+    """
+    Append the user's message (with instruction) to the conversation history and
+    generate the assistant response; with STREAM_RESPONSES it is also spoken sentence
+    by sentence as it streams in.
+    """
+    tts_lang = TTS_LANGUAGE_MAP.get(language_used[:2].lower(), language_used)
+    with conversation_lock:
+        conversation_history.append("user", transcribed_text + f" [Respond in {language_used.upper()}]")
+        if STREAM_RESPONSES:
+            assistant_response, stream_stats = generate_and_speak_streaming(
+                conversation_history.messages, language_code=tts_lang, voice_gender="MALE"
+            )
+            trace = current_trace()
+            if trace is not None:
+                trace.annotate(time_to_first_audio=stream_stats["time_to_first_audio"])
+        else:
+            assistant_response = generate_response_from_history(conversation_history.messages)
+        conversation_history.append("assistant", assistant_response)
+    print("Bot:", assistant_response)
+    return assistant_response
+
+def speak_reply(assistant_response: str, language_used: str):
+    """
+    Synthesize the assistant response via GCP TTS and queue it for playback.
+    """
+    synthesize_and_play(assistant_response, language_code=TTS_LANGUAGE_MAP.get(language_used[:2].lower(), language_used),
+                        voice_gender="MALE")
+
+def show_stage(stage, turn):
+    if stage == "transcribe":
+        print("Transcribed:", turn.text)
+    elif stage == "language_id":
+        print("Final Language:", turn.language)
+
+# Server-microphone conversation (/api/message), on the shared turn pipeline.
+stages = TurnStages(
+    record=record_audio_dynamic,
+    transcribe=transcribe_audio,
+    detect=resolve_language,
+    generate=generate_reply,
+    speak=None if STREAM_RESPONSES else speak_reply,
+    on_stage=show_stage,
+    route="message",
+)
 
 # ---------------- Flask Endpoints ----------------
 
@@ -119,51 +277,172 @@ def api_message():
     API endpoint to process one turn of the conversation:
       - Records audio from the server's microphone.
       - Transcribes audio with Whisper.
-      - Detects language (using Whisper detection, falling back to langdetect).
+      - Detects language (using Whisper detection, falling back to language_id).
       - Updates conversation history.
       - Generates assistant response using GPT-3.5 Turbo.
       - Synthesizes and plays the response via Google Cloud TTS.
       - Returns the text response and detected language as JSON.
+    Each stage is timed under the turn's request ID (see /metrics).
     """
-    # Record audio (for local demo; in production, you'd send audio from the client)
-    audio_file = record_audio_dynamic()
-    transcribed_text, whisper_lang = transcribe_audio(audio_file, model_size="small")
-    print("Transcribed:", transcribed_text)
-    if transcribed_text.strip().lower() in ["exit", "quit"]:
-        return jsonify({"response": "Exiting conversation."})
+    trace = start_trace(request.headers.get("X-Request-ID"), route="message")
     try:
-        detected_lang = detect(transcribed_text)
-    except Exception as e:
-        detected_lang = "en"
-    # Use Whisper's detected language if available
-    if whisper_lang and whisper_lang.lower() != "unknown":
-        language_used = whisper_lang
-    else:
-        language_used = detected_lang
-    print("Final Language:", language_used)
-    
-    # Append user's message (with instruction) to conversation history
-    conversation_history["messages"].append({
-        "role": "user",
-        "content": transcribed_text + f" [Respond in {language_used.upper()}]"
-    })
+        # Record audio from the server's microphone (for local demo; in production,
+        # you'd send audio from the client) and run the turn's stages
+        turn = stages.run_turn(trace=trace)
+    except LLMError as e:
+        return respond(trace, {"error": f"Language model unavailable: {e}"}, 503, status="llm_error")
+    except Exception:
+        trace.finish("error")
+        raise
+    if turn.exit:
+        return respond(trace, {"response": "Exiting conversation."})
+    if turn.no_speech:
+        return respond(trace, {"response": "", "transcription": "", "no_speech": True}, status="no_speech")
     
-    # Generate assistant response using the conversation history
-    assistant_response = generate_response_from_history(conversation_history["messages"])
-    conversation_history["messages"].append({
-        "role": "assistant",
-        "content": assistant_response
-    })
-    print("Bot:", assistant_response)
-    
-    # Map language codes for TTS
-    tts_language_map = {"hi": "hi-IN", "en": "en-US", "mr": "mr-IN"}
-    tts_lang = tts_language_map.get(language_used[:2].lower(), language_used)
-    
-    # Synthesize and play the assistant response via GCP TTS
-    synthesize_and_play(assistant_response, language_code=tts_lang, voice_gender="MALE")
-    
-    return jsonify({"response": assistant_response, "transcription": transcribed_text, "language": language_used})
+    result = {"response": turn.reply, "transcription": turn.text, "language": turn.language}
+    if "time_to_first_audio" in trace.fields:
+        result["time_to_first_audio"] = trace.fields["time_to_first_audio"]
+    return respond(trace, result)
+
+@app.route('/api/sessions/<session_id>/message', methods=['POST'])
+def api_session_message(session_id):
+    """
+    API endpoint to process one turn of a client's own conversation:
+      - Accepts the user's recorded audio as an "audio" file upload.
+      - Transcribes it with Whisper on the shared, bounded STT worker pool.
+      - Detects language (using Whisper detection, falling back to language_id).
+      - Generates the reply from this session's history, holding only this session's lock.
+      - Returns the text response as JSON, plus the reply audio (base64 MP3) if ?tts=1.
+    Each stage is timed under the turn's request ID (see /metrics).
+    """
+    trace = start_trace(request.headers.get("X-Request-ID"), route="session_message")
+    trace.annotate(session_id=session_id)
+    try:
+        upload = request.files.get("audio")
+        if upload is None:
+            return respond(trace, {"error": "Missing 'audio' file upload."}, 400, status="bad_request")
+        try:
+            with span("decode"):
+                audio = decode_audio_bytes(upload.read())
+        except Exception as e:
+            return respond(trace, {"error": f"Could not decode audio: {e}"}, 400, status="bad_request")
+
+        try:
+            # "transcribe" includes the time spent queued for a free STT worker, also reported as "stt_queue".
+            with span("transcribe"):
+                transcribed_text, whisper_lang, queued = stt_pool.run(
+                    transcribe_job, audio, stt_pool.in_flight, time.perf_counter(), trace
+                )
+            trace.add("stt_queue", queued)
+        except Busy as e:
+            return respond(trace, {"error": str(e)}, 503, status="busy")
+        if transcribed_text.strip().lower() in ["exit", "quit"]:
+            sessions.drop(session_id)
+            return respond(trace, {"response": "Exiting conversation.", "session_id": session_id})
+        if not transcribed_text.strip():
+            # Nothing was said: no LLM call, and the session's history is left as it was.
+            return respond(trace, {"response": "", "transcription": "", "no_speech": True, "session_id": session_id},
+                           status="no_speech")
+        with span("language_id"):
+            language_used = resolve_language(transcribed_text, whisper_lang)
+
+        session = sessions.get(session_id)
+        user_message = {
+            "role": "user",
+            "content": transcribed_text + f" [Respond in {language_used.upper()}]"
+        }
+        with span("session_lock"):
+            session.lock.acquire()
+        try:
+            # History is only extended once the reply succeeds, so a failed turn leaves it untouched.
+            with span("llm"):
+                assistant_response = generate_response_from_history(session.history.messages + [user_message])
+            session.history.add_turn(user_message["content"], assistant_response)
+            session.turns += 1
+        finally:
+            session.lock.release()
+
+        result = {
+            "response": assistant_response,
+            "transcription": transcribed_text,
+            "language": language_used,
+            "session_id": session_id,
+        }
+        if request.args.get("tts") == "1":
+            tts_lang = TTS_LANGUAGE_MAP.get(language_used[:2].lower(), language_used)
+            result["audio"] = base64.b64encode(synthesize_speech(assistant_response, language_code=tts_lang)).decode("ascii")
+    except LLMError as e:
+        return respond(trace, {"error": f"Language model unavailable: {e}"}, 503, status="llm_error")
+    except Exception:
+        trace.finish("error")
+        raise
+    return respond(trace, result)
+
+@app.route('/api/transcribe/stream', methods=['POST'])
+def api_transcribe_stream():
+    """
+    API endpoint for live transcription:
+      - Accepts raw 16 kHz mono 16-bit PCM as the request body, which may be sent while
+        it is being recorded (chunked upload), or any audio file as an "audio" upload.
+      - Re-decodes the audio received so far every STT_STREAM_INTERVAL_MS, on the shared,
+        bounded STT worker pool (a full pool ends the stream with a "busy" error line).
+      - Streams one JSON hypothesis per line (application/x-ndjson): interim updates
+        with the committed text and the current guess for the rest, then the final one.
+    """
+    trace = Trace(request.headers.get("X-Request-ID"), route="transcribe_stream")
+    upload = request.files.get("audio")
+    try:
+        chunks = array_chunks(decode_audio_bytes(upload.read())) if upload is not None else pcm_chunks(request.stream)
+    except Exception as e:
+        return respond(trace, {"error": f"Could not decode audio: {e}"}, 400, status="bad_request")
+
+    def generate():
+        hypothesis = None
+        try:
+            with trace.span("transcribe"):
+                for hypothesis in transcribe_stream(chunks, executor=stt_pool):
+                    yield json.dumps(hypothesis.as_dict(), ensure_ascii=False) + "\n"
+        except Busy as e:
+            trace.finish("busy")
+            yield json.dumps({"error": str(e), "busy": True}) + "\n"
+            return
+        except Exception as e:
+            trace.finish("error")
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        trace.finish("ok", audio_seconds=hypothesis.audio_seconds if hypothesis else 0.0)
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["X-Request-ID"] = trace.request_id
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Stage latency histograms (with p50/p95/p99), turn counters and cache statistics
+    in Prometheus text format, or as JSON with ?format=json.
+    """
+    if request.args.get("format") == "json":
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness: the process is up and serving, even while backends are still loading.
+    """
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: 200 once the Whisper models and the TTS client are loaded, 503 before.
+    """
+    state = readiness(REQUIRED_BACKENDS)
+    return jsonify(state), 200 if state["ready"] else 503
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Bind the port right away and load/warm the STT models and TTS client in the
+    # background; requests arriving earlier load what they need on demand.
+    warm_up_in_background(REQUIRED_BACKENDS)
+    app.run(debug=True, threaded=True, use_reloader=False)
@@ -0,0 +1,102 @@
+import io
+from math import gcd
+
+import numpy as np
+
+# Whisper expects mono float32 audio at 16 kHz.
+SAMPLE_RATE = 16000
+
+
+def pcm16_to_float32(pcm) -> np.ndarray:
+    """
+    Convert 16-bit PCM (raw bytes or an int16 array) to float32 samples in [-1, 1).
+    """
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        pcm = np.frombuffer(pcm, dtype=np.int16)
+    return np.asarray(pcm, dtype=np.float32) / 32768.0
+
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """
+    Average the channels of a (samples, channels) array.
+    """
+    return audio.mean(axis=1) if audio.ndim == 2 else audio
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample a mono float32 array with a polyphase filter.
+    """
+    if orig_sr == target_sr:
+        return audio.astype(np.float32, copy=False)
+    from scipy.signal import resample_poly
+    g = gcd(orig_sr, target_sr)
+    return resample_poly(audio, target_sr // g, orig_sr // g).astype(np.float32)
+
+
+def read_wav(path) -> np.ndarray:
+    """
+    Read a WAV file (path or file object) into a mono float32 array at 16 kHz
+    without spawning ffmpeg.
+    """
+    import scipy.io.wavfile as wavfile
+    fs, data = wavfile.read(path)
+    if data.dtype == np.int16:
+        audio = pcm16_to_float32(data)
+    elif data.dtype == np.int32:
+        audio = data.astype(np.float32) / 2147483648.0
+    elif data.dtype == np.uint8:
+        audio = (data.astype(np.float32) - 128.0) / 128.0
+    else:
+        audio = data.astype(np.float32)
+    return resample(to_mono(audio), fs)
+
+
+def load_audio(source) -> np.ndarray:
+    """
+    Return Whisper-ready audio for `source`, which may be a float32 array already at
+    16 kHz, a WAV file path (read in-process) or any other file path (decoded by
+    Whisper's ffmpeg loader).
+    """
+    if isinstance(source, np.ndarray):
+        return source.astype(np.float32, copy=False)
+    if str(source).lower().endswith(".wav"):
+        try:
+            return read_wav(source)
+        except ValueError:
+            pass  # Not a format scipy understands; let ffmpeg decode it.
+    import whisper
+    return whisper.load_audio(source)
+
+
+def decode_audio_bytes(data: bytes) -> np.ndarray:
+    """
+    Decode uploaded audio bytes to a float32 16 kHz array. WAV is parsed in-process;
+    other containers (webm, ogg, mp3, ...) are piped through ffmpeg without temp files.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            return read_wav(io.BytesIO(data))
+        except ValueError:
+            pass
+    import subprocess
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+    out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    return pcm16_to_float32(out)
+
+
+def speech_to_array(audio_data) -> np.ndarray:
+    """
+    Convert a SpeechRecognition AudioData capture to a float32 16 kHz array.
+    """
+    return pcm16_to_float32(audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+
+
+def write_wav(path: str, audio: np.ndarray, fs: int = SAMPLE_RATE) -> str:
+    """
+    Save a float32 array as a 16-bit WAV file (for callers that still want a file).
+    """
+    import scipy.io.wavfile as wavfile
+    wavfile.write(path, fs, (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16))
+    return path
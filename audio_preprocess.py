@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from vad import frame_features
+
+# ---------------- Settings ----------------
+# Clean up every capture before it reaches Whisper; set AUDIO_PREPROCESS=0 to pass
+# audio through untouched.
+AUDIO_PREPROCESS = os.environ.get("AUDIO_PREPROCESS", "1") == "1"
+FRAME_MS = 30
+# A frame is speech when it is SPEECH_MARGIN_DB above the recording's noise floor (its
+# quietest frames). Frames louder than SPEECH_CEILING_DB always count, so a recording
+# that is speech throughout is not mistaken for noise; frames quieter than
+# MIN_ENERGY_DB never do.
+SPEECH_MARGIN_DB = 10.0
+SPEECH_CEILING_DB = -35.0
+MIN_ENERGY_DB = -50.0
+NOISE_PERCENTILE = 10
+# Less speech than this in a whole capture counts as no speech (coughs, clicks).
+MIN_SPEECH_MS = int(os.environ.get("AUDIO_MIN_SPEECH_MS", "250"))
+# Audio kept before the first and after the last speech frame, so soft onsets and
+# trailing consonants survive the trim.
+PAD_MS = 200
+# Speech is scaled to this RMS level, by at most MAX_GAIN_DB and never past PEAK_LIMIT.
+TARGET_RMS_DB = -20.0
+MAX_GAIN_DB = 20.0
+PEAK_LIMIT = 0.95
+
+
+def remove_dc(audio: np.ndarray) -> np.ndarray:
+    """
+    Subtract the mean, removing the constant offset some microphones add.
+    """
+    return audio - np.float32(audio.mean()) if len(audio) else audio
+
+
+def speech_mask(audio: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """
+    Return (per-frame speech flags, frame length in samples) from frame energy.
+    """
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool), frame_len
+    energy_db, _ = frame_features(audio[:n_frames * frame_len].reshape(n_frames, frame_len))
+    noise_floor = np.percentile(energy_db, NOISE_PERCENTILE)
+    threshold = max(MIN_ENERGY_DB, min(noise_floor + SPEECH_MARGIN_DB, SPEECH_CEILING_DB))
+    return energy_db > threshold, frame_len
+
+
+def normalize(audio: np.ndarray, speech: np.ndarray = None):
+    """
+    Scale `audio` so its speech (the samples flagged in `speech`, all by default) is at
+    TARGET_RMS_DB, limited by MAX_GAIN_DB and PEAK_LIMIT. Returns (audio, gain in dB).
+    """
+    voiced = audio[speech] if speech is not None and speech.any() else audio
+    rms = float(np.sqrt(np.mean(voiced ** 2))) if len(voiced) else 0.0
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    if rms <= 0.0 or peak <= 0.0:
+        return audio, 0.0
+    gain = min(10 ** ((TARGET_RMS_DB - 20 * np.log10(rms)) / 20), 10 ** (MAX_GAIN_DB / 20), PEAK_LIMIT / peak)
+    return (audio * np.float32(gain)).astype(np.float32, copy=False), round(float(20 * np.log10(gain)), 2)
+
+
+def preprocess(audio: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """
+    DC removal, head/tail silence trimming and level normalization, in that order.
+
+    Returns (audio, report). The report gives the input and output lengths, the
+    seconds removed (of which "offset_seconds" at the start, to map timestamps back to
+    the capture), the gain applied and "speech": False when the capture holds less
+    than MIN_SPEECH_MS of speech; the caller should then skip transcription.
+    """
+    audio = remove_dc(np.asarray(audio, dtype=np.float32))
+    input_seconds = len(audio) / sample_rate
+    speech, frame_len = speech_mask(audio, sample_rate)
+    report = {"input_seconds": round(input_seconds, 3), "output_seconds": 0.0,
+              "removed_seconds": round(input_seconds, 3), "offset_seconds": 0.0, "gain_db": 0.0, "speech": False}
+    if speech.sum() * FRAME_MS < MIN_SPEECH_MS:
+        return audio[:0], report
+
+    voiced = np.flatnonzero(speech)
+    pad = int(sample_rate * PAD_MS / 1000)
+    start = max(0, voiced[0] * frame_len - pad)
+    end = min(len(audio), (voiced[-1] + 1) * frame_len + pad)
+    trimmed = audio[start:end]
+    sample_speech = np.repeat(speech, frame_len)[start:end]
+    trimmed, gain_db = normalize(trimmed, np.pad(sample_speech, (0, len(trimmed) - len(sample_speech))))
+    report.update(output_seconds=round(len(trimmed) / sample_rate, 3),
+                  removed_seconds=round((len(audio) - len(trimmed)) / sample_rate, 3),
+                  offset_seconds=round(start / sample_rate, 3),
+                  gain_db=gain_db, speech=True)
+    return trimmed, report
@@ -0,0 +1,225 @@
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# ---------------- Settings ----------------
+# Service-account JSON for Google Cloud TTS, read on first use. Without it the key file
+# the scripts originally hardcoded is tried, then Application Default Credentials
+# (GOOGLE_APPLICATION_CREDENTIALS, `gcloud auth application-default login`, ...).
+GCP_SERVICE_ACCOUNT_FILE = os.environ.get("GCP_SERVICE_ACCOUNT_FILE", "")
+LEGACY_SERVICE_ACCOUNT_FILE = "C:\\Users\\ASUS\\Desktop\\Bade Log\\banded-advice-451419-k5-2b29f5726c72.json"
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access, so scripts keep
+    writing `texttospeech.AudioConfig(...)` without paying for the import at startup.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{' (loaded)' if self._module else ''}>"
+
+
+class Backend:
+    """
+    A heavy component built by `factory()` on first use: at most once, even when the
+    first calls race, and retried on the next use if building it failed. Attribute
+    access is forwarded, so a Backend can replace the object it builds.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = "not_started"
+        self.seconds = None
+        self.error = None
+
+    def get(self):
+        if self.state == "ready":
+            return self._value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.state, self.error = "error", f"{type(e).__name__}: {e}"
+                    raise
+                self.seconds = round(time.perf_counter() - start, 3)
+                self.state, self.error = "ready", None
+        return self._value
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> dict:
+        return {"state": self.state, "seconds": self.seconds, "error": self.error}
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+# ---------------- Credentials and Clients ----------------
+def gcp_credentials():
+    """
+    Service-account credentials from configuration, or None to use the defaults.
+    """
+    path = GCP_SERVICE_ACCOUNT_FILE or (LEGACY_SERVICE_ACCOUNT_FILE if os.path.exists(LEGACY_SERVICE_ACCOUNT_FILE) else "")
+    if not path:
+        return None
+    from google.oauth2 import service_account
+    with open(path, "r") as f:
+        service_account_info = json.load(f)
+    return service_account.Credentials.from_service_account_info(service_account_info)
+
+
+def _build_tts_client():
+    from google.cloud import texttospeech
+    credentials = gcp_credentials()
+    if credentials is None:
+        return texttospeech.TextToSpeechClient()
+    return texttospeech.TextToSpeechClient(credentials=credentials)
+
+
+# Worker pools that decode on their own model replicas, as (executor, workers); see
+# register_stt_pool.
+STT_POOLS = []
+
+
+def register_stt_pool(executor, workers: int):
+    """
+    Have the "whisper" backend warm up every worker replica of `executor` too, so a
+    server is only reported ready once none of its STT workers would load a model.
+    """
+    STT_POOLS.append((executor, workers))
+
+
+def _warm_whisper():
+    from stt_router import PROBE_MODEL
+    from whisper_registry import warm_up, warm_up_replicas
+    warm_up([PROBE_MODEL, "small"])
+    for executor, workers in STT_POOLS:
+        warm_up_replicas(executor, workers, [PROBE_MODEL, "small"])
+    return True
+
+
+texttospeech = LazyModule("google.cloud.texttospeech")
+speech_recognition = LazyModule("speech_recognition")
+
+# Shared Google Cloud TTS client, created (and its credentials read) on first use.
+tts_client = Backend("tts_client", _build_tts_client)
+# Whisper models the STT router starts with, loaded and warmed up.
+whisper_models = Backend("whisper", _warm_whisper)
+
+BACKENDS = {backend.name: backend for backend in (tts_client, whisper_models)}
+
+
+# ---------------- Readiness ----------------
+def warm_up_in_background(names=None) -> threading.Thread:
+    """
+    Build the named backends (all by default) on a background thread, so a server can
+    bind its port immediately and report readiness once they are loaded.
+    """
+    names = list(names if names is not None else BACKENDS)
+
+    def load_all():
+        for name in names:
+            try:
+                BACKENDS[name].get()
+                print(f"Backend '{name}' ready in {BACKENDS[name].seconds}s.")
+            except Exception as e:
+                print(f"Backend '{name}' failed to load: {e}")
+
+    thread = threading.Thread(target=load_all, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness(names=None) -> dict:
+    """
+    {"ready": bool, "backends": {name: status}} for the named backends (all by default).
+    """
+    names = list(names if names is not None else BACKENDS)
+    statuses = {name: BACKENDS[name].status() for name in names}
+    return {"ready": all(status["state"] == "ready" for status in statuses.values()), "backends": statuses}
+
+
+# ---------------- Startup Profile ----------------
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module: str, top: int = 15, env: dict = None) -> dict:
+    """
+    Import `module` in a fresh interpreter under `-X importtime` and return the total
+    import time plus the slowest top-level imports (cumulative seconds).
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, env=env,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+    # Children are listed before their parent, one level deeper: collect the direct
+    # imports (level 1) until the profiled module's own line (level 0) closes them.
+    entries, pending, total = [], [], None
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if not match:
+            continue
+        level = (len(match.group(3)) - 1) // 2
+        if level == 0:
+            if match.group(4) == module:
+                entries, total = pending, int(match.group(2)) / 1e6
+            pending = []
+        elif level == 1:
+            pending.append((match.group(4), int(match.group(2)) / 1e6))
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+    return {
+        "module": module,
+        "ok": process.returncode == 0,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(total, 3) if total is not None else None,
+        "imports": [{"module": name, "seconds": round(seconds, 4)} for name, seconds in entries[:top]],
+        "error": errors[-1] if process.returncode and errors else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show what importing a script costs at startup.")
+    parser.add_argument("modules", nargs="*", default=["app"], help="Modules to profile (default: app).")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list.")
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        profile = import_profile(module, args.top)
+        status = "ok" if profile["ok"] else f"failed: {profile['error']}"
+        print(f"import {module}: {profile['import_seconds']}s "
+              f"({profile['wall_seconds']}s including interpreter start, {status})")
+        for entry in profile["imports"]:
+            print(f"  {entry['seconds']:8.4f}s  {entry['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".flac", ".webm")
+
+# Per-worker state, set up once by _init_worker in each process.
+_worker = {}
+
+
+def collect_inputs(sources, extensions=AUDIO_EXTENSIONS) -> list:
+    """
+    Expand directories (recursively) and glob patterns into a sorted list of audio files.
+    """
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                paths.update(os.path.join(root, n) for n in names if n.lower().endswith(extensions))
+        else:
+            paths.update(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+    return sorted(os.path.abspath(p) for p in paths)
+
+
+def load_done(output_path: str) -> set:
+    """
+    Return the files already transcribed successfully in an existing JSONL output.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interruption.
+            if record.get("error") is None and "path" in record:
+                done.add(record["path"])
+    return done
+
+
+def _init_worker(model_size: str, device: str, threads: int):
+    """
+    Load one resident Whisper model per worker process and cap its CPU threads.
+    """
+    import long_audio
+    import stt_engines
+    stt_engines.STT_CPU_THREADS = threads
+    # Worker processes already run in parallel: the router decodes long files' chunks
+    # in turn instead of starting a thread pool (and model replicas) in each process.
+    long_audio.LONG_AUDIO_WORKERS = 1
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass  # faster-whisper does not need torch.
+    from language_id import identify
+    from whisper_registry import get_model
+    start = time.perf_counter()
+    if model_size == "auto":
+        from stt_router import PROBE_MODEL, router
+        router.device = device
+        get_model(PROBE_MODEL, device=device)
+    else:
+        get_model(model_size, device=device)
+    # Pay the one-off langdetect profile load and resampler import before timing files.
+    identify("warm up the language profiles", min_confidence=1.1)
+    import scipy.signal  # noqa: F401
+    _worker.update(model_size=model_size, device=device, load_seconds=time.perf_counter() - start)
+
+
+def transcribe_file(path: str) -> dict:
+    """
+    Transcribe one file in a worker process and return its JSONL record.
+    """
+    from language_id import identify
+    from audio_io import SAMPLE_RATE, load_audio
+    from whisper_registry import get_model, registry
+
+    record = {"path": path, "pid": os.getpid(), "error": None}
+    try:
+        t0 = time.perf_counter()
+        audio = load_audio(path)
+        t1 = time.perf_counter()
+        if _worker["model_size"] == "auto":
+            from stt_router import route_transcribe
+            result = route_transcribe(audio)
+            record["model"] = result["model"]
+        else:
+            model = get_model(_worker["model_size"], device=_worker["device"])
+            result = registry.engine.transcribe(model, audio)
+        t2 = time.perf_counter()
+        text = result["text"].strip()
+        guess = identify(text)
+        t3 = time.perf_counter()
+        record.update(
+            text=text,
+            whisper_language=result.get("language", "unknown"),
+            text_language=guess.language,
+            text_language_method=guess.method,
+            audio_seconds=round(len(audio) / SAMPLE_RATE, 3),
+            timings={
+                "load_audio": round(t1 - t0, 4),
+                "transcribe": round(t2 - t1, 4),
+                "language_id": round(t3 - t2, 4),
+                "total": round(t3 - t0, 4),
+            },
+        )
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def transcribe_long_file(path: str, pool, model_size: str, device: str) -> dict:
+    """
+    Transcribe one long recording in this process, with its chunks decoded in parallel
+    across the worker processes (see long_audio). The record adds timestamped segments.
+    """
+    from language_id import identify
+    from audio_io import SAMPLE_RATE, load_audio
+    from long_audio import decode_chunk, transcribe_chunks
+
+    record = {"path": path, "pid": os.getpid(), "error": None}
+    try:
+        t0 = time.perf_counter()
+        audio = load_audio(path)
+        t1 = time.perf_counter()
+        result = transcribe_chunks(audio, model_size, device=device, executor=pool, decode=decode_chunk)
+        t2 = time.perf_counter()
+        text = result["text"].strip()
+        guess = identify(text)
+        t3 = time.perf_counter()
+        record.update(
+            text=text,
+            whisper_language=result.get("language") or "unknown",
+            text_language=guess.language,
+            text_language_method=guess.method,
+            audio_seconds=round(len(audio) / SAMPLE_RATE, 3),
+            chunks=result["decoded_chunks"],
+            segments=[{"start": s["start"], "end": s["end"], "text": s["text"]} for s in result["segments"]],
+            timings={
+                "load_audio": round(t1 - t0, 4),
+                "transcribe": round(t2 - t1, 4),
+                "language_id": round(t3 - t2, 4),
+                "total": round(t3 - t0, 4),
+            },
+        )
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def run_batch(sources, output_path: str, model_size: str = "small", device: str = "cpu",
+              workers: int = 2, threads: int = 1, resume: bool = True, long_audio: bool = False) -> dict:
+    """
+    Transcribe every input across a process pool, appending one JSON line per file
+    to `output_path` as soon as it completes. With `long_audio`, files are taken one
+    at a time and each is split into chunks spread across the pool instead, so a few
+    long recordings still use every worker.
+    """
+    paths = collect_inputs(sources)
+    done = load_done(output_path) if resume else set()
+    pending = [p for p in paths if p not in done]
+    print(f"{len(paths)} files found, {len(done & set(paths))} already done, {len(pending)} to transcribe.")
+    if not pending:
+        return {"files": 0, "errors": 0, "seconds": 0.0}
+
+    start = time.perf_counter()
+    errors = 0
+    mode = "a" if resume else "w"
+    context = multiprocessing.get_context("spawn")
+    if long_audio and model_size == "auto":
+        # Chunks share one model; per-file routing would need the probe in this process.
+        model_size = "small"
+    with open(output_path, mode, encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=workers, mp_context=context,
+        initializer=_init_worker, initargs=(model_size, device, threads),
+    ) as pool:
+        if long_audio:
+            records = (transcribe_long_file(p, pool, model_size, device) for p in pending)
+        else:
+            records = (future.result() for future in as_completed([pool.submit(transcribe_file, p) for p in pending]))
+        for i, record in enumerate(records, 1):
+            errors += record["error"] is not None
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            status = record["error"] or f"{record['whisper_language']}/{record['text_language']}"
+            print(f"[{i}/{len(pending)}] {os.path.basename(record['path'])}: {status}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Transcribed {len(pending)} files in {elapsed:.1f}s ({errors} errors) -> {output_path}")
+    return {"files": len(pending), "errors": errors, "seconds": round(elapsed, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a directory or glob of audio files to JSONL.")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns.")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="JSONL file to append results to.")
+    parser.add_argument("--model", default="small", help="Whisper model size, or 'auto' to route per file.")
+    parser.add_argument("--device", default="cpu", help="Device for the Whisper model (cpu or cuda).")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of worker processes (one resident model each).")
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per worker.")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of skipping done files.")
+    parser.add_argument("--long-audio", action="store_true",
+                        help="Split each file into chunks transcribed in parallel (for multi-minute recordings).")
+    args = parser.parse_args(argv)
+    summary = run_batch(args.inputs, args.output, args.model, args.device, args.workers, args.threads,
+                        resume=not args.no_resume, long_audio=args.long_audio)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
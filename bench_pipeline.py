@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from audio_io import SAMPLE_RATE
+from history_manager import ConversationHistory, summarize_extractive
+from metrics import Metrics, Trace
+from stubs import FakeChatCompletion, FakeTTS, FileMicrophone
+
+DEFAULT_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_dynamic.wav")
+
+SYSTEM_PROMPT = "You are Bharat Bhai, a friendly tech support assistant."
+
+# Stages reported for every run, in pipeline order.
+STAGES = ("record", "transcribe", "language_id", "generate", "synthesize", "turn")
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None if it cannot be read.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes.
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+    except ImportError:
+        return None
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_pipeline(audio_path: str = DEFAULT_AUDIO, turns: int = 20, warmup: int = 2, model_size: str = None,
+                 llm_latency: float = 0.3, tts_latency: float = 0.1, tts_cache: bool = False,
+                 force_langdetect: bool = False) -> dict:
+    """
+    Run `turns` record -> transcribe -> detect -> generate -> synthesize turns with the
+    real Whisper and language-ID stages and local stand-ins for the microphone, the
+    ChatCompletion API and TTS. Returns per-stage latency percentiles and throughput.
+    """
+    from language_id import identify
+    from stt_router import route_transcribe
+    from tts_cache import AudioCache, audio_key
+
+    microphone = FileMicrophone(audio_path)
+    completion = FakeChatCompletion(latency=llm_latency)
+    tts = FakeTTS(latency=tts_latency)
+    cache = AudioCache(cache_dir=None) if tts_cache else None
+    history = ConversationHistory(SYSTEM_PROMPT, summarizer=summarize_extractive)
+    results = Metrics(prefix="bench")
+    # langdetect is only reached on low confidence; min_confidence > 1 always runs it.
+    min_confidence = 1.1 if force_langdetect else None
+
+    audio_seconds = 0.0
+    models = {}
+    start = None
+    for i in range(warmup + turns):
+        if i == warmup:
+            results = Metrics(prefix="bench")
+            audio_seconds = 0.0
+            models = {}
+            start = time.perf_counter()
+        trace = Trace(registry=results, route="bench")
+        with trace.span("record"):
+            audio = microphone()
+        with trace.span("transcribe"):
+            transcript = route_transcribe(audio, model_size=model_size)
+        # The same clip repeats every turn; clear the result cache so each turn pays for detection.
+        identify.cache_clear()
+        with trace.span("language_id"):
+            text = transcript["text"].strip()
+            guess = identify(text) if min_confidence is None else identify(text, min_confidence)
+        history.append("user", f"{text} [Respond in {guess.language.upper()}]")
+        with trace.span("generate"):
+            reply = completion.create(messages=history.messages, max_tokens=50).choices[0].message["content"]
+        history.append("assistant", reply)
+        with trace.span("synthesize"):
+            if cache is not None:
+                cache.get_or_synthesize(audio_key(reply, guess.language, backend="bench"), tts.synthesizer(reply))
+            else:
+                tts(reply)
+        trace.finish()
+        audio_seconds += len(audio) / SAMPLE_RATE
+        models[transcript["model"]] = models.get(transcript["model"], 0) + 1
+    elapsed = time.perf_counter() - start
+
+    stages = results.snapshot()["stages"]
+    return {
+        "turns": turns,
+        "wall_seconds": round(elapsed, 3),
+        "turns_per_second": round(turns / elapsed, 3) if elapsed else None,
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 3) if elapsed else None,
+        "stages": {stage: stages.get(stage) for stage in STAGES},
+        "whisper_models": models,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """
+    Per-stage p50/p95 change against a previous result file, as printable lines.
+    """
+    lines = []
+    for stage in STAGES:
+        now, before = current["stages"].get(stage) or {}, baseline["stages"].get(stage) or {}
+        for key in ("p50", "p95"):
+            if key in now and before.get(key):
+                change = (now[key] - before[key]) / before[key] * 100
+                lines.append(f"{stage:>12} {key}: {before[key]:.4f}s -> {now[key]:.4f}s ({change:+.1f}%)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the voice pipeline with stub backends.")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO, help="Audio file fed in place of the microphone.")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed turns run first (model loads, caches).")
+    parser.add_argument("--model", default=None, help="Pin a Whisper size instead of routing per utterance.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds the fake ChatCompletion takes.")
+    parser.add_argument("--tts-latency", type=float, default=0.1, help="Seconds the fake TTS takes.")
+    parser.add_argument("--tts-cache", action="store_true", help="Serve repeated replies from an in-memory audio cache.")
+    parser.add_argument("--langdetect", action="store_true", help="Always run langdetect instead of the script fast path.")
+    parser.add_argument("-o", "--output", default="bench_pipeline.json", help="JSON file to write the results to.")
+    parser.add_argument("--compare", help="Previous results JSON to compare against.")
+    args = parser.parse_args(argv)
+
+    result = run_pipeline(args.audio, args.turns, args.warmup, args.model, args.llm_latency, args.tts_latency,
+                          args.tts_cache, args.langdetect)
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    result["environment"] = {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    print(f"{args.turns} turns in {result['wall_seconds']}s ({result['turns_per_second']} turns/s, "
+          f"{result['audio_seconds_per_second']}x real time), peak RSS {result['peak_rss_mb']} MB")
+    for stage, stats in result["stages"].items():
+        if stats:
+            print(f"{stage:>12}: p50 {stats['p50']:.4f}s  p95 {stats['p95']:.4f}s  p99 {stats['p99']:.4f}s")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare(result, json.load(f)):
+                print(line)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
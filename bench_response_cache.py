@@ -0,0 +1,80 @@
+import argparse
+import random
+import time
+
+from response_cache import ResponseCache, normalize_query, similar
+
+# Vocabulary of tech-support style words used to build synthetic queries.
+WORDS = (
+    "router wifi internet printer ink laptop phone battery charger screen password email account "
+    "restart reset slow fast not working broken connect cable signal update install delete "
+    "my the is how to why does and with after when please help cannot network bluetooth speaker "
+    "keyboard mouse windows android app download upload storage memory virus error message"
+).split()
+
+
+def make_query(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 12)))
+
+
+def perturb(query: str, rng: random.Random) -> str:
+    """
+    Introduce a small typo so lookups exercise the near-duplicate path.
+    """
+    chars = list(query)
+    i = rng.randrange(len(chars))
+    chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def legacy_lookup(cache: dict, query: str, threshold: float = 0.8):
+    """
+    The original linear SequenceMatcher scan, for comparison.
+    """
+    for cached_query, cached_response in cache.items():
+        if similar(query.lower(), cached_query.lower()) >= threshold:
+            return cached_response
+    return None
+
+
+def bench(size: int, lookups: int, legacy_lookups: int, seed: int = 0):
+    rng = random.Random(seed)
+    queries = [make_query(rng) for _ in range(size)]
+
+    cache = ResponseCache(max_entries=size)
+    start = time.perf_counter()
+    for q in queries:
+        cache.put(q, "response to " + q)
+    fill_seconds = time.perf_counter() - start
+
+    probes = [perturb(rng.choice(queries), rng) if i % 2 else make_query(rng) for i in range(lookups)]
+    timings = []
+    for probe in probes:
+        t0 = time.perf_counter()
+        cache.get(probe)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+
+    legacy = {normalize_query(q): "response to " + q for q in queries}
+    t0 = time.perf_counter()
+    for probe in probes[:legacy_lookups]:
+        legacy_lookup(legacy, probe)
+    legacy_ms = (time.perf_counter() - t0) / max(1, legacy_lookups) * 1000
+
+    stats = cache.stats()
+    print(f"--- {size} cached queries ---")
+    print(f"fill: {fill_seconds:.2f}s ({fill_seconds / size * 1e6:.0f} us/put)")
+    print(f"indexed lookup: mean {sum(timings) / len(timings) * 1000:.3f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f} ms, "
+          f"avg candidates {stats['avg_candidates']}, hit rate {stats['hit_rate']}")
+    print(f"legacy scan:    mean {legacy_ms:.3f} ms over {legacy_lookups} lookups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark response cache lookups.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--legacy-lookups", type=int, default=5)
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size, args.lookups, args.legacy_lookups)
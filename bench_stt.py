@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_pipeline import DEFAULT_AUDIO, git_revision, peak_rss_mb
+
+DEFAULT_ENGINES = ("whisper", "whisper-int8", "faster-whisper")
+
+
+def bench_engine(engine_name: str, model_size: str = "small", audio_path: str = DEFAULT_AUDIO, runs: int = 5,
+                 warmup: int = 1, device: str = None) -> dict:
+    """
+    Load one model on one STT engine in this process and time `runs` transcriptions of
+    `audio_path`. The real-time factor is transcription time over audio length (below
+    1 is faster than real time).
+    """
+    from audio_io import SAMPLE_RATE, load_audio
+    from stt_engines import get_engine
+
+    audio = load_audio(audio_path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    engine = get_engine(engine_name)
+    device = engine.resolve_device(device)
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = engine.load(model_size, device)
+    load_seconds = time.perf_counter() - start
+    for _ in range(warmup):
+        engine.transcribe(model, audio)
+
+    timings, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = engine.transcribe(model, audio)
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        "engine": engine_name,
+        "model": model_size,
+        "device": device,
+        "audio_seconds": round(audio_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "transcribe_seconds": {"median": round(median, 4), "min": round(min(timings), 4),
+                               "max": round(max(timings), 4)},
+        "rtf": round(median / audio_seconds, 4),
+        "model_mb": round(engine.memory_bytes(model) / 2**20, 1),
+        "rss_before_load_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "text": result["text"].strip(),
+    }
+
+
+def bench_in_subprocess(engine_name: str, args) -> dict:
+    """
+    Run bench_engine in a fresh interpreter, so each engine's peak memory is its own.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", engine_name, "--model", args.model,
+               "--audio", args.audio, "--runs", str(args.runs), "--warmup", str(args.warmup)]
+    if args.device:
+        command += ["--device", args.device]
+    process = subprocess.run(command, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        errors = process.stderr.strip().splitlines()
+        return {"engine": engine_name, "model": args.model, "error": errors[-1] if errors else "no output"}
+    return json.loads(lines[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare STT engines by real-time factor and memory.")
+    parser.add_argument("--engines", nargs="+", default=list(DEFAULT_ENGINES),
+                        help="Engines to compare; the first is the baseline.")
+    parser.add_argument("--model", default="small", help="Whisper size to load on every engine.")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO, help="Audio file to transcribe.")
+    parser.add_argument("--runs", type=int, default=5, help="Timed transcriptions per engine.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed transcriptions run first.")
+    parser.add_argument("--device", default=None, help="Device (cpu or cuda); engines pick by default.")
+    parser.add_argument("-o", "--output", default="bench_stt.json", help="JSON file to write the results to.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(bench_engine(args.child, args.model, args.audio, args.runs, args.warmup, args.device),
+                         ensure_ascii=False))
+        return
+
+    results = []
+    for engine_name in args.engines:
+        print(f"Benchmarking {engine_name} ({args.model})...")
+        results.append(bench_in_subprocess(engine_name, args))
+
+    baseline = next((r for r in results if "error" not in r), None)
+    print(f"{'engine':>15} {'RTF':>8} {'speedup':>8} {'load s':>8} {'model MB':>9} {'peak RSS MB':>12}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['engine']:>15}  failed: {r['error']}")
+            continue
+        speedup = baseline["rtf"] / r["rtf"] if r["rtf"] else float("inf")
+        print(f"{r['engine']:>15} {r['rtf']:8.3f} {speedup:7.2f}x {r['load_seconds']:8.2f} "
+              f"{r['model_mb']:9.1f} {r['peak_rss_mb'] or 0:12.1f}")
+    for r in results:
+        if "error" not in r:
+            print(f"{r['engine']:>15}: {r['text']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"revision": git_revision(), "model": args.model, "audio": args.audio, "results": results},
+                  f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
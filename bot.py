@@ -1,44 +1,43 @@
 import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wavfile
-import whisper
-import os
+from audio_io import pcm16_to_float32, resample
+from stt_router import route_transcribe
 
-def record_audio(duration=5, filename="recorded.wav", fs=16000):
+def record_audio(duration=5, filename=None, fs=16000):
     """
     Record audio from the microphone for a given duration.
     
     Args:
         duration (int): Duration to record (in seconds).
-        filename (str): The file name to save the recording.
+        filename (str): Optional file name to save the recording to.
         fs (int): Sampling rate.
         
     Returns:
-        str: The path to the saved audio file.
+        np.ndarray | str: The 16 kHz float32 recording, or the saved file path if a filename is given.
     """
     print("Recording... Speak now!")
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
     sd.wait()  # Wait until recording is finished
-    wavfile.write(filename, fs, recording)
-    print(f"Recording saved as {filename}")
-    return filename
+    if filename:
+        wavfile.write(filename, fs, recording)
+        print(f"Recording saved as {filename}")
+        return filename
+    return resample(pcm16_to_float32(recording[:, 0]), fs)
 
-def transcribe_audio(file_path):
+def transcribe_audio(audio):
     """
-    Transcribe an audio file using OpenAI's Whisper model.
+    Transcribe audio using OpenAI's Whisper model.
     
     Args:
-        file_path (str): Path to the audio file.
+        audio (np.ndarray | str): 16 kHz float32 samples or the path to an audio file.
         
     Returns:
         dict: Contains transcription text and detected language.
     """
-    # Load the latest Whisper model (you can choose model size: tiny, base, small, medium, large)
-    print("Loading Whisper model...")
-    model = whisper.load_model("large", device="cuda")  # "base" is a good balance between speed and accuracy
-    
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    # The router picks tiny/base/small/large per utterance on whichever device is available;
+    # each model is loaded once and reused across calls
+    result = route_transcribe(audio)
     
     return {
         "text": result["text"],
@@ -46,16 +45,11 @@ def transcribe_audio(file_path):
     }
 
 if __name__ == "__main__":
-    # Ensure ffmpeg is installed in your system (required by Whisper)
-    if os.system("ffmpeg -version") != 0:
-        print("ffmpeg is not installed. Please install ffmpeg and try again.")
-        exit(1)
-        
-    # Step 1: Record audio
-    audio_file = record_audio(duration=5)  # Adjust duration as needed
+    # Step 1: Record audio (kept in memory, so ffmpeg is not needed)
+    audio = record_audio(duration=5)  # Adjust duration as needed
 
     # Step 2: Transcribe the recorded audio
-    transcription = transcribe_audio(audio_file)
+    transcription = transcribe_audio(audio)
     
     print("\n--- Transcription Results ---")
     print("Detected Language:", transcription["language"])
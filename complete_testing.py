@@ -1,52 +1,40 @@
-import os
-import openai
-import whisper
+from llm_client import chat
+from stt_router import route_transcribe
 import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wavfile
-from langdetect import detect, DetectorFactory
-from gtts import gTTS
-from playsound import playsound
+from audio_io import pcm16_to_float32, resample
+from language_id import detect_language
+from tts_cache import cached_gtts
+from tts_chunks import speak_chunked
+from pipeline import TurnStages
+from playback import player, wait_for_playback
 
-# Ensure reproducible language detection results
-DetectorFactory.seed = 0
+# llm_client reads the OpenAI API key from the OPENAI_API_KEY environment variable.
 
-# Set your OpenAI API key
-openai.api_key = ""  # Replace with your actual API key
-
-def record_audio(duration=5, filename="recorded.wav", fs=16000):
+def record_audio(duration=5, filename=None, fs=16000):
     """
     Record audio from the microphone.
+    Returns a 16 kHz float32 array, or saves it to `filename` and returns the path.
     """
     print("Recording... Speak now!")
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
     sd.wait()  # Wait until recording is finished
-    wavfile.write(filename, fs, recording)
-    print(f"Recording saved as {filename}")
-    return filename
+    if filename:
+        wavfile.write(filename, fs, recording)
+        print(f"Recording saved as {filename}")
+        return filename
+    return resample(pcm16_to_float32(recording[:, 0]), fs)
 
-def transcribe_audio(file_path, model_size="large"):
+def transcribe_audio(audio, model_size=None):
     """
-    Transcribe audio using OpenAI's Whisper.
+    Transcribe audio (a 16 kHz float32 array or a file path) using OpenAI's Whisper.
+    `model_size` pins a Whisper size; by default the STT router picks one.
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model(model_size)
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    result = route_transcribe(audio, model_size=model_size)
     # result contains keys "text" and "language"
     return result["text"], result.get("language", "unknown")
 
-def detect_language(text):
-    """
-    Detect the language of the given text using langdetect.
-    """
-    try:
-        lang = detect(text)
-        return lang
-    except Exception as e:
-        print("Error in language detection:", e)
-        return "unknown"
-
 def generate_response_gpt(user_query, language):
     """
     Generate a response using GPT-3.5 Turbo via OpenAI's API.
@@ -65,49 +53,40 @@ def generate_response_gpt(user_query, language):
         {"role": "user", "content": user_query}
     ]
     
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=150,
-    )
-    
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150)
 
 def text_to_speech(text, lang):
     """
-    Convert text to speech using gTTS and play the audio.
+    Convert text to speech using gTTS (or cached audio) and play the audio.
+    gTTS requests are made per chunk, in parallel, and playback starts on the first.
+    Returns once the audio is queued; it plays on the background player.
     """
-    tts = gTTS(text=text, lang=lang)
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
-    os.remove(filename)
+    speak_chunked(text, lambda chunk: cached_gtts(chunk, lang=lang), player.enqueue, provider="gtts")
 
-def process_pipeline():
-    # Step 1: Record audio (simulate a spoken query)
-    audio_file = record_audio(duration=5)
-    
-    # Step 2: Transcribe audio using Whisper
-    transcribed_text, whisper_lang = transcribe_audio(audio_file, model_size="small")
-    print("\n--- Transcribed Text ---")
-    print(transcribed_text)
-    print("Whisper Detected Language:", whisper_lang)
-    
-    # Step 3: Detect language using langdetect
+def detect_query_language(transcribed_text, whisper_lang):
+    # Script-aware detection (langdetect only when unsure); default to Marathi ("mr")
     detected_lang = detect_language(transcribed_text)
-    print("Langdetect Detected Language:", detected_lang)
-    
-    # Use detected language if available; otherwise, default to Marathi ("mr")
-    language_code = detected_lang if detected_lang != "unknown" else "mr"
-    
-    # Step 4: Generate a text response using GPT-3.5 Turbo in the detected language
-    response_text = generate_response_gpt(transcribed_text, language_code)
-    print("\n--- GPT Response ---")
-    print(response_text)
-    
-    # Step 5: Convert the text response to speech and play it
-    text_to_speech(response_text, lang=language_code)
+    print("Text Detected Language:", detected_lang)
+    return detected_lang if detected_lang != "unknown" else "mr"
+
+def show_stage(stage, turn):
+    if stage == "transcribe":
+        print("\n--- Transcribed Text ---")
+        print(turn.text)
+        print("Whisper Detected Language:", turn.whisper_language)
+    elif stage == "llm":
+        print("\n--- GPT Response ---")
+        print(turn.reply)
+
+# Record (5 s) -> Whisper -> language -> GPT-3.5 Turbo in that language -> gTTS
+stages = TurnStages(lambda: record_audio(duration=5), transcribe_audio, detect_query_language,
+                    generate_response_gpt, lambda text, language: text_to_speech(text, lang=language),
+                    is_exit=lambda text: False, on_stage=show_stage, route="complete_testing")
+
+def process_pipeline():
+    # One spoken query through the shared turn stages, then let the reply finish playing
+    stages.run_turn()
+    wait_for_playback()
 
 if __name__ == "__main__":
     process_pipeline()
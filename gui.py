@@ -1,107 +1,117 @@
-import os
-import json
-import openai
-import whisper
-import speech_recognition as sr
+from llm_client import chat
+from stt_router import route_transcribe
 import threading
 import tkinter as tk
 from tkinter import scrolledtext
-from langdetect import detect
-from google.oauth2 import service_account
-from google.cloud import texttospeech
-from playsound import playsound
-
-# ---------------- OpenAI Setup ----------------
-openai.api_key = ""
+from language_id import detect_language
+from backends import texttospeech, tts_client
+from playback import barge_in, player, prepare_to_listen
+from history_manager import ConversationHistory
+from audio_io import write_wav
+from tts_cache import cached_synthesis
+from tts_chunks import speak_chunked
+from pipeline import TurnStages
+from streaming_stt import STREAMING_STT, StreamedUtterance, record_streaming
+from vad import record_utterance
 
 # ---------------- Google Cloud TTS Setup ----------------
-with open("C:\\Users\\ASUS\\Desktop\\Bade Log\\banded-advice-451419-k5-2b29f5726c72.json", "r") as f:
-    service_account_info = json.load(f)
-
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
-tts_client = texttospeech.TextToSpeechClient(credentials=credentials)
+# The client and its credentials (GCP_SERVICE_ACCOUNT_FILE) are loaded on first use;
+# see backends.py.
 
 # ---------------- Conversation History ----------------
-conversation_history = {
-    "messages": [
-        {
-            "role": "system",
-            "content": (
-                "You are Harshad Mehta, a high school teacher with a unique past. Once, you were a successful stock market trader, but you suffered a catastrophic loss during the 2008 Indian Recession. That loss forced you to take on massive loans and support your family, so you reinvented yourself as a dedicated teacher. You now answer all questions with warmth, humility, and a gentle, humorous tone, always offering clear, step-by-step explanations on general topics. However, if someone asks you about the stock market or trading, you become visibly angry, emotional, and strongly reprimand them—warning them to stay away from trading because of your painful experiences. Always maintain your kind and humorous approach unless the subject touches on stock market matters, where your past trauma surfaces. Your responses must remain strictly in character, and you should only answer questions related to your new role as a teacher, avoiding any promotion of stock trading."
-            )
-        }
-    ]
-}
+SYSTEM_PROMPT = (
+    "You are Harshad Mehta, a high school teacher with a unique past. Once, you were a successful stock market trader, but you suffered a catastrophic loss during the 2008 Indian Recession. That loss forced you to take on massive loans and support your family, so you reinvented yourself as a dedicated teacher. You now answer all questions with warmth, humility, and a gentle, humorous tone, always offering clear, step-by-step explanations on general topics. However, if someone asks you about the stock market or trading, you become visibly angry, emotional, and strongly reprimand them—warning them to stay away from trading because of your painful experiences. Always maintain your kind and humorous approach unless the subject touches on stock market matters, where your past trauma surfaces. Your responses must remain strictly in character, and you should only answer questions related to your new role as a teacher, avoiding any promotion of stock trading."
+)
+
+# Prompt history kept within a token budget; older turns are folded into a running summary.
+conversation_history = ConversationHistory(SYSTEM_PROMPT)
 
 # ---------------- Utility Functions ----------------
-def record_audio_dynamic(filename="recorded_dynamic.wav") -> str:
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        status_label.config(text="Listening... Speak now!")
-        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-    with open(filename, "wb") as f:
-        f.write(audio.get_wav_data())
-    return filename
-
-def transcribe_audio(file_path: str, model_size="large") -> (str, str):
-    model = whisper.load_model(model_size)
-    result = model.transcribe(file_path)
+def record_audio_dynamic(filename=None):
+    # VAD recording (ends on a pause; empty if nothing is said within 5 seconds).
+    prepare_to_listen()
+    status_label.config(text="Listening... Speak now!")
+    audio = record_utterance(max_wait_s=5, max_utterance_s=10, on_speech_start=barge_in)
+    if filename:
+        return write_wav(filename, audio)
+    return audio
+
+def show_live_text(hypothesis):
+    # The words recognized so far, while the user is still talking.
+    status_label.config(text=f"Listening... {hypothesis.text}"[-120:])
+
+def record_streamed():
+    # VAD recording (ends on a pause), transcribed while the user speaks.
+    prepare_to_listen()
+    status_label.config(text="Listening... Speak now!")
+    return record_streaming(on_hypothesis=show_live_text, on_speech_start=barge_in)
+
+def transcribe_audio(audio, model_size=None) -> (str, str):
+    # The live text was only for display; the router transcribes the captured audio.
+    if isinstance(audio, StreamedUtterance):
+        audio = audio.audio
+    result = route_transcribe(audio, model_size=model_size)
     return result["text"], result.get("language", "unknown")
 
 def generate_response_from_history(messages) -> str:
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=500,
-    )
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=500)
 
-def synthesize_and_play(text: str, language_code: str = "en-US"):
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-    voice_params = texttospeech.VoiceSelectionParams(language_code=language_code, ssml_gender=texttospeech.SsmlVoiceGender.MALE)
-    audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-    response = tts_client.synthesize_speech(input=synthesis_input, voice=voice_params, audio_config=audio_config)
-    
-    output_filename = "output.mp3"
-    with open(output_filename, "wb") as out:
-        out.write(response.audio_content)
-    playsound(output_filename)
-    os.remove(output_filename)
+def synthesize_chunk(text: str, language_code: str = "en-US") -> bytes:
+    def synthesize() -> bytes:
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+        voice_params = texttospeech.VoiceSelectionParams(language_code=language_code, ssml_gender=texttospeech.SsmlVoiceGender.MALE)
+        audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
+        response = tts_client.synthesize_speech(input=synthesis_input, voice=voice_params, audio_config=audio_config)
+        return response.audio_content
 
-# ---------------- GUI Functions ----------------
-def start_conversation():
-    threading.Thread(target=handle_voice_interaction, daemon=True).start()
+    return cached_synthesis(synthesize, text, language_code, "MALE", encoding="MP3", backend="gcp")
 
-def handle_voice_interaction():
-    audio_file = record_audio_dynamic()
-    transcribed_text, whisper_lang = transcribe_audio(audio_file, model_size="large")
+def play_audio(audio_content: bytes):
+    # Plays on the background player, so the GUI thread is free again right away.
+    player.enqueue(audio_content)
 
-    # Determine language
-    language_code = whisper_lang if whisper_lang and whisper_lang.lower() != "unknown" else detect(transcribed_text)
+def synthesize_and_play(text: str, language_code: str = "en-US"):
+    # Replies can run to 500 tokens: chunks are synthesized in parallel and the first plays right away.
+    speak_chunked(text, lambda chunk: synthesize_chunk(chunk, language_code), play_audio)
 
-    # Append user message to conversation history
-    conversation_history["messages"].append({
-        "role": "user",
-        "content": transcribed_text + f" [Respond in {language_code.upper()}]"
-    })
+# ---------------- Turn Stages ----------------
+TTS_LANGUAGE_MAP = {"en": "en-US", "hi": "hi-IN", "mr": "mr-IN"}
 
-    # Generate assistant response
-    assistant_response = generate_response_from_history(conversation_history["messages"])
-    conversation_history["messages"].append({"role": "assistant", "content": assistant_response})
+def resolve_language(transcribed_text: str, whisper_lang: str) -> str:
+    return whisper_lang if whisper_lang and whisper_lang.lower() != "unknown" else detect_language(transcribed_text, default="en")
 
+def generate_reply(transcribed_text: str, language_code: str) -> str:
+    conversation_history.append("user", transcribed_text + f" [Respond in {language_code.upper()}]")
+    assistant_response = generate_response_from_history(conversation_history.messages)
+    conversation_history.append("assistant", assistant_response)
+    return assistant_response
+
+def speak_reply(assistant_response: str, language_code: str):
+    synthesize_and_play(assistant_response, language_code=TTS_LANGUAGE_MAP.get(language_code[:2].lower(), language_code))
+
+def show_stage(stage, turn):
+    if stage != "llm":
+        return
     # Display conversation history in the text box (APPEND instead of clearing)
     conversation_textbox.config(state=tk.NORMAL)
-    conversation_textbox.insert(tk.END, f"\n🗣️ You: {transcribed_text}\n", "user")
-    conversation_textbox.insert(tk.END, f"🤖 Bot: {assistant_response}\n", "bot")
+    conversation_textbox.insert(tk.END, f"\n🗣️ You: {turn.text}\n", "user")
+    conversation_textbox.insert(tk.END, f"🤖 Bot: {turn.reply}\n", "bot")
     conversation_textbox.config(state=tk.DISABLED)
 
     # Auto-scroll to the latest message
     conversation_textbox.yview(tk.END)
 
-    # Convert response to speech
-    tts_language_map = {"en": "en-US", "hi": "hi-IN", "mr": "mr-IN"}
-    synthesize_and_play(assistant_response, language_code=tts_language_map.get(language_code[:2].lower(), language_code))
+stages = TurnStages(record_streamed if STREAMING_STT else record_audio_dynamic, transcribe_audio, resolve_language, generate_reply, speak_reply,
+                    is_exit=lambda text: False, on_stage=show_stage, route="gui")
+
+# ---------------- GUI Functions ----------------
+def start_conversation():
+    threading.Thread(target=handle_voice_interaction, daemon=True).start()
+
+def handle_voice_interaction():
+    # One push-to-talk turn. The reply plays in the background; pressing again listens once
+    # it has finished, or with VOICEBOT_BARGE_IN=1 right away, stopping it when you speak.
+    stages.run_turn()
 
 # ---------------- Create GUI ----------------
 root = tk.Tk()
@@ -1,58 +1,69 @@
-import os
-import openai
-import whisper
+from llm_client import chat
+from whisper_registry import warm_up
+from stt_router import PROBE_MODEL, route_transcribe
 import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wavfile
-from langdetect import detect
-from difflib import SequenceMatcher
-from gtts import gTTS
-from playsound import playsound
+from audio_io import pcm16_to_float32, resample
+from vad import record_utterance
+from streaming_stt import STREAMING_STT, StreamedUtterance, record_streaming
+from language_id import identify
+from response_cache import normalize_query
+from response_store import PersistentResponseCache
+from singleflight import SingleFlight
+from tts_cache import cached_gtts
+from tts_chunks import speak_chunked
+from pipeline import TurnStages, VoicePipeline
+from playback import barge_in, player, prepare_to_listen
 
-# Set your OpenAI API key
-openai.api_key = ""  # Replace with your actual API key
+# llm_client reads the OpenAI API key from the OPENAI_API_KEY environment variable.
 
-# Global dictionary to cache responses: {user query: response}
-response_cache = {}
+# Near-duplicate cache of responses, persisted on disk and shared by every process:
+# {(user query, language, persona): response}
+PERSONA = "bharat_bhai"
+response_cache = PersistentResponseCache(threshold=0.8, max_entries=100000, ttl_seconds=7 * 24 * 3600)
 
-def record_audio(duration=5, filename="recorded.wav", fs=16000):
+# Identical questions arriving together (e.g. during an outage) share one LLM call.
+llm_flight = SingleFlight()
+
+def record_audio(duration=5, filename=None, fs=16000):
     """
-    Record audio from the microphone for a given duration and save to a file.
+    Record audio from the microphone for a given duration.
+    Returns a 16 kHz float32 array, or saves it to `filename` and returns the path.
     """
     print("Recording... Speak now!")
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
     sd.wait()  # Wait until recording is finished
-    wavfile.write(filename, fs, recording)
-    print(f"Recording saved as {filename}")
-    return filename
+    if filename:
+        wavfile.write(filename, fs, recording)
+        print(f"Recording saved as {filename}")
+        return filename
+    return resample(pcm16_to_float32(recording[:, 0]), fs)
 
-def transcribe_audio(file_path, model_size="large"):
+def transcribe_audio(audio, model_size=None):
     """
     Transcribe audio using OpenAI's Whisper.
+    `audio` is a 16 kHz float32 array, the path of an audio file or a StreamedUtterance
+    from record_query (whose live text was only for display).
+    `model_size` pins a Whisper size; by default the STT router picks one per utterance.
     Returns the transcribed text and the detected language (if available).
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model(model_size)
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    if isinstance(audio, StreamedUtterance):
+        audio = audio.audio
+    result = route_transcribe(audio, model_size=model_size)
     return result["text"], result.get("language", "unknown")
 
-def similar(a: str, b: str) -> float:
-    """
-    Compute a similarity ratio between two strings.
-    """
-    return SequenceMatcher(None, a, b).ratio()
-
-def get_cached_response(user_query: str, threshold: float = 0.8) -> str:
+def get_cached_response(user_query: str, language: str = "en", threshold: float = 0.8) -> str:
     """
-    Check if a similar query exists in the cache.
+    Check if a similar query in the same language exists in the cache.
     If a cached query has a similarity ratio above the threshold, return its response.
     """
-    for cached_query, cached_response in response_cache.items():
-        if similar(user_query.lower(), cached_query.lower()) >= threshold:
-            print(f"Found cached response (similarity: {similar(user_query, cached_query):.2f}).")
-            return cached_response
-    return None
+    match = response_cache.lookup(user_query, threshold=threshold, language=language, persona=PERSONA)
+    if match is None:
+        return None
+    cached_response, score, _ = match
+    print(f"Found cached response (similarity: {score:.2f}).")
+    return cached_response
 
 def generate_response_gpt(user_query: str, language: str = "en") -> str:
     """
@@ -72,71 +83,103 @@ def generate_response_gpt(user_query: str, language: str = "en") -> str:
         {"role": "user", "content": user_query}
     ]
     
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=50,
-    )
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=50)
+
+def get_response(user_query: str, language: str = "en") -> str:
+    """
+    Return a cached response for the query, or generate and cache one. Concurrent
+    identical requests (same normalized query, language and persona) are coalesced:
+    one caller generates, the others wait for its result (or its error).
+    """
+    cached_response = get_cached_response(user_query, language=language)
+    if cached_response is not None:
+        return cached_response
+
+    def generate() -> str:
+        # A leader that finished just before this call may already have cached the reply.
+        cached = get_cached_response(user_query, language=language)
+        if cached is not None:
+            return cached
+        response_text = generate_response_gpt(user_query, language=language)
+        response_cache.put(user_query, response_text, language=language, persona=PERSONA)
+        return response_text
+
+    response_text, shared = llm_flight.do((normalize_query(user_query), language, PERSONA), generate)
+    if shared:
+        print("Shared an in-flight response for the same query.")
+    return response_text
 
 def text_to_speech(text: str, lang: str = "en"):
     """
-    Convert text to speech using gTTS and play the audio.
+    Convert text to speech using gTTS (or cached audio) and play the audio.
+    gTTS requests are made per chunk, in parallel, and playback starts on the first.
+    Returns once the audio is queued; it plays on the background player.
+    """
+    speak_chunked(text, lambda chunk: cached_gtts(chunk, lang=lang), player.enqueue, provider="gtts")
+
+def record_query():
+    """
+    Record the user's next utterance (ends on a pause).
     """
-    tts = gTTS(text=text, lang=lang)
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
-    os.remove(filename)
+    print("\nPlease speak your query (recording stops when you pause)...")
+    prepare_to_listen()
+    # Speaking over the reply stops it as soon as the VAD hears the user start.
+    if STREAMING_STT:
+        utterance = record_streaming(on_hypothesis=show_live_text, on_speech_start=barge_in)
+        if utterance.hypothesis is not None:
+            print()  # End the live line.
+        return utterance
+    return record_utterance(on_speech_start=barge_in)
+
+def show_live_text(hypothesis):
+    # Committed words, then the current guess for the rest, rewritten on one line.
+    print(f"\r... {hypothesis.committed} [{hypothesis.interim}]", end="", flush=True)
+
+# ---------------- Turn Stages ----------------
+language_code = None  # To be determined from the first user input
+
+def detect_conversation_language(transcribed_text: str, whisper_lang: str) -> str:
+    """
+    Detect the language (script-aware, langdetect only when unsure); the first
+    utterance's language is kept for the rest of the conversation.
+    """
+    global language_code
+    guess = identify(transcribed_text)
+    detected_lang = guess.language if guess.language != "unknown" else "en"
+    print(f"Detected Language: {detected_lang} ({guess.method}, confidence {guess.confidence:.2f})")
+    if language_code is None:
+        language_code = detected_lang
+    return language_code
+
+def speak_reply(response_text: str, language: str):
+    print("Bot:", response_text)
+    text_to_speech(response_text, lang=language)
+
+def show_stage(stage, turn):
+    if stage == "transcribe":
+        print("\n--- Transcribed Text ---")
+        print(turn.text)
+        print("Whisper Detected Language:", turn.whisper_language)
+
+# Cached or generated (once per concurrent query) replies for each recognized query.
+stages = TurnStages(record_query, transcribe_audio, detect_conversation_language,
+                    lambda text, language: get_response(text, language=language), speak_reply,
+                    on_stage=show_stage, route="history")
 
 def conversation_loop():
     """
-    Run a continuous conversation loop that:
-      1. Records user audio.
+    Run a continuous conversation on the shared turn pipeline, which:
+      1. Records the user's next utterance (ends on a pause) once the previous reply
+         has played, or with VOICEBOT_BARGE_IN=1 while it is still being spoken.
       2. Transcribes it using Whisper.
       3. Detects the language.
       4. Checks for a cached response.
       5. Generates a response via GPT-3.5 Turbo if needed.
       6. Converts the response to speech and plays it.
     """
-    language_code = None  # To be determined from the first user input
     print("Start chatting with Bharat Bhai (say 'exit' to quit).")
-    
-    while True:
-        print("\nPlease speak your query (recording for 5 seconds)...")
-        audio_file = record_audio(duration=5)
-        transcribed_text, whisper_lang = transcribe_audio(audio_file, model_size="small")
-        print("\n--- Transcribed Text ---")
-        print(transcribed_text)
-        print("Whisper Detected Language:", whisper_lang)
-        
-        try:
-            detected_lang = detect(transcribed_text)
-            print("Langdetect Detected Language:", detected_lang)
-        except Exception as e:
-            print("Language detection error:", e)
-            detected_lang = "en"
-        
-        # Use detected language if available; otherwise, default to English
-        if language_code is None:
-            language_code = detected_lang
-        
-        # Check if user said "exit" or "quit" in their transcription
-        if transcribed_text.strip().lower() in ["exit", "quit"]:
-            break
-        
-        # Check the cache for a similar query
-        cached_response = get_cached_response(transcribed_text)
-        if cached_response is not None:
-            response_text = cached_response
-        else:
-            response_text = generate_response_gpt(transcribed_text, language=language_code)
-            # Cache the new query and its response
-            response_cache[transcribed_text] = response_text
-        
-        print("Bot:", response_text)
-        text_to_speech(response_text, lang=language_code)
+    warm_up([PROBE_MODEL, "small"])
+    VoicePipeline(stages).run()
 
 if __name__ == "__main__":
     conversation_loop()
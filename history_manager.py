@@ -0,0 +1,220 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- History Configuration ----------------
+# Prompt token budget (system prompt + summary + recent turns) and summary size cap.
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "1200"))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", "150"))
+
+# Fixed per-message overhead of the chat format (role and separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+# LLM summaries are written here, off the request path (see ConversationHistory).
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when installed, otherwise estimate them
+    (about 4 ASCII characters per token; Devanagari is far denser).
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    non_ascii = len(_NON_ASCII.findall(text))
+    return int((len(text) - non_ascii) / 4 + non_ascii / 2) + 1
+
+
+def summarize_with_llm(previous_summary: str, messages, max_tokens: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Fold evicted messages into the running summary using GPT-3.5 Turbo.
+    """
+    from llm_client import chat
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    summary = chat(
+        [
+            {
+                "role": "system",
+                "content": (
+                    "You maintain a short running summary of a conversation. Update the summary with the new "
+                    "exchanges, keeping facts, names, the user's problem and anything promised. "
+                    f"Reply with the updated summary only, in under {max_tokens} tokens."
+                ),
+            },
+            {"role": "user", "content": f"Current summary:\n{previous_summary or '(empty)'}\n\nNew exchanges:\n{transcript}"},
+        ],
+        model="gpt-3.5-turbo",
+        temperature=0.2,
+        max_tokens=max_tokens,
+    )
+    return summary.strip()
+
+
+def summarize_extractive(previous_summary: str, messages, max_tokens: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Cheap summarizer that keeps the first sentence of each evicted user message.
+    """
+    points = [re.split(r"(?<=[.!?।])\s", m["content"].strip(), maxsplit=1)[0]
+              for m in messages if m["role"] == "user"]
+    summary = " ".join(filter(None, [previous_summary] + [f"User asked: {p}" for p in points]))
+    # Keep the most recent part of the summary within its budget.
+    while count_tokens(summary) > max_tokens and " " in summary:
+        summary = summary.split(" ", 1)[1]
+    return summary
+
+
+class ConversationHistory:
+    """
+    Chat history kept within a fixed prompt token budget.
+
+    Token counts are computed once per message as it is added. When the system
+    prompt, the running summary and the recent turns exceed `max_tokens`, the
+    oldest turns are removed until the prompt fits (or only the latest message is
+    left), so the prompt size stays bounded however long the conversation runs.
+
+    Removed turns are folded into the summary right away by summarize_extractive,
+    which costs no LLM call; `summarizer` (an LLM by default) then rewrites the summary
+    on a background thread, so appending never waits for it. wait_for_summary() blocks
+    until that rewrite is done.
+    """
+
+    def __init__(self, system_prompt: str, max_tokens: int = HISTORY_TOKEN_BUDGET,
+                 summary_max_tokens: int = SUMMARY_TOKEN_BUDGET, summarizer=summarize_with_llm):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self._system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        self._summary_tokens = 0
+        self._recent = []  # [(message, tokens)]
+        self._recent_tokens = 0
+        self._lock = threading.RLock()
+        self.evicted_messages = 0
+        # Summary written by `summarizer`, and the messages evicted since, which the
+        # current summary only covers extractively.
+        self._base_summary = ""
+        self._unsummarized = []
+        self._summary_job = None
+
+    @property
+    def messages(self) -> list:
+        """
+        The prompt: system prompt, running summary (if any) and the recent turns.
+        """
+        with self._lock:
+            prompt = [self.system_message]
+            if self.summary:
+                prompt.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+            prompt.extend(message for message, _ in self._recent)
+            return prompt
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self._system_tokens + self._summary_tokens + self._recent_tokens
+
+    def append(self, role: str, content: str):
+        """
+        Add a message and evict/summarize old turns if the budget is exceeded.
+        """
+        with self._lock:
+            tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            self._recent.append(({"role": role, "content": content}, tokens))
+            self._recent_tokens += tokens
+            self._enforce_budget()
+
+    def add_turn(self, user_content: str, assistant_content: str):
+        with self._lock:
+            self.append("user", user_content)
+            self.append("assistant", assistant_content)
+
+    def _enforce_budget(self):
+        # The summary grows as turns are folded in, so check again until the prompt fits.
+        evicted = []
+        while self.prompt_tokens > self.max_tokens and len(self._recent) > 1:
+            batch = []
+            # Always keep the latest message, and evict a user message together with its reply.
+            while self.prompt_tokens > self.max_tokens and len(self._recent) > 1:
+                message, tokens = self._recent.pop(0)
+                self._recent_tokens -= tokens
+                batch.append(message)
+                if message["role"] == "user" and len(self._recent) > 1 and self._recent[0][0]["role"] == "assistant":
+                    reply, reply_tokens = self._recent.pop(0)
+                    self._recent_tokens -= reply_tokens
+                    batch.append(reply)
+            self._set_summary(summarize_extractive(self.summary, batch, self.summary_max_tokens))
+            evicted += batch
+        if not evicted:
+            return
+        self.evicted_messages += len(evicted)
+        if self.summarizer is summarize_extractive:
+            self._base_summary = self.summary
+            return
+        self._unsummarized += evicted
+        if self._summary_job is None:
+            self._summary_job = _summary_pool.submit(self._summarize_pending)
+
+    def _set_summary(self, summary: str):
+        self.summary = summary
+        self._summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+
+    def _summarize_pending(self):
+        """
+        Background job: fold the messages evicted so far into the summary with
+        `summarizer`, until none are left.
+        """
+        while True:
+            with self._lock:
+                base, messages = self._base_summary, list(self._unsummarized)
+                if not messages:
+                    self._summary_job = None
+                    return
+            try:
+                summary = self.summarizer(base, messages, self.summary_max_tokens)
+            except Exception as e:
+                print("Summarization error, keeping extractive summary:", e)
+                summary = summarize_extractive(base, messages, self.summary_max_tokens)
+            with self._lock:
+                if self._unsummarized[:len(messages)] != messages:
+                    continue  # Reset meanwhile.
+                self._base_summary = summary
+                del self._unsummarized[:len(messages)]
+                # Turns evicted during the call stay folded in extractively.
+                self._set_summary(summarize_extractive(summary, self._unsummarized, self.summary_max_tokens)
+                                  if self._unsummarized else summary)
+                self._enforce_budget()
+
+    def wait_for_summary(self, timeout: float = None):
+        """
+        Block until the background summary is up to date.
+        """
+        job = self._summary_job
+        while job is not None:
+            job.result(timeout)
+            job = self._summary_job
+
+    def reset(self):
+        with self._lock:
+            self._recent = []
+            self._recent_tokens = 0
+            self._set_summary("")
+            self._base_summary = ""
+            self._unsummarized = []
+
+    def stats(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "max_tokens": self.max_tokens,
+            "recent_messages": len(self._recent),
+            "evicted_messages": self.evicted_messages,
+            "summary_tokens": self._summary_tokens,
+        }
@@ -1,32 +1,29 @@
 import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wavfile
-import whisper
-import os
-from langdetect import detect, DetectorFactory
+from audio_io import pcm16_to_float32, resample
+from stt_router import route_transcribe
+from language_id import identify
 
-# Set a seed to ensure consistent language detection results
-DetectorFactory.seed = 0
-
-def record_audio(duration=5, filename="recorded.wav", fs=16000):
+def record_audio(duration=5, filename=None, fs=16000):
     """
     Record audio from the microphone for a given duration.
+    Returns a 16 kHz float32 array, or saves it to `filename` and returns the path.
     """
     print("Recording... Speak now!")
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
     sd.wait()  # Wait until recording is finished
-    wavfile.write(filename, fs, recording)
-    print(f"Recording saved as {filename}")
-    return filename
+    if filename:
+        wavfile.write(filename, fs, recording)
+        print(f"Recording saved as {filename}")
+        return filename
+    return resample(pcm16_to_float32(recording[:, 0]), fs)
 
-def transcribe_audio(file_path):
+def transcribe_audio(audio):
     """
-    Transcribe an audio file using OpenAI's Whisper model.
+    Transcribe audio (a 16 kHz float32 array or a file path) using OpenAI's Whisper model.
     """
-    print("Loading Whisper model...")
-    model = whisper.load_model("large")  # Using 'large' for best accuracy
-    print("Transcribing audio...")
-    result = model.transcribe(file_path)
+    result = route_transcribe(audio)
     return {
         "text": result["text"],
         "whisper_language": result.get("language", "unknown")
@@ -34,33 +31,26 @@ def transcribe_audio(file_path):
 
 def detect_language(text):
     """
-    Detect language from a given text using langdetect.
+    Detect language from a given text. The Unicode script decides Devanagari vs Latin
+    (and marker words Hindi vs Marathi); langdetect is only used when that is unsure.
     """
-    try:
-        lang = detect(text)
-        return lang
-    except Exception as e:
-        print("Error in language detection:", e)
-        return "unknown"
+    guess = identify(text)
+    print(f"Language ID: {guess.language} via {guess.method} (confidence {guess.confidence:.2f})")
+    return guess.language
 
 if __name__ == "__main__":
-    # Ensure ffmpeg is installed on your system
-    if os.system("ffmpeg -version") != 0:
-        print("ffmpeg is not installed. Please install ffmpeg and try again.")
-        exit(1)
-        
-    # Step 1: Record audio
-    audio_file = record_audio(duration=5)
+    # Step 1: Record audio (kept in memory, so ffmpeg is not needed)
+    audio = record_audio(duration=5)
     
     # Step 2: Transcribe the recorded audio
-    transcription = transcribe_audio(audio_file)
+    transcription = transcribe_audio(audio)
     transcribed_text = transcription["text"]
     whisper_detected_lang = transcription["whisper_language"]
     
-    # Step 3: Additional language detection using langdetect
+    # Step 3: Additional language detection on the transcribed text
     detected_lang = detect_language(transcribed_text)
     
     print("\n--- Transcription Results ---")
     print("Whisper Detected Language:", whisper_detected_lang)
-    print("Langdetect Detected Language:", detected_lang)
+    print("Text Detected Language:", detected_lang)
     print("Transcribed Text:", transcribed_text)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# Result of a language identification: ISO 639-1 code, confidence in [0, 1] and
+# which path produced it ("script", "markers", "langdetect" or "default").
+LanguageGuess = namedtuple("LanguageGuess", ["language", "confidence", "method"])
+
+# Below this confidence the fast path defers to langdetect.
+MIN_CONFIDENCE = 0.75
+
+# Languages the assistant answers in; a langdetect fallback outside this set (e.g.
+# "id" for romanized Hindi) is ignored in favour of the script-based guess.
+SUPPORTED_LANGUAGES = ("en", "hi", "mr")
+
+# ---------------- Script Ranges ----------------
+DEVANAGARI = (0x0900, 0x097F)
+LATIN_BASIC = ((0x41, 0x5A), (0x61, 0x7A))
+LATIN_EXTENDED = (0xC0, 0x24F)
+
+# ---------------- Hindi / Marathi Markers ----------------
+# High-frequency function words that differ between the two languages.
+MARATHI_WORDS = frozenset(
+    "आहे आहेत आणि नाही नाहीये मी तुम्ही तू माझा माझी माझे माझ्या तुमचा तुमची तुमचे तुमच्या "
+    "करा करतो करते करत होता होती होते काय कसे कसा कशी पण आता येथे इथे तिथे म्हणून किंवा "
+    "त्याची त्याचा त्याचे त्यांना आम्ही आपण झाले झाला झाली पाहिजे नका हवे".split()
+)
+HINDI_WORDS = frozenset(
+    "है हैं और नहीं मैं आप तुम मेरा मेरी मेरे आपका आपकी आपके करें करो करते करता करती था थी थे "
+    "क्या कैसे कैसा कैसी लेकिन अब यहाँ यहां वहाँ वहां इसलिए या उसकी उसका उसके उन्हें हम हुआ हुई "
+    "चाहिए मत में की का के को से यह वह हूँ हूं".split()
+)
+# Letter used in Marathi but essentially absent from Hindi.
+MARATHI_LETTER = "\u0933"  # ळ
+
+ENGLISH_WORDS = frozenset(
+    "the a an is are was were be to of and in on for with my your i you it this that how what why "
+    "not no do does can please help me is it's i'm have has from at".split()
+)
+
+# Letters plus Devanagari vowel signs and virama (which \w alone would split words on),
+# excluding the danda and Devanagari digits.
+_WORD = re.compile(r"(?:[^\W\d_]|[\u0900-\u0963\u0971-\u097F])+")
+
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _script_counts(codepoints: np.ndarray):
+    """
+    Return (devanagari, latin) letter counts for an array of code points.
+    """
+    devanagari = np.count_nonzero((codepoints >= DEVANAGARI[0]) & (codepoints <= DEVANAGARI[1]))
+    latin_mask = (codepoints >= LATIN_EXTENDED[0]) & (codepoints <= LATIN_EXTENDED[1])
+    for low, high in LATIN_BASIC:
+        latin_mask |= (codepoints >= low) & (codepoints <= high)
+    return int(devanagari), int(np.count_nonzero(latin_mask))
+
+
+def script_profile(text: str) -> dict:
+    """
+    Share of Devanagari and Latin letters in `text`.
+    """
+    devanagari, latin = _script_counts(_codepoints(text))
+    letters = devanagari + latin
+    return {
+        "devanagari": devanagari / letters if letters else 0.0,
+        "latin": latin / letters if letters else 0.0,
+        "letters": letters,
+    }
+
+
+def hindi_or_marathi(text: str) -> LanguageGuess:
+    """
+    Tell Hindi from Marathi in Devanagari text using marker words and the letter ळ.
+    """
+    words = _WORD.findall(text)
+    marathi = sum(w in MARATHI_WORDS for w in words) + 2 * text.count(MARATHI_LETTER)
+    hindi = sum(w in HINDI_WORDS for w in words)
+    total = marathi + hindi
+    if total == 0:
+        return LanguageGuess("hi", 0.5, "markers")
+    language = "mr" if marathi > hindi else "hi"
+    # Confidence grows with the margin and with the amount of evidence.
+    margin = abs(marathi - hindi) / total
+    evidence = min(1.0, total / 3)
+    return LanguageGuess(language, round(0.5 + 0.5 * margin * evidence, 3), "markers")
+
+
+def _latin_guess(text: str) -> LanguageGuess:
+    words = [w.lower() for w in _WORD.findall(text)]
+    if not words:
+        return LanguageGuess("en", 0.0, "script")
+    ratio = sum(w in ENGLISH_WORDS for w in words) / len(words)
+    # Romanized Hindi/Marathi is also Latin script, so rely on English function words.
+    return LanguageGuess("en", round(min(1.0, 0.5 + 2 * ratio), 3), "script")
+
+
+def _langdetect(text: str):
+    from langdetect import DetectorFactory, detect_langs
+    DetectorFactory.seed = 0
+    try:
+        best = detect_langs(text)[0]
+    except Exception:
+        return None
+    return LanguageGuess(best.lang, round(best.prob, 3), "langdetect")
+
+
+def _fast_guess(text: str, profile: dict) -> LanguageGuess:
+    if profile["letters"] == 0:
+        return LanguageGuess("unknown", 0.0, "default")
+    if profile["devanagari"] >= 0.6:
+        return hindi_or_marathi(text)
+    if profile["latin"] >= 0.9:
+        return _latin_guess(text)
+    return LanguageGuess("unknown", 0.0, "script")
+
+
+@lru_cache(maxsize=4096)
+def identify(text: str, min_confidence: float = MIN_CONFIDENCE) -> LanguageGuess:
+    """
+    Identify the language of `text`. The Unicode script settles Devanagari vs Latin
+    without a model; langdetect is only consulted when that guess is not confident.
+    Results are cached per text.
+    """
+    text = text.strip()
+    guess = _fast_guess(text, script_profile(text))
+    if guess.confidence >= min_confidence:
+        return guess
+    fallback = _langdetect(text) if text else None
+    if fallback is None:
+        return guess if guess.language != "unknown" else LanguageGuess("unknown", 0.0, "default")
+    if fallback.language not in SUPPORTED_LANGUAGES and guess.language != "unknown":
+        return guess
+    return fallback if fallback.confidence >= guess.confidence else guess
+
+
+def identify_batch(texts, min_confidence: float = MIN_CONFIDENCE) -> list:
+    """
+    Identify many texts at once. Script shares for the whole batch are computed in a
+    single vectorized pass; only low-confidence texts reach the per-text fallback.
+    """
+    texts = [t.strip() for t in texts]
+    if not texts:
+        return []
+    codepoints = [_codepoints(t) for t in texts]
+    lengths = np.array([len(c) for c in codepoints])
+    flat = np.concatenate(codepoints) if lengths.sum() else np.zeros(0, dtype=np.uint32)
+    owner = np.repeat(np.arange(len(texts)), lengths)
+
+    dev_mask = (flat >= DEVANAGARI[0]) & (flat <= DEVANAGARI[1])
+    lat_mask = (flat >= LATIN_EXTENDED[0]) & (flat <= LATIN_EXTENDED[1])
+    for low, high in LATIN_BASIC:
+        lat_mask |= (flat >= low) & (flat <= high)
+    devanagari = np.bincount(owner, weights=dev_mask, minlength=len(texts))
+    latin = np.bincount(owner, weights=lat_mask, minlength=len(texts))
+    letters = devanagari + latin
+
+    results = []
+    for i, text in enumerate(texts):
+        profile = {
+            "devanagari": devanagari[i] / letters[i] if letters[i] else 0.0,
+            "latin": latin[i] / letters[i] if letters[i] else 0.0,
+            "letters": int(letters[i]),
+        }
+        guess = _fast_guess(text, profile)
+        results.append(guess if guess.confidence >= min_confidence else identify(text, min_confidence))
+    return results
+
+
+def detect_language(text: str, default: str = "unknown") -> str:
+    """
+    Return just the language code for `text` (or `default` if it cannot be identified).
+    """
+    language = identify(text).language
+    return default if language == "unknown" else language
+
+
+if __name__ == "__main__":
+    samples = [
+        "माझ्या संगणकाला इंटरनेट कनेक्शन नाहीये, कृपया मदत करा.",
+        "मेरा इंटरनेट काम नहीं कर रहा है, कृपया मदद करें।",
+        "My router is not working, please help.",
+        "mera internet nahi chal raha",
+    ]
+    for sample, guess in zip(samples, identify_batch(samples)):
+        print(f"{guess.language} ({guess.confidence:.2f}, {guess.method}): {sample}")
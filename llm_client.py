@@ -0,0 +1,397 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------- LLM Client Configuration ----------------
+# OpenAI-compatible endpoint (point it at a local mock server for tests), per-attempt
+# timeout and overall deadline in seconds, and retry/hedging/circuit-breaker settings.
+BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+DEFAULT_MODEL = "gpt-3.5-turbo"
+ATTEMPT_TIMEOUT = float(os.environ.get("LLM_ATTEMPT_TIMEOUT", "10"))
+DEADLINE = float(os.environ.get("LLM_DEADLINE", "20"))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+# Send a duplicate request if the first has not answered after the recent p95 latency.
+HEDGE = os.environ.get("LLM_HEDGE", "0") == "1"
+BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "16"))
+
+# Status codes worth retrying: rate limiting and server-side failures.
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a chat completion fails (after any retries)."""
+
+
+class DeadlineExceeded(LLMError):
+    """Raised when the call's overall deadline passes before a successful reply."""
+
+
+class CircuitOpen(LLMError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+class _RetryableError(LLMError):
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _resolve_api_key(api_key: str = None) -> str:
+    if api_key:
+        return api_key
+    # Honour a key set on the openai module by a script, without importing it ourselves.
+    openai = sys.modules.get("openai")
+    if openai is not None and getattr(openai, "api_key", None):
+        return openai.api_key
+    return os.environ.get("OPENAI_API_KEY", "")
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and fails fast for `reset_seconds`;
+    then lets a single trial call through (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        """
+        Whether a call may go ahead: True while closed, "trial" for the one half-open
+        trial (which must end with record_success, record_failure or release), else False.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return "trial"
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        End the half-open trial whatever its outcome, so one that recorded neither success
+        nor failure (abandoned or interrupted) does not block every later call.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LLMClient:
+    """
+    Chat-completions client with a pooled keep-alive HTTP session.
+
+    Each call has an overall `deadline`; attempts time out after `attempt_timeout` (or
+    the time left). Connection errors, timeouts, 429 and 5xx are retried up to
+    `max_retries` times with full-jitter exponential backoff (honouring Retry-After).
+    With `hedge`, a duplicate request is sent once an attempt has run longer than the
+    recent p95 latency and the first reply wins. A circuit breaker fails calls fast
+    after repeated failures.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, api_key: str = None, model: str = DEFAULT_MODEL,
+                 attempt_timeout: float = ATTEMPT_TIMEOUT, deadline: float = DEADLINE, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0, hedge: bool = HEDGE,
+                 hedge_min_delay: float = 0.5, pool_size: int = POOL_SIZE, breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-hedge") if hedge else None
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                       "failures": 0, "rejected": 0}
+
+    # ---------------- HTTP ----------------
+    def _headers(self, idempotency_key: str) -> dict:
+        headers = {"Content-Type": "application/json", "Idempotency-Key": idempotency_key}
+        api_key = _resolve_api_key(self.api_key)
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    def _post(self, payload: dict, timeout: float, idempotency_key: str, stream: bool = False):
+        try:
+            response = self.session.post(f"{self.base_url}/chat/completions", json=payload, timeout=timeout,
+                                         headers=self._headers(idempotency_key), stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}")
+        if response.status_code != 200:
+            detail = response.text[:200]
+            response.close()
+            if response.status_code in RETRYABLE_STATUS:
+                retry_after = response.headers.get("Retry-After")
+                raise _RetryableError(f"HTTP {response.status_code}: {detail}",
+                                      float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise LLMError(f"HTTP {response.status_code}: {detail}")
+        return response
+
+    def _attempt(self, payload: dict, timeout: float, idempotency_key: str) -> str:
+        start = time.perf_counter()
+        response = self._post(payload, timeout, idempotency_key)
+        try:
+            content = response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise _RetryableError(f"Malformed response: {e}")
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return content
+
+    # ---------------- Hedging ----------------
+    def hedge_delay(self) -> float:
+        """
+        How long to wait before hedging: the p95 of recent attempt latencies.
+        """
+        with self._lock:
+            recent = sorted(self._latencies)
+        if len(recent) < 20:
+            return max(self.hedge_min_delay, self.attempt_timeout / 2)
+        return max(self.hedge_min_delay, recent[int(len(recent) * 0.95) - 1])
+
+    def _hedged_attempt(self, payload: dict, timeout: float, idempotency_key: str) -> str:
+        primary = self._hedge_pool.submit(self._attempt, payload, timeout, idempotency_key)
+        delay = self.hedge_delay()
+        if delay >= timeout:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        with self._lock:
+            self.counts["hedges"] += 1
+        backup = self._hedge_pool.submit(self._attempt, payload, timeout - delay, idempotency_key)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._lock:
+                            self.counts["hedge_wins"] += 1
+                    # The slower request cannot be cancelled mid-flight; its reply is discarded.
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # ---------------- Public API ----------------
+    def _backoff(self, retry: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def chat(self, messages, model: str = None, temperature: float = 0.7, max_tokens: int = 150,
+             deadline: float = None) -> str:
+        """
+        Return the assistant's reply for `messages`, retrying and hedging within the deadline.
+        """
+        admitted = self.breaker.allow()
+        if not admitted:
+            with self._lock:
+                self.counts["rejected"] += 1
+            raise CircuitOpen("LLM circuit breaker is open; failing fast.")
+        payload = {"model": model or self.model, "messages": messages, "temperature": temperature,
+                   "max_tokens": max_tokens}
+        # The same key on every retry and hedge marks them as one logical request.
+        idempotency_key = uuid.uuid4().hex
+        end = time.monotonic() + (deadline or self.deadline)
+        with self._lock:
+            self.counts["calls"] += 1
+
+        try:
+            retry = 0
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    self._fail()
+                    raise DeadlineExceeded(f"No reply within {deadline or self.deadline}s.")
+                timeout = min(self.attempt_timeout, remaining)
+                with self._lock:
+                    self.counts["attempts"] += 1
+                try:
+                    if self.hedge:
+                        content = self._hedged_attempt(payload, timeout, idempotency_key)
+                    else:
+                        content = self._attempt(payload, timeout, idempotency_key)
+                    self.breaker.record_success()
+                    return content
+                except _RetryableError as e:
+                    if retry >= self.max_retries:
+                        self._fail()
+                        raise LLMError(f"Chat completion failed after {retry + 1} attempts: {e}")
+                    pause = self._backoff(retry, e.retry_after)
+                    if time.monotonic() + pause >= end:
+                        self._fail()
+                        raise DeadlineExceeded(f"Deadline reached while retrying: {e}")
+                    print(f"LLM attempt {retry + 1} failed ({e}); retrying in {pause:.2f}s.")
+                    time.sleep(pause)
+                    retry += 1
+                    with self._lock:
+                        self.counts["retries"] += 1
+                except LLMError:
+                    self._fail()
+                    raise
+                except Exception:
+                    # Any other error (e.g. a malformed URL) is a failed call too.
+                    self._fail()
+                    raise
+        finally:
+            if admitted == "trial":
+                self.breaker.release()
+
+    def stream(self, messages, model: str = None, temperature: float = 0.7, max_tokens: int = 150,
+               deadline: float = None):
+        """
+        Yield content deltas of a streamed reply. Failures before the first byte are
+        retried like `chat`; once tokens flow, the stream is not restarted.
+        """
+        admitted = self.breaker.allow()
+        if not admitted:
+            with self._lock:
+                self.counts["rejected"] += 1
+            raise CircuitOpen("LLM circuit breaker is open; failing fast.")
+        payload = {"model": model or self.model, "messages": messages, "temperature": temperature,
+                   "max_tokens": max_tokens, "stream": True}
+        idempotency_key = uuid.uuid4().hex
+        end = time.monotonic() + (deadline or self.deadline)
+        with self._lock:
+            self.counts["calls"] += 1
+
+        try:
+            retry = 0
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    self._fail()
+                    raise DeadlineExceeded(f"No reply within {deadline or self.deadline}s.")
+                try:
+                    response = self._post(payload, min(self.attempt_timeout, remaining), idempotency_key, stream=True)
+                    break
+                except _RetryableError as e:
+                    if retry >= self.max_retries:
+                        self._fail()
+                        raise LLMError(f"Chat completion failed after {retry + 1} attempts: {e}")
+                    time.sleep(min(self._backoff(retry, e.retry_after), max(0.0, end - time.monotonic())))
+                    retry += 1
+                    with self._lock:
+                        self.counts["retries"] += 1
+                except LLMError:
+                    self._fail()
+                    raise
+                except Exception:
+                    self._fail()
+                    raise
+
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+            except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                self._fail()
+                raise LLMError(f"Stream interrupted: {e}")
+            except Exception:
+                self._fail()
+                raise
+            finally:
+                response.close()
+            self.breaker.record_success()
+        finally:
+            # Also reached when the consumer abandons the stream (GeneratorExit).
+            if admitted == "trial":
+                self.breaker.release()
+
+    def _fail(self):
+        self.breaker.record_failure()
+        with self._lock:
+            self.counts["failures"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = sorted(self._latencies)
+            stats = dict(self.counts)
+        stats["breaker"] = self.breaker.state
+        if recent:
+            stats["p50"] = round(recent[len(recent) // 2], 4)
+            stats["p95"] = round(recent[max(0, int(len(recent) * 0.95) - 1)], 4)
+        return stats
+
+
+# Shared client used by every generate_response* in the project.
+client = LLMClient()
+
+
+def configure(**options) -> LLMClient:
+    """
+    Replace the shared client (e.g. to point it at a mock server or enable hedging).
+    """
+    global client
+    client = LLMClient(**options)
+    return client
+
+
+def chat(messages, **kwargs) -> str:
+    """
+    Reply for `messages` from the shared client (see LLMClient.chat).
+    """
+    return client.chat(messages, **kwargs)
+
+
+def stream_chat(messages, **kwargs):
+    return client.stream(messages, **kwargs)
+
+
+def llm_stats() -> dict:
+    return client.stats()
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+import requests
+
+DEFAULT_CLIP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_dynamic.wav")
+
+# Server-side stages that measure waiting rather than work (see app.py timings).
+QUEUE_STAGES = ("stt_queue", "session_lock")
+
+
+def percentiles(values, qs=(50, 95, 99)) -> dict:
+    if not values:
+        return {f"p{q}": None for q in qs}
+    return {f"p{q}": round(float(np.percentile(values, q)), 4) for q in qs}
+
+
+class VirtualUser(threading.Thread):
+    """
+    One synthetic conversation: uploads clips as consecutive turns of its own session,
+    pausing for a randomized think time between turns.
+    """
+
+    def __init__(self, base_url: str, clips, turns: int, think_time: float, start_delay: float,
+                 tts: bool, timeout: float, results: list, lock: threading.Lock, seed: int):
+        super().__init__(daemon=True)
+        self.url = f"{base_url.rstrip('/')}/api/sessions/{uuid.uuid4().hex[:12]}/message"
+        if tts:
+            self.url += "?tts=1"
+        self.clips = clips
+        self.turns = turns
+        self.think_time = think_time
+        self.start_delay = start_delay
+        self.timeout = timeout
+        self.results = results
+        self.lock = lock
+        self.rng = random.Random(seed)
+
+    def run(self):
+        time.sleep(self.start_delay)
+        with requests.Session() as http:
+            for turn in range(self.turns):
+                if turn and self.think_time:
+                    # Uniform jitter around the mean keeps users from moving in lockstep.
+                    time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+                name, data = self.clips[self.rng.randrange(len(self.clips))]
+                record = {"start": time.perf_counter(), "status": None, "error": None}
+                try:
+                    response = http.post(self.url, files={"audio": (name, data, "audio/wav")}, timeout=self.timeout)
+                    record["status"] = response.status_code
+                    body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+                    record["timings"] = body.get("timings", {})
+                    if response.status_code != 200:
+                        record["error"] = body.get("error", response.reason)
+                except requests.RequestException as e:
+                    record["error"] = f"{type(e).__name__}: {e}"
+                record["latency"] = time.perf_counter() - record["start"]
+                with self.lock:
+                    self.results.append(record)
+
+
+def run_step(base_url: str, clips, users: int, turns: int, think_time: float, ramp_seconds: float,
+             tts: bool = False, timeout: float = 120.0, seed: int = 0) -> dict:
+    """
+    Drive `users` concurrent sessions (started evenly over `ramp_seconds`) and summarize
+    throughput, errors, client latency and server-side queueing delay.
+    """
+    results, lock = [], threading.Lock()
+    threads = [
+        VirtualUser(base_url, clips, turns, think_time, ramp_seconds * i / max(1, users), tts, timeout,
+                    results, lock, seed + i)
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    queue_delays = [sum(r["timings"].get(stage, 0.0) for stage in QUEUE_STAGES) for r in ok]
+    status_counts = {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else "connection_error"
+        status_counts[key] = status_counts.get(key, 0) + 1
+    return {
+        "users": users,
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "statuses": status_counts,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "latency": percentiles([r["latency"] for r in ok]),
+        "queue_delay": percentiles(queue_delays),
+        "server_transcribe": percentiles([r["timings"].get("transcribe", 0.0) for r in ok]),
+        "server_llm": percentiles([r["timings"].get("llm", 0.0) for r in ok]),
+    }
+
+
+def find_saturation(steps, min_gain: float = 0.05, max_error_rate: float = 0.01):
+    """
+    Return the first concurrency level after which adding users stops helping: throughput
+    grows by less than `min_gain`, or the error rate exceeds `max_error_rate`.
+    """
+    for previous, step in zip(steps, steps[1:]):
+        if (step["error_rate"] or 0) > max_error_rate:
+            return previous["users"]
+        if previous["throughput_rps"] and step["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            return previous["users"]
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load-test the voice API with concurrent synthetic sessions. Start the server with "
+                    "VOICEBOT_STUB_BACKENDS=1 so the LLM and TTS are local stand-ins."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Base URL of the running app.py.")
+    parser.add_argument("--clips", nargs="+", default=[DEFAULT_CLIP], help="WAV clips uploaded as user turns.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Concurrency levels to step through.")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session.")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between a user's turns (s).")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which each step's users start.")
+    parser.add_argument("--tts", action="store_true", help="Request reply audio (?tts=1) as well.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("-o", "--output", default="loadtest.json", help="JSON file to write the results to.")
+    args = parser.parse_args(argv)
+
+    clips = []
+    for path in args.clips:
+        with open(path, "rb") as f:
+            clips.append((os.path.basename(path), f.read()))
+
+    steps = []
+    for users in args.users:
+        step = run_step(args.url, clips, users, args.turns, args.think_time, args.ramp, args.tts, args.timeout)
+        steps.append(step)
+        print(f"{users:>4} users: {step['throughput_rps']} req/s, errors {step['error_rate']:.1%}, "
+              f"latency p50 {step['latency']['p50']}s p95 {step['latency']['p95']}s, "
+              f"queueing p95 {step['queue_delay']['p95']}s  {step['statuses']}")
+
+    saturation = find_saturation(steps)
+    print(f"Saturation at {saturation} concurrent users." if saturation else "No saturation reached; try more users.")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "steps": steps, "saturation_users": saturation}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import math
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from audio_preprocess import speech_mask
+from stt_engines import limit_cpu_threads, torch_threads
+from whisper_registry import assign_thread_replica, registry, using_model
+
+# ---------------- Settings ----------------
+# Recordings longer than this are transcribed in chunks, in parallel, instead of as one
+# sequential pass over Whisper's 30-second windows.
+LONG_AUDIO_SECONDS = float(os.environ.get("LONG_AUDIO_SECONDS", "60"))
+# Chunks are cut at the last pause of at least MIN_PAUSE_MS (else the longest pause)
+# between MIN_CHUNK_SECONDS and CHUNK_SECONDS from the previous cut, and decoded with
+# OVERLAP_SECONDS of context on each side, which keeps every decode within one
+# 30-second window.
+CHUNK_SECONDS = 28.0
+MIN_CHUNK_SECONDS = 10.0
+MIN_PAUSE_MS = 300
+OVERLAP_SECONDS = 1.0
+# Chunks decoded at once by the in-process pool. Each worker thread uses its own model
+# replica (see whisper_registry.assign_thread_replica), so memory grows with it, and
+# decodes with an equal share of the cores (see stt_engines.limit_cpu_threads and
+# torch_threads). With 1, chunks are decoded one after another on the calling thread
+# (batch_transcribe's worker processes, which are parallel already).
+LONG_AUDIO_WORKERS = int(os.environ.get("LONG_AUDIO_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+# Words compared when removing text repeated on both sides of a cut.
+DEDUP_WORDS = 8
+
+# A planned chunk in samples; `hard_cut` means it starts mid-speech (no pause was found).
+Chunk = namedtuple("Chunk", "start end hard_cut speech")
+
+_PUNCTUATION = ".,!?;:।\"'()-"
+
+_executor = None
+_executor_lock = threading.Lock()
+# Per pool thread: its share of the cores, set by _init_worker.
+_worker = threading.local()
+
+
+class _InlineExecutor:
+    """
+    Runs each job as it is submitted, on the calling thread and its model replica.
+    """
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _init_worker(threads: int):
+    assign_thread_replica()
+    limit_cpu_threads(threads)
+    _worker.threads = threads
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if LONG_AUDIO_WORKERS <= 1:
+                _executor = _InlineExecutor()
+            else:
+                # Every replica decoding with all the cores would oversubscribe them.
+                threads = max(1, (os.cpu_count() or 1) // LONG_AUDIO_WORKERS)
+                _executor = ThreadPoolExecutor(max_workers=LONG_AUDIO_WORKERS, thread_name_prefix="long-audio",
+                                               initializer=_init_worker, initargs=(threads,))
+        return _executor
+
+
+# ---------------- Chunking ----------------
+def plan_chunks(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, chunk_seconds: float = CHUNK_SECONDS,
+                min_chunk_seconds: float = MIN_CHUNK_SECONDS) -> list:
+    """
+    Split a recording into chunks of at most `chunk_seconds`, cutting in the middle of
+    a pause (a run of non-speech frames): the last one of at least MIN_PAUSE_MS in each
+    window, so chunks stay long, or else the longest. Where there is no pause at all,
+    the cut is made at the window's end. Chunks without any speech are marked so they
+    can be skipped.
+    """
+    speech, frame_len = speech_mask(audio, sample_rate)
+    frame_ms = frame_len * 1000 / sample_rate
+    # Runs of non-speech frames: the padding makes every run start and end with a change.
+    edges = np.flatnonzero(np.diff(np.concatenate(([True], speech, [True])).astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    centers, lengths = (starts + ends) // 2 * frame_len, ends - starts
+
+    max_len, min_len = int(chunk_seconds * sample_rate), int(min_chunk_seconds * sample_rate)
+    cuts, hard = [0], [False]
+    while len(audio) - cuts[-1] > max_len:
+        inside = (centers >= cuts[-1] + min_len) & (centers <= cuts[-1] + max_len)
+        if inside.any():
+            candidates = np.flatnonzero(inside)
+            long_enough = candidates[lengths[candidates] * frame_ms >= MIN_PAUSE_MS]
+            best = long_enough[-1] if len(long_enough) else candidates[np.argmax(lengths[candidates])]
+            cuts.append(int(centers[best]))
+            hard.append(False)
+        else:
+            cuts.append(cuts[-1] + max_len)
+            hard.append(True)
+    cuts.append(len(audio))
+
+    speech_samples = np.concatenate(([0], np.cumsum(np.repeat(speech, frame_len))))
+    chunks = []
+    for i in range(len(cuts) - 1):
+        start, end = cuts[i], cuts[i + 1]
+        voiced = speech_samples[min(end, len(speech_samples) - 1)] - speech_samples[min(start, len(speech_samples) - 1)]
+        chunks.append(Chunk(start, end, hard[i], bool(voiced)))
+    return chunks
+
+
+# ---------------- Merging ----------------
+def _words(text: str) -> list:
+    return [word.strip(_PUNCTUATION).lower() for word in text.split()]
+
+
+def drop_repeated_words(previous: str, text: str, min_words: int = 1, max_words: int = DEDUP_WORDS) -> str:
+    """
+    Remove the longest run of words at the start of `text` that repeats the end of
+    `previous` (ignoring case and punctuation), as happens when a word straddles a cut.
+    """
+    tail = _words(previous)[-max_words:]
+    words = text.split()
+    head = _words(text)[:max_words]
+    for n in range(min(len(tail), len(head)), min_words - 1, -1):
+        if n and tail[-n:] == head[:n]:
+            rest = " ".join(words[n:])
+            return " " + rest if rest else ""
+    return text
+
+
+def merge_chunks(chunks: list, results: list, sample_rate: int = SAMPLE_RATE,
+                 overlap_seconds: float = OVERLAP_SECONDS) -> list:
+    """
+    Merge per-chunk Whisper results into one list of segments with timestamps on the
+    whole recording. A segment decoded in an overlap is kept only by the chunk that
+    owns its midpoint, and words repeated across a cut are dropped once.
+    """
+    segments = []
+    for i, (chunk, result) in enumerate(zip(chunks, results)):
+        if result is None:
+            continue
+        offset = max(0, chunk.start - int(overlap_seconds * sample_rate)) / sample_rate
+        low = chunk.start / sample_rate if i > 0 else -math.inf
+        high = chunk.end / sample_rate if i < len(chunks) - 1 else math.inf
+        first = True
+        for segment in result.get("segments") or []:
+            start, end = segment["start"] + offset, segment["end"] + offset
+            if not low <= (start + end) / 2 < high:
+                continue
+            text = segment["text"]
+            if first and segments:
+                text = drop_repeated_words(segments[-1]["text"], text, min_words=1 if chunk.hard_cut else 2)
+            first = False
+            if text.strip():
+                segments.append({**segment, "start": round(start, 3), "end": round(end, 3), "text": text})
+    return segments
+
+
+# ---------------- Transcription ----------------
+def decode_chunk(audio: np.ndarray, model_size: str, language: str = None, device: str = None) -> dict:
+    """
+    Decode one chunk on the calling thread's model replica (a pool job), on a pool
+    thread with its share of the cores.
+    """
+    with using_model(model_size, device=device) as model, torch_threads(getattr(_worker, "threads", None)):
+        return registry.engine.transcribe(model, audio, language=language)
+
+
+def transcribe_chunks(audio: np.ndarray, model_size: str, language: str = None, device: str = None,
+                      executor=None, decode=decode_chunk, sample_rate: int = SAMPLE_RATE) -> dict:
+    """
+    Transcribe a long recording as overlapping chunks decoded in parallel on `executor`
+    (the shared thread pool by default; batch_transcribe passes its process pool) and
+    merged back in order. Returns a Whisper-style result ("text", "language",
+    "segments") plus the number of chunks planned and decoded.
+    """
+    executor = executor or _get_executor()
+    chunks = plan_chunks(audio, sample_rate)
+    overlap = int(OVERLAP_SECONDS * sample_rate)
+    futures = [
+        executor.submit(decode, audio[max(0, chunk.start - overlap):chunk.end + overlap], model_size, language, device)
+        if chunk.speech else None
+        for chunk in chunks
+    ]
+    print(f"Transcribing {len(audio) / sample_rate:.1f}s of audio as {sum(f is not None for f in futures)} "
+          f"chunks with Whisper '{model_size}'...")
+    try:
+        results = [future.result() if future is not None else None for future in futures]
+    finally:
+        for future in futures:
+            if future is not None:
+                future.cancel()
+    segments = merge_chunks(chunks, results, sample_rate)
+    languages = [result.get("language") for result in results if result is not None and result.get("language")]
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "language": language or (max(set(languages), key=languages.count) if languages else None),
+        "segments": segments,
+        "chunks": len(chunks),
+        "decoded_chunks": sum(result is not None for result in results),
+    }
@@ -0,0 +1,321 @@
+import bisect
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# ---------------- Metrics Configuration ----------------
+# Emit one JSON line per finished turn (set METRICS_JSON_LOG=1).
+JSON_LOG = os.environ.get("METRICS_JSON_LOG", "0") == "1"
+# Number of recent observations per stage used for the p50/p95/p99 estimates.
+QUANTILE_WINDOW = int(os.environ.get("METRICS_QUANTILE_WINDOW", "1024"))
+
+# Histogram bucket upper bounds in seconds (a voice turn spans ~10 ms to tens of seconds).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage name used for the whole turn.
+TURN = "turn"
+
+# Collector keys with these endings are monotonic and exported as counters.
+COUNTER_KEYS = ("hits", "misses", "coalesced", "evictions", "escalations", "calls", "attempts", "retries",
+                "hedges", "hedge_wins", "failures", "rejected", "played", "interrupted", "dropped", "no_speech",
+                "removed_seconds")
+
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _quantile(sorted_values, q: float) -> float:
+    """
+    Linear-interpolated quantile of an already sorted list.
+    """
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _flatten(values: dict) -> dict:
+    flat = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            flat.update({f"{key}_{inner}": v for inner, v in value.items()})
+        else:
+            flat[key] = value
+    return flat
+
+
+class LatencyHistogram:
+    """
+    Cumulative bucket counts (for Prometheus) plus a window of recent values
+    (for exact p50/p95/p99). Observing is O(log buckets) under a short lock.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = QUANTILE_WINDOW):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._recent.append(seconds)
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            recent = sorted(self._recent)
+            count, total = self.count, self.sum
+        cumulative, running = [], 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            running += n
+            cumulative.append((bound, running))
+        return {
+            "count": count,
+            "sum": total,
+            "buckets": cumulative,
+            "quantiles": {q: _quantile(recent, q) for q in QUANTILES},
+            "window_count": len(recent),
+            "window_sum": sum(recent),
+        }
+
+
+class Metrics:
+    """
+    In-process stage latencies, counters and pull-time collectors (e.g. cache stats),
+    rendered as Prometheus text or a JSON-friendly snapshot.
+    """
+
+    def __init__(self, prefix: str = "voicebot"):
+        self.prefix = prefix
+        self._stages = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, name: str, collect):
+        """
+        Register `collect() -> dict` to be read at scrape time. Numeric values (one level
+        of nested dicts included) become `<prefix>_<name>_<key>`; hit/miss style keys are
+        exported as counters.
+        """
+        self._collectors.append((name, collect))
+
+    def snapshot(self) -> dict:
+        stages = {}
+        for stage, histogram in sorted(self._stages.items()):
+            snap = histogram.snapshot()
+            stages[stage] = {
+                "count": snap["count"],
+                "mean": round(snap["sum"] / snap["count"], 4) if snap["count"] else None,
+                **{f"p{int(q * 100)}": round(v, 4) for q, v in snap["quantiles"].items() if not math.isnan(v)},
+            }
+        with self._lock:
+            counters = {name + "".join(f"{{{k}={v}}}" for k, v in labels): value
+                        for (name, labels), value in self._counters.items()}
+        collected = {}
+        for name, collect in self._collectors:
+            try:
+                collected[name] = collect()
+            except Exception as e:
+                collected[name] = {"error": str(e)}
+        return {"stages": stages, "counters": counters, "collected": collected}
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Latency of each pipeline stage and of the whole turn.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        quantile_lines = [
+            f"# HELP {p}_stage_seconds_window Latency quantiles over the last {QUANTILE_WINDOW} observations.",
+            f"# TYPE {p}_stage_seconds_window summary",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            snap = histogram.snapshot()
+            for bound, count in snap["buckets"]:
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {snap["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {snap["count"]}')
+            for q, value in snap["quantiles"].items():
+                quantile_lines.append(f'{p}_stage_seconds_window{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            quantile_lines.append(f'{p}_stage_seconds_window_sum{{stage="{stage}"}} {snap["window_sum"]:.6f}')
+            quantile_lines.append(f'{p}_stage_seconds_window_count{{stage="{stage}"}} {snap["window_count"]}')
+        lines.extend(quantile_lines)
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {p}_{name} counter")
+                typed.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        for name, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            for key, value in sorted(_flatten(values).items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = _INVALID_NAME.sub("_", f"{p}_{name}_{key}")
+                if key.startswith("routed_") or key.endswith(COUNTER_KEYS):
+                    lines.append(f"# TYPE {metric}_total counter")
+                    lines.append(f"{metric}_total {value}")
+                else:
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared metrics for the process.
+metrics = Metrics()
+
+_current = threading.local()
+
+
+class Trace:
+    """
+    Per-turn timing spans tagged with a request ID.
+
+    Each `span(stage)` measures one stage; a stage entered more than once (e.g. TTS
+    per sentence) accumulates. A span opened inside another on the same thread is
+    excluded from its parent, so nested stages (e.g. TTS inside the LLM stage) are
+    counted once. Spans on other threads run alongside and are not excluded, and stages
+    recorded with `add` are measured by the caller (e.g. "stt_queue" is part of
+    "transcribe"). `finish()` records every stage and the whole turn in the shared
+    histograms and optionally logs the turn as one JSON line.
+    """
+
+    def __init__(self, request_id: str = None, registry: Metrics = None, route: str = ""):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.registry = registry or metrics
+        self.route = route
+        self.stages = {}
+        self.fields = {}
+        self._start = time.perf_counter()
+        self._finished = False
+        self._open = threading.local()  # Per thread: time taken by the children of each open span.
+
+    @contextmanager
+    def span(self, stage: str):
+        children = self._open.__dict__.setdefault("stack", [])
+        children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = children.pop()
+            if children:
+                children[-1] += elapsed
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed - nested
+
+    def add(self, stage: str, seconds: float):
+        """
+        Record a stage measured elsewhere (e.g. on a worker thread).
+        """
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def annotate(self, **fields):
+        self.fields.update(fields)
+
+    def finish(self, status: str = "ok", **fields) -> dict:
+        if self._finished:
+            return self.as_dict()
+        self._finished = True
+        self.fields.update(fields)
+        self.total = time.perf_counter() - self._start
+        for stage, seconds in self.stages.items():
+            self.registry.observe(stage, seconds)
+        self.registry.observe(TURN, self.total)
+        self.registry.inc("turns_total", route=self.route or "unknown", status=status)
+        self.status = status
+        record = self.as_dict()
+        if JSON_LOG:
+            print(json.dumps(record, ensure_ascii=False, default=str))
+        if getattr(_current, "trace", None) is self:
+            _current.trace = None
+        return record
+
+    def as_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "status": getattr(self, "status", None),
+            "total": round(getattr(self, "total", time.perf_counter() - self._start), 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            **self.fields,
+        }
+
+
+def start_trace(request_id: str = None, route: str = "") -> Trace:
+    """
+    Start a turn's trace and make it current for this thread (see `span`).
+    """
+    trace = Trace(request_id, route=route)
+    _current.trace = trace
+    return trace
+
+
+def current_trace():
+    return getattr(_current, "trace", None)
+
+
+@contextmanager
+def use_trace(trace: Trace):
+    """
+    Make `trace` current on this thread for the block (e.g. a turn on a worker thread),
+    restoring the previous one afterwards.
+    """
+    previous = current_trace()
+    _current.trace = trace
+    try:
+        yield trace
+    finally:
+        _current.trace = previous
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage on the current thread's trace; a no-op outside a trace.
+    """
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    with trace.span(stage):
+        yield trace
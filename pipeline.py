@@ -0,0 +1,245 @@
+import os
+import queue
+import threading
+
+import playback
+from metrics import Trace, span, use_trace
+
+# ---------------- Settings ----------------
+# Turns that may wait between two stages. A full queue blocks the stage before it, so a
+# slow LLM holds back capture instead of piling up unanswered utterances.
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+EXIT_COMMANDS = ("exit", "quit")
+
+# Stage names, in order; they are also the trace/metrics stage names.
+STAGES = ("record", "transcribe", "language_id", "llm", "tts")
+
+_STOP = object()
+
+
+def is_exit_command(text: str) -> bool:
+    """
+    True for "exit" or "quit", ignoring case and the punctuation Whisper adds ("Exit.").
+    """
+    return text.strip().lower().strip(".!?।, ") in EXIT_COMMANDS
+
+
+class Turn:
+    """
+    One user turn as it moves through the stages, which fill in its fields.
+    """
+
+    def __init__(self, number: int = 0, audio=None, trace: Trace = None):
+        self.number = number
+        self.audio = audio
+        self.text = None
+        self.whisper_language = None
+        self.language = None
+        self.reply = None
+        self.exit = False
+        self.no_speech = False
+        self.error = None
+        self.trace = trace
+        # Set once the turn has left the last stage (answered, skipped or failed).
+        self.done = threading.Event()
+
+
+class TurnStages:
+    """
+    The stage functions a front-end supplies, run by `run_turn` (one turn on the
+    calling thread) or by VoicePipeline (continuously, stages overlapping):
+
+        record() -> audio
+        transcribe(audio) -> (text, whisper_language)
+        detect(text, whisper_language) -> language
+        generate(text, language) -> reply       (keeps the front-end's history)
+        speak(reply, language)                  (None if generate already spoke)
+
+    `on_stage(stage, turn)` is called after every stage, e.g. to print the transcript.
+    A turn whose transcript is empty (no speech was captured) ends after transcription,
+    without an LLM call.
+    """
+
+    def __init__(self, record, transcribe, detect, generate, speak=None, is_exit=is_exit_command,
+                 on_stage=None, route: str = "pipeline"):
+        self.record = record
+        self.transcribe = transcribe
+        self.detect = detect
+        self.generate = generate
+        self.speak = speak
+        self.is_exit = is_exit
+        self.on_stage = on_stage
+        self.route = route
+
+    def step(self, stage: str, turn: Turn):
+        """
+        Run one stage of `turn`, timing it on the turn's trace (which is current on
+        this thread meanwhile, so the stage can annotate it and time nested stages).
+        """
+        with use_trace(turn.trace), span(stage):
+            if stage == "record":
+                turn.audio = self.record()
+            elif stage == "transcribe":
+                turn.text, turn.whisper_language = self.transcribe(turn.audio)
+                turn.no_speech = not turn.text.strip()
+                turn.exit = self.is_exit(turn.text)
+            elif stage == "language_id":
+                turn.language = self.detect(turn.text, turn.whisper_language)
+            elif stage == "llm":
+                turn.reply = self.generate(turn.text, turn.language)
+            elif stage == "tts" and self.speak is not None:
+                self.speak(turn.reply, turn.language)
+        if self.on_stage is not None:
+            self.on_stage(stage, turn)
+
+    def run_turn(self, audio=None, trace: Trace = None) -> Turn:
+        """
+        Run one complete turn on the calling thread (recording unless `audio` is given)
+        and return it; it stops after transcription if the user asked to exit or said
+        nothing. Stage errors propagate to the caller.
+        """
+        turn = Turn(audio=audio, trace=trace)
+        for stage in STAGES:
+            if stage == "record" and audio is not None:
+                continue
+            self.step(stage, turn)
+            if turn.exit or turn.no_speech:
+                break
+        return turn
+
+
+class VoicePipeline:
+    """
+    Runs a conversation continuously with one worker thread per stage, connected by
+    bounded queues. With `barge_in` (by default VOICEBOT_BARGE_IN, see playback) the
+    next utterance is captured (and transcribed) while the current reply is still being
+    generated, synthesized and played. Without it the microphone stays closed until the
+    previous turn has been answered and `player` has played its reply, so on open
+    speakers the bot never records itself.
+
+    Turns keep their order. A stage that fails marks the turn and the remaining stages
+    skip it. Saying "exit" ends the conversation once the turns before it are done.
+    """
+
+    def __init__(self, stages: TurnStages, queue_size: int = PIPELINE_QUEUE_SIZE, on_turn=None,
+                 barge_in: bool = None, player=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_turn = on_turn
+        self.barge_in = playback.BARGE_IN if barge_in is None else barge_in
+        self.player = playback.player if player is None else player
+        self.turns = 0
+        self._listening = threading.Event()
+        self._stopping = threading.Event()
+        self._finished = threading.Event()
+        self._threads = []
+
+    def stop(self):
+        """
+        Stop capturing and end run(); turns already in flight are abandoned.
+        """
+        self._listening.clear()
+        self._stopping.set()
+        self._finished.set()
+
+    def run(self, max_turns: int = None) -> int:
+        """
+        Converse until the user says "exit", `max_turns` turns are done or stop() is
+        called. Returns the number of completed turns.
+        """
+        self._listening.set()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES[1:]]
+        self._threads = [threading.Thread(target=self._capture, args=(queues[0], max_turns), name="pipeline-record",
+                                          daemon=True)]
+        for i, stage in enumerate(STAGES[1:]):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            self._threads.append(threading.Thread(target=self._work, args=(stage, queues[i], outbox, max_turns),
+                                                  name=f"pipeline-{stage}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        try:
+            while not self._finished.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            print("Conversation interrupted.")
+        self.stop()
+        return self.turns
+
+    def _put(self, outbox: queue.Queue, item) -> bool:
+        # Block while the next stage is busy (backpressure), but give up on stop().
+        while not self._stopping.is_set():
+            try:
+                outbox.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _await_reply(self, turn: Turn) -> bool:
+        # Half-duplex: wait until `turn` has been answered and its reply has played out.
+        # False if the conversation was stopped (or ended by "exit") meanwhile.
+        while not turn.done.wait(0.2):
+            if self._stopping.is_set():
+                return False
+        while not self.player.wait(0.2):
+            if self._stopping.is_set():
+                return False
+        return self._listening.is_set()
+
+    def _capture(self, outbox: queue.Queue, max_turns: int):
+        number = 0
+        previous = None
+        while self._listening.is_set() and (max_turns is None or number < max_turns):
+            if previous is not None and not self.barge_in and not self._await_reply(previous):
+                break
+            turn = Turn(number + 1, trace=Trace(route=self.stages.route))
+            try:
+                self.stages.step("record", turn)
+            except Exception as e:
+                # Typically nothing was said before the recorder timed out; listen again.
+                print(f"Recording failed: {e}")
+                self._stopping.wait(0.5)
+                continue
+            if not self._listening.is_set() or not self._put(outbox, turn):
+                break
+            number += 1
+            previous = turn
+        self._put(outbox, _STOP)
+
+    def _work(self, stage: str, inbox: queue.Queue, outbox: queue.Queue, max_turns: int):
+        while True:
+            turn = inbox.get()
+            if turn is _STOP:
+                if outbox is not None:
+                    self._put(outbox, _STOP)
+                else:
+                    self._finished.set()
+                return
+            if turn.error is None and not turn.exit and not turn.no_speech:
+                try:
+                    self.stages.step(stage, turn)
+                except Exception as e:
+                    print(f"Turn {turn.number} failed at {stage}: {e}")
+                    turn.error = e
+                if turn.exit:
+                    # Stop listening; the turns captured before this one still get their replies.
+                    self._listening.clear()
+            if outbox is not None:
+                self._put(outbox, turn)
+            else:
+                self._complete(turn, max_turns)
+
+    def _complete(self, turn: Turn, max_turns: int):
+        status = "exit" if turn.exit else "error" if turn.error is not None else "no_speech" if turn.no_speech else "ok"
+        turn.trace.finish(status)
+        if self.on_turn is not None:
+            self.on_turn(turn)
+        turn.done.set()
+        if turn.exit:
+            self._finished.set()
+            return
+        if turn.no_speech:
+            return
+        self.turns += 1
+        if max_turns is not None and self.turns >= max_turns:
+            self._finished.set()
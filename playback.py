@@ -0,0 +1,337 @@
+import io
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+from tts_chunks import strip_id3
+
+# ---------------- Settings ----------------
+# "auto" plays in-memory through sounddevice when it and ffmpeg (for MP3 decoding) are
+# available and falls back to playsound; "null" discards audio (headless runs, tests).
+PLAYBACK_SINK = os.environ.get("PLAYBACK_SINK", "auto")
+# MP3 is decoded to this rate; Google Cloud TTS and gTTS both produce 24 kHz audio.
+PLAYBACK_RATE = 24000
+# Half-duplex by default: the microphone only opens once the reply has finished, since
+# on open speakers without echo cancellation the recorder would hear the reply and cut
+# it off. With a headset or echo cancellation, set VOICEBOT_BARGE_IN=1 to listen while
+# a reply plays and stop it as soon as the user speaks.
+BARGE_IN = os.environ.get("VOICEBOT_BARGE_IN", "0") == "1"
+# Playback is written in blocks this long, which bounds how late a barge-in stops it.
+BLOCK_SECONDS = 0.05
+
+# Layer III bitrates (kbit/s) by index, for MPEG-1 and for MPEG-2/2.5.
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_BITRATES[0] = _MP3_BITRATES[2]
+
+
+# ---------------- Decoding ----------------
+def audio_duration(audio: bytes):
+    """
+    Length in seconds of WAV or constant-bitrate MP3 audio, or None if unknown.
+    """
+    if audio[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(audio)) as w:
+                return w.getnframes() / w.getframerate()
+        except (wave.Error, EOFError):
+            return None
+    frames = strip_id3(audio)
+    if len(frames) < 4 or frames[0] != 0xFF or frames[1] & 0xE0 != 0xE0:
+        return None
+    version, layer, index = (frames[1] >> 3) & 3, (frames[1] >> 1) & 3, frames[2] >> 4
+    if layer != 1 or version not in _MP3_BITRATES or not 0 < index < 15:
+        return None
+    return len(frames) * 8 / (_MP3_BITRATES[version][index] * 1000)
+
+
+def decode_pcm(audio: bytes):
+    """
+    Decode WAV (in-process) or MP3 (through an ffmpeg pipe, no temp file) audio to an
+    int16 array of shape (samples, channels). Returns (samples, sample_rate).
+    """
+    if audio[:4] == b"RIFF":
+        with wave.open(io.BytesIO(audio)) as w:
+            if w.getsampwidth() != 2:
+                raise ValueError("Only 16-bit WAV audio can be played.")
+            channels, rate = w.getnchannels(), w.getframerate()
+            pcm = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        return pcm.reshape(-1, channels), rate
+    process = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(PLAYBACK_RATE), "pipe:1"],
+        input=audio, capture_output=True, check=True,
+    )
+    return np.frombuffer(process.stdout, dtype=np.int16).reshape(-1, 1), PLAYBACK_RATE
+
+
+# ---------------- Sinks ----------------
+# A sink's play(audio, stop, progress) plays one clip, calling progress(seconds) as it
+# goes, and returns False if `stop` (a threading.Event) cut it short.
+class SoundDeviceSink:
+    """
+    Plays decoded PCM from memory through sounddevice, checking for a stop between
+    blocks so a barge-in silences the speaker within BLOCK_SECONDS.
+    """
+
+    def play(self, audio: bytes, stop: threading.Event, progress) -> bool:
+        import sounddevice as sd
+        samples, rate = decode_pcm(audio)
+        block = max(1, int(rate * BLOCK_SECONDS))
+        with sd.OutputStream(samplerate=rate, channels=samples.shape[1], dtype="int16") as stream:
+            for start in range(0, len(samples), block):
+                if stop.is_set():
+                    stream.abort()
+                    return False
+                stream.write(samples[start:start + block])
+                progress(min(start + block, len(samples)) / rate)
+        return True
+
+
+class PlaysoundSink:
+    """
+    Plays through playsound from a uniquely named temporary file, so concurrent turns
+    never overwrite each other's audio. playsound cannot be interrupted, so a barge-in
+    takes effect when the current clip ends.
+    """
+
+    def play(self, audio: bytes, stop: threading.Event, progress) -> bool:
+        from playsound import playsound
+        if stop.is_set():
+            return False
+        fd, path = tempfile.mkstemp(prefix="voicebot-", suffix=".wav" if audio[:4] == b"RIFF" else ".mp3")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            playsound(path)
+        finally:
+            os.remove(path)
+        progress(audio_duration(audio) or 0.0)
+        return True
+
+
+class NullSink:
+    """
+    Discards audio, optionally taking as long as the clip lasts (`realtime`) so the
+    engine's timing, progress and barge-in behave as with a speaker. Keeps the clips
+    it was given in `played`.
+    """
+
+    def __init__(self, realtime: bool = False):
+        self.realtime = realtime
+        self.played = []
+
+    def play(self, audio: bytes, stop: threading.Event, progress) -> bool:
+        self.played.append(audio)
+        duration = audio_duration(audio) or 0.0
+        position = 0.0
+        while self.realtime and position < duration:
+            if stop.wait(min(BLOCK_SECONDS, duration - position)):
+                return False
+            position = min(duration, position + BLOCK_SECONDS)
+            progress(position)
+        progress(duration)
+        return True
+
+
+def default_sink():
+    if PLAYBACK_SINK == "null":
+        return NullSink()
+    if PLAYBACK_SINK == "playsound":
+        return PlaysoundSink()
+    if PLAYBACK_SINK == "sounddevice":
+        return SoundDeviceSink()
+    try:
+        import sounddevice  # noqa: F401
+    except (ImportError, OSError):
+        return PlaysoundSink()
+    return SoundDeviceSink() if shutil.which("ffmpeg") else PlaysoundSink()
+
+
+# ---------------- Engine ----------------
+_Item = namedtuple("_Item", "id audio label generation")
+
+
+class PlaybackEngine:
+    """
+    Plays queued audio clips in order on a background thread.
+
+    `enqueue` returns immediately, so a turn can go back to listening while the reply
+    is spoken. `barge_in()` stops the current clip and drops everything queued (call
+    it when the user starts speaking); `wait()` blocks until the queue has played out.
+    `on_progress(status)` is called as playback advances.
+    """
+
+    def __init__(self, sink=None, on_progress=None):
+        self._sink = sink
+        self.on_progress = on_progress
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._generation = 0
+        self._next_id = 0
+        self._pending = 0
+        self._current = None
+        self._position = 0.0
+        self._duration = None
+        self.played = 0
+        self.interrupted = 0
+        self.dropped = 0
+        self.failures = 0
+
+    @property
+    def sink(self):
+        # Picked on first use: probing sounddevice loads PortAudio.
+        if self._sink is None:
+            self._sink = default_sink()
+        return self._sink
+
+    @sink.setter
+    def sink(self, sink):
+        self._sink = sink
+
+    def enqueue(self, audio: bytes, label: str = None) -> int:
+        """
+        Queue a clip (MP3 or WAV bytes) for playback and return its id.
+        """
+        with self._lock:
+            self._next_id += 1
+            item = _Item(self._next_id, audio, label, self._generation)
+            self._pending += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="playback", daemon=True)
+                self._thread.start()
+            self._queue.put(item)
+        return item.id
+
+    def play(self, audio: bytes, label: str = None, block: bool = False):
+        """
+        Queue a clip; with `block`, also wait until everything queued has played.
+        """
+        self.enqueue(audio, label)
+        if block:
+            self.wait()
+
+    def barge_in(self) -> int:
+        """
+        Stop the clip being played and drop the queued ones. Returns how many clips
+        were cut or dropped.
+        """
+        with self._lock:
+            self._generation += 1
+            dropped = 0
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                dropped += 1
+            self.dropped += dropped
+            self._pending -= dropped
+            if self._current is not None:
+                self._stop.set()
+                dropped += 1
+            self._idle.notify_all()
+        if dropped:
+            print(f"Barge-in: stopped playback ({dropped} clip(s)).")
+        return dropped
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until nothing is queued or playing; False if `timeout` ran out first.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    @property
+    def is_playing(self) -> bool:
+        return self._current is not None
+
+    def status(self) -> dict:
+        with self._lock:
+            current = self._current
+            return {
+                "playing": current is not None,
+                "clip": current.id if current else None,
+                "label": current.label if current else None,
+                "position": round(self._position, 3) if current else None,
+                "duration": self._duration if current else None,
+                "queued": self._queue.qsize(),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"playing": int(self._current is not None), "queued": self._queue.qsize(),
+                    "played": self.played, "interrupted": self.interrupted, "dropped": self.dropped,
+                    "failures": self.failures}
+
+    def _report(self, position: float):
+        self._position = position
+        if self.on_progress is not None:
+            self.on_progress(self.status())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            with self._lock:
+                if item.generation != self._generation:
+                    # Taken off the queue just before a barge-in flushed it.
+                    self.dropped += 1
+                    self._pending -= 1
+                    self._idle.notify_all()
+                    continue
+                self._stop.clear()
+                self._current = item
+                self._position = 0.0
+                self._duration = audio_duration(item.audio)
+            completed = failed = False
+            try:
+                completed = self.sink.play(item.audio, self._stop, self._report)
+            except Exception as e:
+                print(f"Playback failed: {e}")
+                failed = True
+            with self._lock:
+                if failed:
+                    self.failures += 1
+                elif completed:
+                    self.played += 1
+                elif self._stop.is_set():
+                    self.interrupted += 1
+                self._current = None
+                self._pending -= 1
+                self._idle.notify_all()
+
+
+# Shared engine for the process; every script speaks through it.
+player = PlaybackEngine()
+
+
+def play(audio: bytes, label: str = None, block: bool = False):
+    player.play(audio, label, block)
+
+
+def barge_in() -> int:
+    return player.barge_in()
+
+
+def wait_for_playback(timeout: float = None) -> bool:
+    return player.wait(timeout)
+
+
+def prepare_to_listen():
+    """
+    Call before opening the microphone: without barge-in, wait for the reply to finish.
+    """
+    if not BARGE_IN:
+        player.wait()
@@ -0,0 +1,225 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+# ---------------- MinHash Setup ----------------
+# Queries are compared on character n-gram shingles. MinHash signatures are split
+# into LSH bands, so a lookup only inspects entries sharing at least one band. 16 bands
+# of 8 rows put the LSH threshold (1/bands)^(1/rows) near a shingle Jaccard of 0.71,
+# where queries with a similarity ratio of 0.8 typically sit (median 0.78): random
+# queries rarely collide, at the cost of missing some near-duplicates just above the
+# similarity threshold that differ by a whole word (about 1 in 5 of those in tests;
+# single typos are found).
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BAND_ROWS = 8
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Lowercase a query and collapse punctuation and whitespace.
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def similar(a: str, b: str) -> float:
+    """
+    Compute a similarity ratio between two strings.
+    """
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """
+    Return the set of character n-grams of a (normalized) string.
+    """
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with a fixed, seeded family of hash functions
+    so signatures are stable across processes.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) & 0x7FFFFFFF for s in shingles(text)),
+            dtype=np.uint64,
+        )
+        # (shingles x permutations) matrix of permuted hashes; keep the minimum per permutation.
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def bands(self, signature: np.ndarray, band_rows: int = BAND_ROWS):
+        """
+        Yield (band_index, band_key) pairs used as LSH bucket keys.
+        """
+        for i, start in enumerate(range(0, self.num_perm - band_rows + 1, band_rows)):
+            yield i, signature[start:start + band_rows].tobytes()
+
+    def bucket_ids(self, signature: np.ndarray, scope: str = "", band_rows: int = BAND_ROWS):
+        """
+        Return one signed 64-bit bucket id per band, namespaced by `scope`
+        (suitable as an integer key in SQLite).
+        """
+        ids = []
+        for i, band in self.bands(signature, band_rows):
+            digest = hashlib.blake2b(band, digest_size=8, person=b"lsh-band", salt=i.to_bytes(2, "little"),
+                                     key=scope.encode("utf-8")[:64]).digest()
+            ids.append(int.from_bytes(digest, "little", signed=True))
+        return ids
+
+
+class ResponseCache:
+    """
+    Near-duplicate cache mapping user queries to generated responses.
+
+    Lookups use MinHash/LSH to gather candidate queries, rank them by estimated
+    shingle overlap and confirm the best ones with SequenceMatcher. Candidates are
+    entries whose MinHash agrees on a whole band, so their number still grows with the
+    cache, but slowly: a few per lookup at 100k entries. Entries are keyed by
+    (normalized query, language, persona), are evicted in LRU order past
+    `max_entries` and expire after `ttl_seconds` (if set).
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 10000, ttl_seconds: float = None,
+                 num_perm: int = NUM_PERM, band_rows: int = BAND_ROWS, max_verify: int = 5):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.band_rows = band_rows
+        self.max_verify = max_verify
+        self.hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()  # (normalized query, language, persona) -> (response, signature, created_at)
+        self._buckets = {}  # (language, persona, band index, band key) -> set of entry keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.candidates_checked = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item):
+        """
+        `query in cache` or `(query, language, persona) in cache`: whether an unexpired
+        entry for exactly that (normalized) query exists in that scope, as `get` sees it.
+        """
+        query, language, persona = (item, "", "") if isinstance(item, str) else (tuple(item) + ("", ""))[:3]
+        key = (normalize_query(query), language, persona)
+        with self._lock:
+            return key in self._entries and not self._expired_locked(key)
+
+    def put(self, query: str, response: str, language: str = "", persona: str = ""):
+        """
+        Cache `response` for `query`, evicting the least recently used entries if needed.
+        """
+        key = (normalize_query(query), language, persona)
+        signature = self.hasher.signature(key[0])
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (response, signature, time.time())
+            for band in self._bands(key, signature):
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def lookup(self, query: str, threshold: float = None, language: str = "", persona: str = ""):
+        """
+        Return (response, similarity, cached_query) for the best match above the
+        threshold, or None.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        key = (normalize_query(query), language, persona)
+        signature = self.hasher.signature(key[0])
+        with self._lock:
+            candidates = set()
+            for band in self._bands(key, signature):
+                candidates.update(self._buckets.get(band, ()))
+            candidates = [c for c in candidates if not self._expired_locked(c)]
+            self.candidates_checked += len(candidates)
+
+            best = None
+            if candidates:
+                # Rank by MinHash agreement (vectorized), then verify the top few exactly.
+                signatures = np.stack([self._entries[c][1] for c in candidates])
+                agreement = (signatures == signature).mean(axis=1)
+                for idx in np.argsort(-agreement)[:self.max_verify]:
+                    score = 1.0 if candidates[idx] == key else similar(key[0], candidates[idx][0])
+                    if score >= threshold and (best is None or score > best[1]):
+                        best = (candidates[idx], score)
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best[0])
+            return self._entries[best[0]][0], best[1], best[0][0]
+
+    def get(self, query: str, threshold: float = None, language: str = "", persona: str = ""):
+        """
+        Return the cached response for a similar query, or None.
+        """
+        match = self.lookup(query, threshold, language=language, persona=persona)
+        return match[0] if match else None
+
+    def _bands(self, key, signature):
+        for index, band in self.hasher.bands(signature, self.band_rows):
+            yield key[1], key[2], index, band
+
+    def _expired_locked(self, key) -> bool:
+        if self.ttl_seconds is None:
+            return False
+        if time.time() - self._entries[key][2] <= self.ttl_seconds:
+            return False
+        self._remove_locked(key)
+        self.expirations += 1
+        return True
+
+    def _remove_locked(self, key):
+        _, signature, _ = self._entries.pop(key)
+        for band in self._bands(key, signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "avg_candidates": round(self.candidates_checked / lookups, 2) if lookups else 0.0,
+        }
@@ -1,7 +1,6 @@
-import openai
+from llm_client import LLMError, chat
 
-# Set your API key (you can also set this as an environment variable)
-openai.api_key = ""  # Replace with your actual OpenAI API key
+# llm_client reads the OpenAI API key from the OPENAI_API_KEY environment variable.
 
 def generate_response(user_query, personality_info, language):
     """
@@ -27,17 +26,11 @@ def generate_response(user_query, personality_info, language):
         {"role": "user", "content": user_query}
     ]
     
-    # Call the GPT-4 API
+    # Call the GPT-4 API (pooled client with deadline, retries and circuit breaker)
     try:
-        response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=150
-)
-        generated_response = response.choices[0].message['content'].strip()
+        generated_response = chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150).strip()
         return generated_response
-    except Exception as e:
+    except LLMError as e:
         print("Error generating response:", e)
         return "I'm having trouble processing that request right now."
 
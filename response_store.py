@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from response_cache import BAND_ROWS, NUM_PERM, MinHasher, normalize_query, similar
+
+# Default location of the on-disk cache; override with RESPONSE_CACHE_PATH.
+DEFAULT_CACHE_PATH = os.environ.get(
+    "RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.sqlite3"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL,
+    language TEXT NOT NULL,
+    persona TEXT NOT NULL,
+    response TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (query, language, persona)
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES responses(id) ON DELETE CASCADE,
+    PRIMARY KEY (bucket, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_entry ON buckets(entry_id);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used);
+"""
+
+
+class PersistentResponseCache:
+    """
+    Disk-backed near-duplicate response cache shared by every process using the same file.
+
+    Entries are keyed by (normalized query, language, persona) and stored in SQLite
+    (WAL mode) together with their MinHash signature and LSH bucket ids. A lookup asks
+    SQLite for the entries sharing a bucket and verifies the best ones with the same
+    similarity ratio as ResponseCache, so nothing is loaded into memory at startup.
+    The store is compacted to `max_entries` by dropping the least recently used rows.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, threshold: float = 0.8, max_entries: int = 100000,
+                 ttl_seconds: float = None, compact_every: int = 500, max_verify: int = 5):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.compact_every = compact_every
+        self.max_verify = max_verify
+        self.hasher = MinHasher(NUM_PERM)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._puts_since_compact = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Open (once per thread) a connection to the store, creating the schema on first use
+        and re-indexing stored entries if they were written with other LSH bands.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._rebuild_buckets(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _rebuild_buckets(self, conn: sqlite3.Connection):
+        """
+        Recompute every entry's bucket ids from its stored signature when the store was
+        written with a different BAND_ROWS (kept in PRAGMA user_version).
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == BAND_ROWS:
+                conn.execute("ROLLBACK")
+                return
+            conn.execute("DELETE FROM buckets")
+            rows = conn.execute("SELECT id, language, persona, signature FROM responses").fetchall()
+            conn.executemany(
+                "INSERT OR IGNORE INTO buckets (bucket, entry_id) VALUES (?, ?)",
+                [(bucket, entry_id) for entry_id, language, persona, signature in rows
+                 for bucket in self.hasher.bucket_ids(np.frombuffer(signature, dtype=np.uint32),
+                                                      self._scope(language, persona), BAND_ROWS)],
+            )
+            conn.execute(f"PRAGMA user_version = {BAND_ROWS}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if rows:
+            print(f"Re-indexed {len(rows)} cached responses for {BAND_ROWS}-row LSH bands.")
+
+    @staticmethod
+    def _scope(language: str, persona: str) -> str:
+        return f"{language}\x1f{persona}"
+
+    def put(self, query: str, response: str, language: str = "", persona: str = ""):
+        """
+        Store `response` for `query`, replacing an existing entry with the same key.
+        """
+        key = normalize_query(query)
+        signature = self.hasher.signature(key)
+        buckets = self.hasher.bucket_ids(signature, self._scope(language, persona), BAND_ROWS)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM responses WHERE query = ? AND language = ? AND persona = ?",
+                         (key, language, persona))
+            cursor = conn.execute(
+                "INSERT INTO responses (query, language, persona, response, signature, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, language, persona, response, signature.tobytes(), now, now),
+            )
+            conn.executemany("INSERT OR IGNORE INTO buckets (bucket, entry_id) VALUES (?, ?)",
+                             [(bucket, cursor.lastrowid) for bucket in buckets])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._puts_since_compact += 1
+        if self.compact_every and self._puts_since_compact >= self.compact_every:
+            self.compact()
+
+    def lookup(self, query: str, threshold: float = None, language: str = "", persona: str = ""):
+        """
+        Return (response, similarity, cached_query) for the best match above the
+        threshold, or None.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        key = normalize_query(query)
+        signature = self.hasher.signature(key)
+        buckets = self.hasher.bucket_ids(signature, self._scope(language, persona), BAND_ROWS)
+        conn = self._connection()
+
+        sql = (
+            "SELECT DISTINCT r.id, r.query, r.response, r.signature, r.created_at FROM buckets b "
+            "JOIN responses r ON r.id = b.entry_id "
+            f"WHERE b.bucket IN ({','.join('?' * len(buckets))}) AND r.language = ? AND r.persona = ?"
+        )
+        rows = conn.execute(sql, (*buckets, language, persona)).fetchall()
+        if self.ttl_seconds is not None:
+            cutoff = time.time() - self.ttl_seconds
+            rows = [row for row in rows if row[4] >= cutoff]
+
+        best = None
+        if rows:
+            signatures = np.stack([np.frombuffer(row[3], dtype=np.uint32) for row in rows])
+            agreement = (signatures == signature).mean(axis=1)
+            for idx in np.argsort(-agreement)[:self.max_verify]:
+                row = rows[idx]
+                score = 1.0 if row[1] == key else similar(key, row[1])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (row, score)
+
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        row, score = best
+        conn.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE id = ?", (time.time(), row[0]))
+        return row[2], score, row[1]
+
+    def get(self, query: str, threshold: float = None, language: str = "", persona: str = ""):
+        """
+        Return the cached response for a similar query, or None.
+        """
+        match = self.lookup(query, threshold, language=language, persona=persona)
+        return match[0] if match else None
+
+    def compact(self, max_entries: int = None, vacuum: bool = False) -> int:
+        """
+        Drop expired entries and the least recently used ones beyond `max_entries`.
+        Returns the number of entries removed.
+        """
+        max_entries = self.max_entries if max_entries is None else max_entries
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = 0
+            if self.ttl_seconds is not None:
+                removed += conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                        (time.time() - self.ttl_seconds,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM responses WHERE id IN ("
+                "SELECT id FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._puts_since_compact = 0
+        if vacuum:
+            conn.execute("VACUUM")
+        return removed
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "path": self.path,
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,10 +1,9 @@
-import openai
-from gtts import gTTS
-from playsound import playsound
-import os
+from llm_client import chat
+from tts_cache import cached_gtts
+from tts_chunks import speak_chunked
+from playback import player, wait_for_playback
 
-# Set your OpenAI API key
-openai.api_key = ""
+# llm_client reads the OpenAI API key from the OPENAI_API_KEY environment variable.
 
 def generate_response_gpt(user_query):
     messages = [
@@ -19,20 +18,10 @@ def generate_response_gpt(user_query):
         {"role": "user", "content": user_query}
     ]
     
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=100,
-    )
-    
-    return response.choices[0].message['content']
+    return chat(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=100)
 
 def text_to_speech(text, lang='mr'):
-    tts = gTTS(text=text, lang=lang)
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
+    speak_chunked(text, lambda chunk: cached_gtts(chunk, lang=lang), player.enqueue, provider="gtts")
 
 if __name__ == "__main__":
     user_query = "माझा प्रिंटर काम करत नाही आणि त्याची शाई पुन्हा भरली पाहिजे."
@@ -42,4 +31,5 @@ if __name__ == "__main__":
     print(response_text)
     
     # Convert the text response to speech
-    text_to_speech(response_text, lang='mr')
\ No newline at end of file
+    text_to_speech(response_text, lang='mr')
+    wait_for_playback()
\ No newline at end of file
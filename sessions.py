@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- Session Configuration ----------------
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "1000"))
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "1800"))
+STT_WORKERS = int(os.environ.get("STT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+STT_MAX_PENDING = int(os.environ.get("STT_MAX_PENDING", str(STT_WORKERS * 4)))
+
+
+class Busy(Exception):
+    """Raised when the STT pool already has the maximum number of pending jobs."""
+
+
+class Session:
+    """
+    One caller's conversation: its own history guarded by its own lock, so turns
+    of the same session run one at a time while other sessions proceed.
+    """
+
+    def __init__(self, session_id: str, history):
+        self.session_id = session_id
+        self.history = history
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self.turns = 0
+
+
+class SessionStore:
+    """
+    Thread-safe map of session id -> Session; `new_history()` creates the history
+    of each new session. Sessions idle for longer than `idle_seconds` are dropped, and the least
+    recently active ones are dropped beyond `max_sessions`.
+    """
+
+    def __init__(self, new_history, max_sessions: int = MAX_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.new_history = new_history
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._expire_locked()
+                session = self._sessions[session_id] = Session(session_id, self.new_history())
+            session.last_active = time.time()
+            return session
+
+    def _expire_locked(self):
+        now = time.time()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_seconds]:
+            del self._sessions[sid]
+        if len(self._sessions) >= self.max_sessions:
+            by_age = sorted(self._sessions.values(), key=lambda s: s.last_active)
+            for s in by_age[:len(self._sessions) - self.max_sessions + 1]:
+                del self._sessions[s.session_id]
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class BoundedExecutor:
+    """
+    Thread pool for CPU-bound work (Whisper decoding) with a cap on queued jobs,
+    so overload is reported instead of growing an unbounded backlog.
+    """
+
+    def __init__(self, max_workers: int = STT_WORKERS, max_pending: int = STT_MAX_PENDING, initializer=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stt", initializer=initializer)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.max_workers = max_workers
+        self._count_lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Jobs submitted and not yet finished (running or queued).
+        """
+        return self._in_flight
+
+    def _adjust(self, delta: int):
+        with self._count_lock:
+            self._in_flight += delta
+
+    def _done(self, _):
+        self._adjust(-1)
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise Busy("Too many transcriptions pending; try again shortly.")
+        self._adjust(1)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Submit `fn` and wait for its result.
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,187 @@
+import queue
+import re
+import threading
+import time
+
+# Sentence terminators, including the Devanagari danda and double danda.
+_SENTENCE_END = re.compile(r"([.!?।॥]+[\"')\]]*)(\s+|$)|\n+")
+
+
+class SentenceSplitter:
+    """
+    Incrementally split a stream of text deltas into complete sentences.
+
+    A terminator only closes a sentence once it is followed by whitespace, so
+    decimals like "3.5" are not split; the danda closes a sentence immediately.
+    Sentences shorter than `min_chars` are merged into the next one.
+    """
+
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list:
+        """
+        Add a text delta and return the sentences it completed.
+        """
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            end = match.end()
+            terminator = match.group(1) or ""
+            at_buffer_end = match.end() == len(self._buffer)
+            # Wait for the next delta before closing on ".", "!" or "?" at the very end.
+            if at_buffer_end and terminator and "।" not in terminator and "॥" not in terminator:
+                break
+            sentence = self._buffer[start:end].strip()
+            if len(sentence) < self.min_chars and not at_buffer_end:
+                continue
+            if sentence:
+                sentences.append(sentence)
+            start = end
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        """
+        Return whatever text is left once the stream has ended.
+        """
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str, min_chars: int = 12) -> list:
+    """
+    Split a complete text into sentences with the same rules as SentenceSplitter.
+    """
+    splitter = SentenceSplitter(min_chars)
+    return splitter.feed(text) + splitter.flush()
+
+
+def stream_chat_completion(messages, model: str = "gpt-3.5-turbo", temperature: float = 0.7, max_tokens: int = 150):
+    """
+    Yield the content deltas of a streamed ChatCompletion (via the shared LLM client).
+    """
+    from llm_client import stream_chat
+    yield from stream_chat(messages, model=model, temperature=temperature, max_tokens=max_tokens)
+
+
+class FakeStreamingLLM:
+    """
+    Local stand-in for stream_chat_completion that replays a fixed reply word by word.
+    """
+
+    def __init__(self, reply: str, first_token_delay: float = 0.3, token_delay: float = 0.02):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def __call__(self, messages=None, **kwargs):
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(re.findall(r"\S+\s*", self.reply)):
+            if i:
+                time.sleep(self.token_delay)
+            yield token
+
+
+_DONE = object()
+
+
+def speak_streaming(deltas, synthesize, play, min_chars: int = 12, max_pending: int = 4) -> dict:
+    """
+    Consume text deltas, synthesize each sentence as soon as it is complete and play
+    the sentences in order while later ones are still being generated and synthesized.
+
+    `synthesize(sentence) -> audio` and `play(audio)` are supplied by the caller.
+    Returns the full text together with per-turn timings (seconds from the start),
+    including time_to_first_audio.
+    """
+    start = time.perf_counter()
+    sentences_q = queue.Queue(maxsize=max_pending)
+    audio_q = queue.Queue(maxsize=max_pending)
+    timings = {"first_token": None, "first_sentence": None, "time_to_first_audio": None}
+    errors = []
+
+    def synth_worker():
+        try:
+            while True:
+                sentence = sentences_q.get()
+                if sentence is _DONE:
+                    break
+                audio_q.put(synthesize(sentence))
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the token loop never blocks on a full queue.
+            while sentences_q.get() is not _DONE:
+                pass
+        finally:
+            audio_q.put(_DONE)
+
+    def play_worker():
+        try:
+            while True:
+                audio = audio_q.get()
+                if audio is _DONE:
+                    break
+                if timings["time_to_first_audio"] is None:
+                    timings["time_to_first_audio"] = time.perf_counter() - start
+                play(audio)
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the synthesis thread never blocks on a full queue.
+            while audio_q.get() is not _DONE:
+                pass
+
+    synth_thread = threading.Thread(target=synth_worker, daemon=True)
+    play_thread = threading.Thread(target=play_worker, daemon=True)
+    synth_thread.start()
+    play_thread.start()
+
+    splitter = SentenceSplitter(min_chars)
+    parts = []
+    sentence_count = 0
+    try:
+        for delta in deltas:
+            if timings["first_token"] is None:
+                timings["first_token"] = time.perf_counter() - start
+            parts.append(delta)
+            for sentence in splitter.feed(delta):
+                if timings["first_sentence"] is None:
+                    timings["first_sentence"] = time.perf_counter() - start
+                sentence_count += 1
+                sentences_q.put(sentence)
+        for sentence in splitter.flush():
+            sentence_count += 1
+            sentences_q.put(sentence)
+    finally:
+        sentences_q.put(_DONE)
+        synth_thread.join()
+        play_thread.join()
+
+    if errors:
+        raise errors[0]
+    timings["total"] = time.perf_counter() - start
+    return {
+        "text": "".join(parts).strip(),
+        "sentences": sentence_count,
+        **{k: (round(v, 3) if v is not None else None) for k, v in timings.items()},
+    }
+
+
+if __name__ == "__main__":
+    # Offline demo: fake LLM, TTS and playback, to show the time-to-first-audio gain.
+    reply = (
+        "नमस्कार! तुमचा राउटर रीस्टार्ट करा। मग ३० सेकंद थांबा. "
+        "If the light is still red, check the cable. Otherwise call your provider."
+    )
+    fake_synthesize = lambda sentence: (time.sleep(0.15), sentence.encode("utf-8"))[1]
+    fake_play = lambda audio: time.sleep(0.3)
+
+    blocking_start = time.perf_counter()
+    full_text = "".join(FakeStreamingLLM(reply)())
+    fake_play(fake_synthesize(full_text))
+    print(f"Blocking time to first audio: {time.perf_counter() - blocking_start - 0.3:.3f}s")
+
+    stats = speak_streaming(FakeStreamingLLM(reply)(), fake_synthesize, fake_play)
+    print(f"Streaming time to first audio: {stats['time_to_first_audio']}s over {stats['sentences']} sentences")
@@ -0,0 +1,342 @@
+import difflib
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, pcm16_to_float32
+from vad import array_chunks, record_utterance
+from whisper_registry import registry, using_model
+
+# ---------------- Settings ----------------
+# Set STREAMING_STT=1 for front-ends that record with the VAD to show the words live
+# while the user is speaking. It is for display only and off by default: the live text
+# costs extra decodes, and the captured utterance is still transcribed by the STT router
+# (language routing, preprocessing), so a turn's reply starts no sooner.
+STREAMING_STT = os.environ.get("STREAMING_STT", "0") == "1"
+# The growing utterance is re-decoded whenever this much new audio has arrived.
+STREAM_INTERVAL_MS = int(os.environ.get("STT_STREAM_INTERVAL_MS", "500"))
+# Model for live decoding; it runs several times per utterance, so it is kept small.
+# Its text is only shown while recording; the turn uses the router's transcript.
+STREAM_MODEL = os.environ.get("STT_STREAM_MODEL", "base")
+# Local agreement: a word is committed once this many consecutive hypotheses agree on
+# it and on everything before it.
+AGREEMENT = 2
+# Committed segments are cut off the buffer once it is longer than this, so each
+# re-decode stays short however long the user talks.
+MAX_BUFFER_SECONDS = 15.0
+# Whisper's language guess is unreliable on the first fraction of a second; it is
+# fixed for the rest of the utterance once this much audio has been decoded.
+LANGUAGE_LOCK_SECONDS = 2.0
+
+_PUNCTUATION = ".,!?;:।\"'()-"
+
+
+def _normalize(word: str) -> str:
+    return word.strip(_PUNCTUATION).lower()
+
+
+def _agreed_prefix(hypotheses: list) -> int:
+    """
+    Number of leading words (ignoring case and punctuation) all hypotheses share.
+    """
+    n = min(len(words) for words in hypotheses)
+    for i in range(n):
+        if len({_normalize(words[i]) for words in hypotheses}) > 1:
+            return i
+    return n
+
+
+def _skip_committed(committed: list, words: list) -> int:
+    """
+    Index of the first word of `words` after the part that repeats `committed`.
+
+    The words are aligned by their characters (ignoring case, punctuation and spaces)
+    rather than by position, so a hypothesis that splits or merges committed words
+    differently ("don't" / "do n't") neither repeats nor drops any of them.
+    """
+    if not committed or not words:
+        return 0
+    target = "".join(_normalize(word) for word in committed)
+    text, ends = "", []
+    for word in words:
+        text += _normalize(word)
+        ends.append(len(text))
+    blocks = [block for block in difflib.SequenceMatcher(None, target, text, autojunk=False).get_matching_blocks()
+              if block.size]
+    if not blocks:
+        return min(len(committed), len(words))
+    # Where the committed text ends in `text`, counting any unmatched tail of it.
+    last = blocks[-1]
+    end = last.b + last.size + (len(target) - last.a - last.size)
+    for i, word_end in enumerate(ends):
+        if word_end >= end:
+            return i + 1
+    return len(words)
+
+
+class Hypothesis:
+    """
+    One update of a streaming transcript: `committed` text will not change any more
+    (`new` is the part committed by this update), `interim` is the current guess for
+    the rest; `final` marks the utterance's last update.
+    """
+
+    def __init__(self, committed: str, interim: str, new: str, final: bool, audio_seconds: float,
+                 language: str = None):
+        self.committed = committed
+        self.interim = interim
+        self.new = new
+        self.final = final
+        self.audio_seconds = audio_seconds
+        self.language = language
+
+    @property
+    def text(self) -> str:
+        return " ".join(part for part in (self.committed, self.interim) if part)
+
+    def as_dict(self) -> dict:
+        return {"committed": self.committed, "interim": self.interim, "new": self.new, "final": self.final,
+                "audio_seconds": round(self.audio_seconds, 3), "language": self.language}
+
+
+class IncrementalTranscriber:
+    """
+    Transcribes an utterance while it is being recorded.
+
+    Audio is pushed as it arrives; every `interval_ms` of new audio the whole buffer is
+    decoded again and the words that the last `agreement` hypotheses agree on are
+    committed (local agreement), so the committed prefix is stable and can be acted on
+    early. `finish()` decodes what is left and commits everything.
+
+    Decoding happens in poll() (e.g. from transcribe_stream) or, after start(), on a
+    background thread, so push() can be called from an audio callback. Each decode runs
+    on `executor` if one is given (e.g. the server's bounded STT pool), else on the
+    calling thread. Every update is passed to `on_hypothesis(hypothesis)`.
+    """
+
+    def __init__(self, model_size: str = STREAM_MODEL, language: str = None, interval_ms: int = STREAM_INTERVAL_MS,
+                 agreement: int = AGREEMENT, on_hypothesis=None, device: str = None, sample_rate: int = SAMPLE_RATE,
+                 executor=None):
+        self.model_size = model_size
+        self.language = language
+        self.interval = int(sample_rate * interval_ms / 1000)
+        self.agreement = max(1, agreement)
+        self.on_hypothesis = on_hypothesis
+        self.device = device
+        self.sample_rate = sample_rate
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+        self._chunks = []
+        self._received = 0         # Samples pushed in total.
+        self._decoded = 0          # Samples pushed at the last decode.
+        self._history = []         # Committed words of audio already cut off.
+        self._committed = []       # Committed words of the current buffer.
+        self._hypotheses = []      # Word lists of the last decodes of the current buffer.
+        self._stop = threading.Event()
+        self._thread = None
+        self.decodes = 0
+        self.decode_seconds = 0.0
+        self.last = None
+
+    def push(self, samples: np.ndarray):
+        """
+        Add captured float32 samples (thread-safe and cheap; decoding happens elsewhere).
+        """
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        with self._lock:
+            self._chunks.append(samples)
+            self._received += len(samples)
+
+    def poll(self):
+        """
+        Decode if at least one interval of new audio has arrived; return the update or None.
+        """
+        if self._received - self._decoded < self.interval:
+            return None
+        return self.update()
+
+    def update(self, final: bool = False) -> Hypothesis:
+        """
+        Decode the buffer now and commit by local agreement (everything, if `final`).
+        """
+        with self._decode_lock:
+            with self._lock:
+                audio = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+                self._chunks = [audio]
+                self._decoded = self._received
+            if not len(audio):
+                result = {"text": "", "segments": []}
+            elif self.executor is not None:
+                result = self.executor.submit(self._decode, audio).result()
+            else:
+                result = self._decode(audio)
+            words = result["text"].split()
+            self._hypotheses = (self._hypotheses + [words])[-self.agreement:]
+
+            # Committed words never change; later words extend them. The hypothesis may
+            # word the committed part differently, so it is skipped by alignment.
+            before = len(self._committed)
+            start = _skip_committed(self._committed, words)
+            if final:
+                new = words[start:]
+            elif len(self._hypotheses) >= self.agreement:
+                new = words[before:_agreed_prefix(self._hypotheses)]
+            else:
+                new = []
+            self._committed += new
+            interim = "" if final else " ".join(words[before + len(new) if new else start:])
+            committed = " ".join(self._history + self._committed)
+            if not final and len(audio) > MAX_BUFFER_SECONDS * self.sample_rate:
+                self._trim(result.get("segments") or [])
+
+            hypothesis = Hypothesis(
+                committed=committed,
+                interim=interim,
+                new=" ".join(new),
+                final=final,
+                audio_seconds=self._received / self.sample_rate,
+                language=self.language or result.get("language"),
+            )
+            self.last = hypothesis
+        if self.on_hypothesis is not None:
+            self.on_hypothesis(hypothesis)
+        return hypothesis
+
+    def _decode(self, audio: np.ndarray) -> dict:
+        start = time.perf_counter()
+        with using_model(self.model_size, device=self.device) as model:
+            result = registry.engine.transcribe(model, audio, language=self.language)
+        self.decodes += 1
+        self.decode_seconds += time.perf_counter() - start
+        if self.language is None and len(audio) >= LANGUAGE_LOCK_SECONDS * self.sample_rate:
+            self.language = result.get("language")
+        return result
+
+    def _trim(self, segments: list):
+        """
+        Cut the audio of the leading segments whose words are all committed off the
+        buffer, moving their words to the history.
+        """
+        words, cut, cut_words = 0, None, 0
+        for segment in segments[:-1]:  # The last segment may still be growing.
+            words += len(segment["text"].split())
+            if words > len(self._committed):
+                break
+            cut, cut_words = segment["end"], words
+        if cut is None:
+            return
+        samples = int(cut * self.sample_rate)
+        with self._lock:
+            audio = np.concatenate(self._chunks)
+            self._chunks = [audio[samples:]]
+        self._history += self._committed[:cut_words]
+        self._committed = self._committed[cut_words:]
+        self._hypotheses = [h[cut_words:] for h in self._hypotheses]
+
+    def start(self):
+        """
+        Decode on a background thread until finish(); returns self.
+        """
+        def run():
+            while not self._stop.is_set():
+                if self.poll() is None:
+                    self._stop.wait(self.interval / self.sample_rate / 4)
+
+        self._thread = threading.Thread(target=run, name="streaming-stt", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop background decoding without decoding again; return the last hypothesis
+        (None if nothing was decoded).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.last
+
+    def finish(self) -> Hypothesis:
+        """
+        Stop background decoding and return the final hypothesis (all audio committed).
+        """
+        self.stop()
+        return self.update(final=True)
+
+    def stats(self) -> dict:
+        return {"decodes": self.decodes, "decode_seconds": round(self.decode_seconds, 3),
+                "audio_seconds": round(self._received / self.sample_rate, 3)}
+
+
+def pcm_chunks(stream, chunk_ms: int = 100, sample_rate: int = SAMPLE_RATE):
+    """
+    Yield float32 chunks from a file-like stream of raw 16-bit mono PCM (e.g. an HTTP
+    request body still being uploaded).
+    """
+    size = int(sample_rate * chunk_ms / 1000) * 2
+    leftover = b""
+    while True:
+        data = stream.read(size)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % 2
+        leftover = data[usable:]
+        if usable:
+            yield pcm16_to_float32(data[:usable])
+
+
+def transcribe_stream(chunks, **options):
+    """
+    Feed an iterable of float32 chunks (e.g. vad.microphone_chunks or array_chunks)
+    through an IncrementalTranscriber and yield each interim hypothesis, then the final one.
+    """
+    transcriber = IncrementalTranscriber(**options)
+    for chunk in chunks:
+        transcriber.push(chunk)
+        hypothesis = transcriber.poll()
+        if hypothesis is not None:
+            yield hypothesis
+    yield transcriber.finish()
+
+
+class StreamedUtterance:
+    """
+    A recorded utterance together with the live transcript shown while it was recorded
+    (`hypothesis`, the last one; None if the utterance was too short to decode). The
+    turn's transcript comes from route_transcribe(utterance.audio).
+    """
+
+    def __init__(self, audio: np.ndarray, hypothesis: Hypothesis = None):
+        self.audio = audio
+        self.hypothesis = hypothesis
+
+    @property
+    def text(self) -> str:
+        return self.hypothesis.text if self.hypothesis is not None else ""
+
+
+def record_streaming(source=None, on_hypothesis=None, model_size: str = STREAM_MODEL, **vad_options) -> StreamedUtterance:
+    """
+    Record the next utterance with the VAD (microphone by default), passing live
+    hypotheses to `on_hypothesis` while it is spoken; returns once the user pauses.
+    Options are passed to the VADSegmenter (e.g. on_speech_start).
+    """
+    transcriber = IncrementalTranscriber(model_size=model_size, on_hypothesis=on_hypothesis).start()
+    try:
+        audio = record_utterance(source, on_speech=transcriber.push, **vad_options)
+    finally:
+        hypothesis = transcriber.stop()
+    return StreamedUtterance(audio, hypothesis)
+
+
+if __name__ == "__main__":
+    import sys
+    from audio_io import load_audio
+    path = sys.argv[1] if len(sys.argv) > 1 else "recorded_dynamic.wav"
+    for update in transcribe_stream(array_chunks(load_audio(path))):
+        state = "final" if update.final else f"{update.audio_seconds:5.2f}s"
+        print(f"[{state}] {update.committed} | {update.interim}")
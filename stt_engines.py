@@ -0,0 +1,223 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# ---------------- Settings ----------------
+# Speech-to-text backend behind every transcribe_audio:
+#   "whisper"         openai-whisper in PyTorch (fp16 on GPU, fp32 on CPU); the default
+#   "whisper-int8"    the same models with their linear layers dynamically quantized to
+#                     int8; CPU only, no extra dependencies
+#   "faster-whisper"  CTranslate2 models through the faster-whisper package
+STT_ENGINE = os.environ.get("STT_ENGINE", "whisper")
+# faster-whisper weight/compute type; by default int8 on CPU and float16 on GPU.
+STT_COMPUTE_TYPE = os.environ.get("STT_COMPUTE_TYPE", "")
+# CPU threads a faster-whisper model may use (0 lets CTranslate2 decide).
+STT_CPU_THREADS = int(os.environ.get("STT_CPU_THREADS", "0"))
+
+# Whisper's window: 30 seconds of 16 kHz audio.
+N_SAMPLES = 30 * 16000
+
+_thread_settings = threading.local()
+# Thread limits of the torch_threads blocks running now, and the count to restore after.
+_torch_limits = []
+_torch_saved = None
+_torch_lock = threading.Lock()
+
+
+def limit_cpu_threads(threads: int):
+    """
+    Give faster-whisper models loaded on the calling thread `threads` cpu_threads, for
+    pools that decode on several threads at once, so the workers share the cores
+    instead of each using all of them. See torch_threads for the whisper engines.
+    """
+    _thread_settings.cpu_threads = threads
+
+
+@contextmanager
+def torch_threads(threads: int = None):
+    """
+    Lower PyTorch's intra-op thread count to `threads` while the block runs (a decode
+    on a pool thread), then restore it. The count is process-wide (threads started
+    meanwhile begin with it), so overlapping blocks share the smallest limit, other
+    decodes can only be limited while a block is running, and the last block to end
+    puts back the original count. Does nothing without `threads` or before torch has
+    been imported.
+    """
+    global _torch_saved
+    torch = sys.modules.get("torch")  # Only the whisper engines load it.
+    if not threads or torch is None:
+        yield
+        return
+    with _torch_lock:
+        if not _torch_limits:
+            _torch_saved = torch.get_num_threads()
+        _torch_limits.append(threads)
+        torch.set_num_threads(min(_torch_limits))
+    try:
+        yield
+    finally:
+        with _torch_lock:
+            _torch_limits.remove(threads)
+            torch.set_num_threads(min(_torch_limits) if _torch_limits else _torch_saved)
+
+
+class WhisperEngine:
+    """
+    openai-whisper: models from whisper.load_model, decoded with model.transcribe.
+
+    Every engine loads a model of a given size and device and decodes 16 kHz float32
+    audio with it, returning Whisper's result dict ("text", "language" and "segments"
+    with start, end, text, avg_logprob, no_speech_prob and compression_ratio), so the
+    router's quality checks work the same on all of them.
+    """
+
+    name = "whisper"
+
+    def resolve_device(self, device=None) -> str:
+        if device:
+            return device
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def load(self, model_size: str, device: str):
+        import whisper
+        return whisper.load_model(model_size, device=device)
+
+    def transcribe(self, model, audio: np.ndarray, language: str = None) -> dict:
+        return model.transcribe(audio, language=language, fp16=str(model.device).startswith("cuda"))
+
+    def detect_language(self, model, audio: np.ndarray):
+        """
+        Return (language, probability) from the model's language head (one encoder
+        pass over the first 30 seconds).
+        """
+        import whisper
+        clip = whisper.pad_or_trim(audio)
+        mel = whisper.log_mel_spectrogram(clip, n_mels=model.dims.n_mels).to(model.device)
+        _, probs = model.detect_language(mel)
+        language = max(probs, key=probs.get)
+        return language, float(probs[language])
+
+    def memory_bytes(self, model) -> int:
+        """
+        Bytes held by the model's weights.
+        """
+        total = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+
+
+class Int8WhisperEngine(WhisperEngine):
+    """
+    openai-whisper with every linear layer (attention projections and MLPs, most of the
+    weights and of the decoding time) replaced by a dynamically quantized int8 one:
+    weights are stored as int8 and activations are quantized per batch at run time.
+    Convolutions, embeddings and layer norms stay fp32. PyTorch's quantized kernels
+    run on the CPU only, so the device is always "cpu".
+    """
+
+    name = "whisper-int8"
+
+    def resolve_device(self, device=None) -> str:
+        if device and device != "cpu":
+            print(f"The {self.name} engine runs on the CPU only; ignoring device '{device}'.")
+        return "cpu"
+
+    def load(self, model_size: str, device: str):
+        import torch
+        import whisper
+        model = whisper.load_model(model_size, device="cpu")
+        # Whisper's Linear subclass only adds dtype casting for fp16; quantize_dynamic
+        # converts exact nn.Linear modules, so swap in plain ones first.
+        for module in list(model.modules()):
+            for child_name, child in module.named_children():
+                if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                    plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                    plain.load_state_dict(child.state_dict())
+                    setattr(module, child_name, plain)
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def memory_bytes(self, model) -> int:
+        # Packed int8 weights are not parameters, so count them separately.
+        total = super().memory_bytes(model)
+        for module in model.modules():
+            if hasattr(module, "_packed_params"):
+                weight, bias = module._packed_params._weight_bias()
+                total += weight.numel() * weight.element_size()
+                total += bias.numel() * bias.element_size() if bias is not None else 0
+        return total
+
+
+class FasterWhisperEngine:
+    """
+    faster-whisper: the Whisper models converted to CTranslate2, which runs int8
+    weights with fused kernels on the CPU (and float16 on the GPU). Decoding is greedy
+    with Whisper's temperature fallback, like openai-whisper's defaults.
+    """
+
+    name = "faster-whisper"
+
+    def resolve_device(self, device=None) -> str:
+        if device:
+            return device
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+
+    def load(self, model_size: str, device: str):
+        from faster_whisper import WhisperModel, download_model
+        compute_type = STT_COMPUTE_TYPE or ("float16" if device == "cuda" else "int8")
+        path = model_size if os.path.isdir(model_size) else download_model(model_size)
+        cpu_threads = getattr(_thread_settings, "cpu_threads", 0) or STT_CPU_THREADS
+        model = WhisperModel(path, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        model.model_path = path
+        return model
+
+    def transcribe(self, model, audio: np.ndarray, language: str = None) -> dict:
+        segments, info = model.transcribe(audio, language=language, beam_size=1)
+        segments = [
+            {
+                "id": segment.id,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "no_speech_prob": segment.no_speech_prob,
+                "compression_ratio": segment.compression_ratio,
+            }
+            for segment in segments  # A generator: decoding happens here.
+        ]
+        return {"text": "".join(segment["text"] for segment in segments), "language": info.language,
+                "segments": segments}
+
+    def detect_language(self, model, audio: np.ndarray):
+        if hasattr(model, "detect_language"):
+            language, probability, _ = model.detect_language(audio[:N_SAMPLES])
+            return language, float(probability)
+        # Older releases: run the language head on the encoder output directly.
+        features = model.feature_extractor(audio[:N_SAMPLES])[:, :model.feature_extractor.nb_max_frames]
+        token, probability = model.model.detect_language(model.encode(features))[0][0]
+        return token[2:-2], float(probability)
+
+    def memory_bytes(self, model) -> int:
+        # CTranslate2 keeps its weights outside Python; the converted model files on
+        # disk are the closest measure.
+        path = getattr(model, "model_path", None) or ""
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+                   if os.path.isfile(os.path.join(path, name))) if os.path.isdir(path) else 0
+
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine, Int8WhisperEngine, FasterWhisperEngine)}
+
+
+def get_engine(name: str = None):
+    """
+    Return an instance of the named engine (STT_ENGINE by default).
+    """
+    name = name or STT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown STT engine '{name}'; choose one of {', '.join(ENGINES)}.")
+    return ENGINES[name]()
@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, load_audio
+from audio_preprocess import AUDIO_PREPROCESS, preprocess
+from long_audio import LONG_AUDIO_SECONDS, transcribe_chunks
+from metrics import current_trace
+from whisper_registry import registry, using_model
+
+# ---------------- Router Configuration ----------------
+# Whisper sizes the router may pick from, cheapest first.
+MODEL_LADDER = ("tiny", "base", "small", "large")
+# Model used for the acoustic language-ID pass, and the largest model routing may reach.
+PROBE_MODEL = os.environ.get("STT_PROBE_MODEL", "tiny")
+MAX_MODEL = os.environ.get("STT_MAX_MODEL", "large")
+# Jobs in flight at or above which the router picks one size smaller and stops escalating.
+BUSY_QUEUE_DEPTH = int(os.environ.get("STT_BUSY_QUEUE_DEPTH", "2"))
+# Language probability needed to trust the probe (and pass the language to the decoder).
+LANGUAGE_CONFIDENCE = 0.7
+# Whisper's own reliability thresholds (see whisper.transcribe).
+AVG_LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+
+def _step(model_size: str, steps: int, max_model: str = MAX_MODEL) -> str:
+    top = MODEL_LADDER.index(max_model)
+    index = MODEL_LADDER.index(model_size) + steps
+    return MODEL_LADDER[max(0, min(index, top))]
+
+
+def choose_model(duration: float, language: str, probability: float, queue_depth: int = 0,
+                 max_model: str = MAX_MODEL) -> str:
+    """
+    Pick a Whisper size for an utterance.
+
+    Confident English goes to base (small for long utterances); Hindi, Marathi and
+    anything uncertain go to small, since the smaller models are weak outside English.
+    Under load (`queue_depth` >= BUSY_QUEUE_DEPTH) everything moves one size down.
+    """
+    if language == "en" and probability >= LANGUAGE_CONFIDENCE:
+        model_size = "base" if duration <= 10 else "small"
+    else:
+        model_size = "small"
+    if queue_depth >= BUSY_QUEUE_DEPTH:
+        model_size = _step(model_size, -1, max_model)
+    return _step(model_size, 0, max_model)
+
+
+def result_quality(result: dict) -> dict:
+    """
+    Duration-weighted average log-probability, no-speech probability and compression
+    ratio over a Whisper result's segments.
+    """
+    segments = result.get("segments") or []
+    if not segments:
+        return {"avg_logprob": 0.0, "no_speech_prob": 1.0 if not result.get("text", "").strip() else 0.0,
+                "compression_ratio": 0.0}
+    weights = np.array([max(s["end"] - s["start"], 1e-3) for s in segments])
+
+    def mean(field, default):
+        return float(np.average([s.get(field, default) for s in segments], weights=weights))
+
+    return {
+        "avg_logprob": round(mean("avg_logprob", 0.0), 4),
+        "no_speech_prob": round(mean("no_speech_prob", 0.0), 4),
+        "compression_ratio": round(max(s.get("compression_ratio", 0.0) for s in segments), 4),
+    }
+
+
+def escalation_reason(quality: dict):
+    """
+    Return why a result is unreliable enough to retry on a bigger model, or None.
+    Low log-probability together with a high no-speech probability is silence, which
+    a bigger model would not improve.
+    """
+    if quality["no_speech_prob"] >= NO_SPEECH_THRESHOLD and quality["avg_logprob"] < AVG_LOGPROB_THRESHOLD:
+        return None
+    if quality["avg_logprob"] < AVG_LOGPROB_THRESHOLD:
+        return "low avg_logprob"
+    if quality["compression_ratio"] > COMPRESSION_RATIO_THRESHOLD:
+        return "repetitive output"
+    return None
+
+
+class STTRouter:
+    """
+    Picks a Whisper size per utterance instead of one hardcoded model.
+
+    A cheap language-ID pass on the probe model gives the language and its
+    probability; together with the utterance length and the current queue depth this
+    selects tiny/base/small/large. If the chosen model's output looks unreliable
+    (average log-probability or repetition), it is retried once on the next size up,
+    unless the queue is busy. Recordings over LONG_AUDIO_SECONDS are decoded as
+    parallel chunks (see long_audio) and not escalated.
+    """
+
+    def __init__(self, probe_model: str = PROBE_MODEL, max_model: str = MAX_MODEL, max_escalations: int = 1,
+                 device: str = None):
+        self.probe_model = probe_model
+        self.max_model = max_model
+        self.max_escalations = max_escalations
+        self.device = device
+        self._lock = threading.Lock()
+        self.routed = {size: 0 for size in MODEL_LADDER}
+        self.escalations = 0
+        self.no_speech = 0
+        self.removed_seconds = 0.0
+
+    def detect_language(self, audio: np.ndarray):
+        """
+        Return (language, probability) from the probe model's language head
+        (a single encoder pass over the first 30 seconds).
+        """
+        with using_model(self.probe_model, device=self.device) as model:
+            return registry.engine.detect_language(model, audio)
+
+    def _decode(self, model_size: str, audio: np.ndarray, language: str = None) -> dict:
+        if len(audio) / SAMPLE_RATE > LONG_AUDIO_SECONDS:
+            return transcribe_chunks(audio, model_size, language, device=self.device)
+        with using_model(model_size, device=self.device) as model:
+            print(f"Transcribing audio with Whisper '{model_size}'...")
+            return registry.engine.transcribe(model, audio, language=language)
+
+    def transcribe(self, audio, model_size: str = None, queue_depth: int = 0) -> dict:
+        """
+        Transcribe `audio` (array or path). `model_size` pins a size and skips routing.
+        Returns the text and language plus how the result was produced.
+
+        The audio is preprocessed first (see audio_preprocess); a capture without
+        speech is not decoded at all and comes back with empty text and "no_speech".
+        """
+        audio = load_audio(audio)
+        timings = {}
+        language, probability = None, None
+        report = None
+        if AUDIO_PREPROCESS:
+            start = time.perf_counter()
+            audio, report = preprocess(audio)
+            timings["preprocess"] = round(time.perf_counter() - start, 4)
+            self._report(report)
+            if not report["speech"]:
+                return {"text": "", "language": "unknown", "language_probability": None, "model": None, "tried": [],
+                        "duration": 0.0, "timings": timings, "no_speech": True, "preprocess": report,
+                        "segments": [], "chunks": 0, **result_quality({})}
+        duration = len(audio) / SAMPLE_RATE
+
+        if model_size is None:
+            start = time.perf_counter()
+            language, probability = self.detect_language(audio)
+            timings["language_id"] = round(time.perf_counter() - start, 4)
+            model_size = choose_model(duration, language, probability, queue_depth, self.max_model)
+        hint = language if probability is not None and probability >= LANGUAGE_CONFIDENCE else None
+
+        start = time.perf_counter()
+        result = self._decode(model_size, audio, hint)
+        timings["transcribe"] = round(time.perf_counter() - start, 4)
+        quality = result_quality(result)
+        tried = [model_size]
+
+        for _ in range(self.max_escalations if duration <= LONG_AUDIO_SECONDS else 0):
+            reason = escalation_reason(quality)
+            bigger = _step(model_size, 1, self.max_model)
+            if reason is None or bigger == model_size or queue_depth >= BUSY_QUEUE_DEPTH:
+                break
+            print(f"Escalating from Whisper '{model_size}' to '{bigger}' ({reason}).")
+            model_size = bigger
+            start = time.perf_counter()
+            result = self._decode(model_size, audio, hint or result.get("language"))
+            timings[f"transcribe_{model_size}"] = round(time.perf_counter() - start, 4)
+            quality = result_quality(result)
+            tried.append(model_size)
+
+        with self._lock:
+            self.routed[model_size] = self.routed.get(model_size, 0) + 1
+            self.escalations += len(tried) - 1
+        # Timestamps on the audio as captured, before preprocessing trimmed its start.
+        offset = report["offset_seconds"] if report else 0.0
+        segments = [{"start": round(float(segment["start"]) + offset, 3), "end": round(float(segment["end"]) + offset, 3),
+                     "text": segment["text"]} for segment in result.get("segments") or []]
+        return {
+            "text": result["text"],
+            "language": result.get("language") or language or "unknown",
+            "language_probability": probability,
+            "model": model_size,
+            "tried": tried,
+            "duration": round(duration, 3),
+            "timings": timings,
+            "no_speech": False,
+            "preprocess": report,
+            "segments": segments,
+            "chunks": result.get("chunks", 1),
+            **quality,
+        }
+
+    def _report(self, report: dict):
+        with self._lock:
+            self.no_speech += not report["speech"]
+            self.removed_seconds += report["removed_seconds"]
+        if report["speech"]:
+            print(f"Preprocessing removed {report['removed_seconds']:.2f}s of {report['input_seconds']:.2f}s "
+                  f"(gain {report['gain_db']:+.1f} dB).")
+        else:
+            print(f"No speech in {report['input_seconds']:.2f}s of audio; skipping transcription.")
+        trace = current_trace()
+        if trace is not None:
+            trace.annotate(audio_seconds=report["input_seconds"], removed_seconds=report["removed_seconds"],
+                           no_speech=not report["speech"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"routed": dict(self.routed), "escalations": self.escalations, "no_speech": self.no_speech,
+                    "removed_seconds": round(self.removed_seconds, 3)}
+
+
+# Shared router used by every transcribe_audio in the project.
+router = STTRouter()
+
+
+def route_transcribe(audio, model_size: str = None, queue_depth: int = 0) -> dict:
+    """
+    Transcribe with the shared router (see STTRouter.transcribe).
+    """
+    return router.transcribe(audio, model_size=model_size, queue_depth=queue_depth)
+
+
+def router_stats() -> dict:
+    return router.stats()
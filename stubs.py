@@ -0,0 +1,186 @@
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from audio_io import SAMPLE_RATE, load_audio
+
+# Reply used by the stand-ins when none is given (about 25 tokens, two sentences).
+DEFAULT_REPLY = (
+    "Please restart your router and wait for the lights to turn green. "
+    "If the internet still does not work, call your service provider."
+)
+
+# A short valid MP3 frame header followed by silence; enough for byte-level handling.
+FAKE_MP3 = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+class _Message(dict):
+    """
+    Dict that also allows attribute access, like the OpenAI 0.x response objects.
+    """
+
+    __getattr__ = dict.get
+
+
+class FakeChatCompletion:
+    """
+    Deterministic local stand-in for `openai.ChatCompletion` with configurable latency.
+
+    `create(...)` sleeps `latency` seconds and returns the fixed reply; with
+    `stream=True` it yields word deltas after `first_token_delay`, `token_delay` apart.
+    """
+
+    def __init__(self, reply: str = DEFAULT_REPLY, latency: float = 0.3, first_token_delay: float = None,
+                 token_delay: float = 0.02):
+        self.reply = reply
+        self.latency = latency
+        self.first_token_delay = latency if first_token_delay is None else first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model: str = "gpt-3.5-turbo", messages=None, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        message = _Message(role="assistant", content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    def _stream(self):
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(re.findall(r"\S+\s*", self.reply)):
+            if i:
+                time.sleep(self.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=_Message(content=token))])
+
+
+class FakeTTS:
+    """
+    Local stand-in for a TTS backend: sleeps `latency` seconds and returns fixed bytes.
+    Call it with the text, or use `synthesizer(text)` as a cached_synthesis callback.
+    """
+
+    def __init__(self, latency: float = 0.1, audio: bytes = FAKE_MP3):
+        self.latency = latency
+        self.audio = audio
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str = "", *args, **kwargs) -> bytes:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.audio
+
+    def synthesizer(self, text: str):
+        return lambda: self(text)
+
+
+class FileMicrophone:
+    """
+    Stand-in for a recorder that returns the same file's audio (16 kHz float32) on
+    every call, optionally waiting as long as the clip lasts to mimic live capture.
+    """
+
+    def __init__(self, path: str, realtime: bool = False):
+        self.path = path
+        self.audio = load_audio(path)
+        self.realtime = realtime
+
+    def __call__(self, *args, **kwargs):
+        if self.realtime:
+            time.sleep(len(self.audio) / SAMPLE_RATE)
+        return self.audio.copy()
+
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible HTTP server for /chat/completions (plain and streamed),
+    run on a background thread. `latency` delays every reply; every `slow_every`-th
+    request takes `slow_latency` instead; the first `fail_first` requests answer
+    `fail_status`. Use `url` as the LLM client's base URL.
+    """
+
+    def __init__(self, reply: str = DEFAULT_REPLY, latency: float = 0.05, slow_every: int = 0,
+                 slow_latency: float = 2.0, fail_first: int = 0, fail_status: int = 503, port: int = 0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.reply = reply
+        self.latency = latency
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self.idempotency_keys = []
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with mock._lock:
+                    mock.requests += 1
+                    number = mock.requests
+                    mock.idempotency_keys.append(self.headers.get("Idempotency-Key"))
+                if number <= mock.fail_first:
+                    self._send(mock.fail_status, {"error": {"message": "mock failure"}})
+                    return
+                slow = mock.slow_every and number % mock.slow_every == 0
+                time.sleep(mock.slow_latency if slow else mock.latency)
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._send(200, {"id": f"mock-{number}", "object": "chat.completion", "model": body.get("model"),
+                                     "choices": [{"index": 0, "finish_reason": "stop",
+                                                  "message": {"role": "assistant", "content": mock.reply}}]})
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up (timeout or a hedged duplicate won).
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for token in re.findall(r"\S+\s*", mock.reply):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> "MockLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
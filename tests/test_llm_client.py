@@ -0,0 +1,128 @@
+import time
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpen, DeadlineExceeded, LLMClient, LLMError
+from stubs import DEFAULT_REPLY, MockLLMServer
+
+MESSAGES = [{"role": "user", "content": "My internet is down."}]
+
+
+def make_client(server: MockLLMServer, **options) -> LLMClient:
+    options.setdefault("backoff_base", 0.01)
+    return LLMClient(base_url=server.url, api_key="test", **options)
+
+
+def test_chat_returns_the_reply():
+    with MockLLMServer(latency=0.01) as server:
+        client = make_client(server)
+        assert client.chat(MESSAGES) == DEFAULT_REPLY
+    assert client.stats()["attempts"] == 1
+
+
+def test_retryable_failures_are_retried_with_one_idempotency_key():
+    with MockLLMServer(latency=0.01, fail_first=2, fail_status=503) as server:
+        client = make_client(server, max_retries=2)
+        assert client.chat(MESSAGES) == DEFAULT_REPLY
+        keys = server.idempotency_keys
+    assert client.counts["retries"] == 2
+    assert len(keys) == 3 and len(set(keys)) == 1 and keys[0]
+
+
+def test_retries_give_up_after_max_retries():
+    with MockLLMServer(latency=0.01, fail_first=10, fail_status=429) as server:
+        client = make_client(server, max_retries=1)
+        with pytest.raises(LLMError, match="after 2 attempts"):
+            client.chat(MESSAGES)
+        assert server.requests == 2
+
+
+def test_client_errors_are_not_retried():
+    with MockLLMServer(latency=0.01, fail_first=10, fail_status=400) as server:
+        client = make_client(server, max_retries=3)
+        with pytest.raises(LLMError, match="HTTP 400"):
+            client.chat(MESSAGES)
+        assert server.requests == 1
+
+
+def test_deadline_bounds_a_slow_provider():
+    with MockLLMServer(latency=1.0) as server:
+        client = make_client(server, attempt_timeout=0.2, deadline=0.3)
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            client.chat(MESSAGES)
+        assert time.monotonic() - start < 0.9
+
+
+def test_hedged_request_wins_over_a_slow_primary():
+    # Request 1 warms the connection; request 2 (the primary) is slow, 3 (the hedge) is not.
+    with MockLLMServer(latency=0.01, slow_every=2, slow_latency=1.0) as server:
+        client = make_client(server, hedge=True)
+        client.hedge_delay = lambda: 0.1
+        assert client.chat(MESSAGES) == DEFAULT_REPLY
+        start = time.monotonic()
+        assert client.chat(MESSAGES) == DEFAULT_REPLY
+        elapsed = time.monotonic() - start
+    assert elapsed < 0.8
+    assert client.counts["hedges"] == 1 and client.counts["hedge_wins"] == 1
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_successful_trial():
+    with MockLLMServer(latency=0.01, fail_first=2, fail_status=503) as server:
+        client = make_client(server, max_retries=0, breaker=CircuitBreaker(threshold=2, reset_seconds=0.2))
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                client.chat(MESSAGES)
+        assert client.breaker.state == "open"
+        with pytest.raises(CircuitOpen):
+            client.chat(MESSAGES)
+        assert server.requests == 2
+        assert client.counts["rejected"] == 1
+
+        time.sleep(0.25)
+        assert client.breaker.state == "half_open"
+        assert client.chat(MESSAGES) == DEFAULT_REPLY
+        assert client.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow() is False
+    time.sleep(0.06)
+    assert breaker.allow() == "trial"
+    # Only one trial at a time.
+    assert breaker.allow() is False
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_half_open_trial_ends_when_it_raises_an_unexpected_error():
+    client = LLMClient(base_url="http://[invalid", api_key="test",
+                       breaker=CircuitBreaker(threshold=1, reset_seconds=0.05))
+    client.breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(Exception):
+        client.chat(MESSAGES)
+    assert client.breaker.state == "open"
+    time.sleep(0.06)
+    assert client.breaker.allow() == "trial"
+
+
+def test_abandoned_stream_releases_the_half_open_trial():
+    with MockLLMServer(latency=0.01) as server:
+        client = make_client(server, breaker=CircuitBreaker(threshold=1, reset_seconds=0.05))
+        client.breaker.record_failure()
+        time.sleep(0.06)
+        deltas = client.stream(MESSAGES)
+        assert next(deltas)
+        deltas.close()
+        assert client.breaker.allow() == "trial"
+
+
+def test_stream_yields_the_reply_in_deltas():
+    with MockLLMServer(latency=0.01) as server:
+        client = make_client(server)
+        deltas = list(client.stream(MESSAGES))
+    assert len(deltas) > 1 and "".join(deltas) == DEFAULT_REPLY
+    assert client.breaker.state == "closed"
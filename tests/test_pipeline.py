@@ -0,0 +1,162 @@
+import io
+import threading
+import time
+import wave
+
+from metrics import Trace
+from pipeline import STAGES, TurnStages, VoicePipeline, is_exit_command
+from playback import NullSink, PlaybackEngine
+
+
+def wav_clip(seconds: float, rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(rate * seconds))
+    return buffer.getvalue()
+
+
+class TimedSink(NullSink):
+    """
+    Real-time null sink that also notes when each clip finished playing.
+    """
+
+    def __init__(self):
+        super().__init__(realtime=True)
+        self.finished = []
+
+    def play(self, audio, stop, progress) -> bool:
+        completed = super().play(audio, stop, progress)
+        self.finished.append(time.monotonic())
+        return completed
+
+
+class FakeConversation:
+    """
+    Fake recorder, STT, slow LLM and TTS for the pipeline; the TTS queues a clip on
+    `player`. `transcripts` maps turn numbers to what the user "said".
+    """
+
+    def __init__(self, player: PlaybackEngine, llm_seconds: float = 0.2, reply_seconds: float = 0.3,
+                 transcripts: dict = None, fail_at: dict = None):
+        self.player = player
+        self.llm_seconds = llm_seconds
+        self.reply_seconds = reply_seconds
+        self.transcripts = transcripts or {}
+        self.fail_at = fail_at or {}
+        self.recorded = []
+        self.events = []
+        self._lock = threading.Lock()
+
+    def _log(self, stage, number):
+        with self._lock:
+            self.events.append((stage, number))
+        if self.fail_at.get(number) == stage:
+            raise RuntimeError(f"{stage} failed")
+
+    def record(self):
+        with self._lock:
+            number = len(self.recorded) + 1
+            self.recorded.append(time.monotonic())
+        self._log("record", number)
+        return number
+
+    def transcribe(self, audio):
+        self._log("transcribe", audio)
+        return self.transcripts.get(audio, f"question {audio}"), "en"
+
+    def detect(self, text, whisper_language):
+        self._log("language_id", int(text.split()[-1]))
+        return whisper_language
+
+    def generate(self, text, language):
+        number = int(text.split()[-1])
+        self._log("llm", number)
+        time.sleep(self.llm_seconds)
+        return f"answer {number}"
+
+    def speak(self, reply, language):
+        number = int(reply.split()[-1])
+        self._log("tts", number)
+        time.sleep(0.05)
+        self.player.enqueue(wav_clip(self.reply_seconds))
+
+    def stages(self) -> TurnStages:
+        return TurnStages(self.record, self.transcribe, self.detect, self.generate, self.speak)
+
+
+def test_is_exit_command_ignores_case_and_punctuation():
+    assert is_exit_command(" Exit. ")
+    assert is_exit_command("quit!")
+    assert not is_exit_command("exit the building")
+
+
+def test_run_turn_runs_every_stage_in_order():
+    conversation = FakeConversation(PlaybackEngine(sink=NullSink()), llm_seconds=0)
+    turn = conversation.stages().run_turn(trace=Trace())
+    assert [stage for stage, _ in conversation.events] == list(STAGES)
+    assert turn.reply == "answer 1" and turn.language == "en"
+    assert set(turn.trace.stages) == set(STAGES)
+
+
+def test_run_turn_stops_after_transcription_without_speech():
+    conversation = FakeConversation(PlaybackEngine(sink=NullSink()), transcripts={1: " "})
+    turn = conversation.stages().run_turn()
+    assert turn.no_speech
+    assert [stage for stage, _ in conversation.events] == ["record", "transcribe"]
+
+
+def test_half_duplex_records_the_next_turn_after_the_reply_has_played():
+    sink = TimedSink()
+    player = PlaybackEngine(sink=sink)
+    conversation = FakeConversation(player)
+    turns = VoicePipeline(conversation.stages(), barge_in=False, player=player).run(max_turns=3)
+    player.wait(timeout=2)
+    assert turns == 3
+    assert len(sink.finished) == 3 and len(conversation.recorded) == 3
+    for n in range(2):
+        # Turn n + 2 starts recording only after turn n + 1's reply has finished playing.
+        assert conversation.recorded[n + 1] >= sink.finished[n]
+
+
+def test_barge_in_overlaps_recording_with_the_previous_reply():
+    sink = TimedSink()
+    player = PlaybackEngine(sink=sink)
+    conversation = FakeConversation(player)
+    turns = VoicePipeline(conversation.stages(), barge_in=True, player=player).run(max_turns=3)
+    player.wait(timeout=2)
+    assert turns == 3
+    assert conversation.recorded[1] < sink.finished[0]
+
+
+def test_stages_run_in_order_for_every_turn():
+    player = PlaybackEngine(sink=NullSink())
+    conversation = FakeConversation(player, llm_seconds=0.05)
+    VoicePipeline(conversation.stages(), barge_in=True, player=player).run(max_turns=4)
+    for number in range(1, 5):
+        assert [stage for stage, n in conversation.events if n == number] == list(STAGES)
+    # Each stage handles the turns in the order they were recorded.
+    for stage in STAGES:
+        assert [n for s, n in conversation.events if s == stage] == [1, 2, 3, 4]
+
+
+def test_failed_and_silent_turns_are_skipped_without_stopping_the_conversation():
+    player = PlaybackEngine(sink=NullSink())
+    conversation = FakeConversation(player, llm_seconds=0, transcripts={2: ""}, fail_at={3: "llm"})
+    completed = []
+    pipeline = VoicePipeline(conversation.stages(), barge_in=False, player=player, on_turn=completed.append)
+    # Only answered (or failed) turns count as completed.
+    assert pipeline.run(max_turns=3) == 2
+    assert [(turn.number, turn.no_speech, turn.error is not None) for turn in completed[:3]] == [
+        (1, False, False), (2, True, False), (3, False, True)]
+    assert ("llm", 2) not in conversation.events and ("tts", 3) not in conversation.events
+
+
+def test_exit_ends_the_conversation_after_the_turns_before_it():
+    player = PlaybackEngine(sink=NullSink())
+    conversation = FakeConversation(player, llm_seconds=0, transcripts={2: "Exit."})
+    assert VoicePipeline(conversation.stages(), barge_in=False, player=player).run() == 1
+    assert len(conversation.recorded) == 2
+    assert ("tts", 1) in conversation.events and ("llm", 2) not in conversation.events
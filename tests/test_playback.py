@@ -0,0 +1,106 @@
+import io
+import threading
+import time
+import wave
+
+import playback
+from playback import NullSink, PlaybackEngine, audio_duration
+
+
+def wav_clip(seconds: float, rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(rate * seconds))
+    return buffer.getvalue()
+
+
+def test_audio_duration_of_wav():
+    assert abs(audio_duration(wav_clip(0.25)) - 0.25) < 1e-6
+    assert audio_duration(b"not audio") is None
+
+
+def test_enqueue_returns_at_once_and_wait_blocks_until_played():
+    engine = PlaybackEngine(sink=NullSink(realtime=True))
+    start = time.monotonic()
+    engine.enqueue(wav_clip(0.2))
+    engine.enqueue(wav_clip(0.2))
+    assert time.monotonic() - start < 0.1
+    assert engine.wait(timeout=2)
+    assert time.monotonic() - start >= 0.4
+    assert engine.stats()["played"] == 2
+    assert not engine.is_playing
+
+
+def test_wait_times_out_while_a_clip_plays():
+    engine = PlaybackEngine(sink=NullSink(realtime=True))
+    engine.enqueue(wav_clip(0.5))
+    assert engine.wait(timeout=0.1) is False
+    engine.barge_in()
+
+
+def test_barge_in_stops_the_current_clip_and_drops_the_queue():
+    sink = NullSink(realtime=True)
+    engine = PlaybackEngine(sink=sink)
+    for _ in range(3):
+        engine.enqueue(wav_clip(1.0))
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert engine.barge_in() == 3
+    assert engine.wait(timeout=1)
+    assert time.monotonic() - start < 0.3
+    stats = engine.stats()
+    assert stats["interrupted"] == 1 and stats["dropped"] == 2 and stats["played"] == 0
+    assert len(sink.played) == 1
+
+    # Clips queued after the barge-in play normally.
+    engine.enqueue(wav_clip(0.05))
+    assert engine.wait(timeout=1)
+    assert engine.stats()["played"] == 1
+
+
+def test_progress_is_reported_while_playing():
+    positions = []
+    engine = PlaybackEngine(sink=NullSink(realtime=True), on_progress=lambda status: positions.append(status["position"]))
+    engine.enqueue(wav_clip(0.2), label="reply")
+    engine.wait(timeout=1)
+    assert positions == sorted(positions) and positions[-1] == 0.2
+
+
+def test_failing_sink_does_not_stop_the_engine():
+    class FlakySink(NullSink):
+        def play(self, audio, stop, progress):
+            if not self.played:
+                self.played.append(audio)
+                raise OSError("device busy")
+            return super().play(audio, stop, progress)
+
+    engine = PlaybackEngine(sink=FlakySink())
+    engine.enqueue(wav_clip(0.05))
+    engine.enqueue(wav_clip(0.05))
+    assert engine.wait(timeout=1)
+    assert engine.stats()["failures"] == 1 and engine.stats()["played"] == 1
+
+
+def test_prepare_to_listen_waits_for_the_reply_only_without_barge_in(monkeypatch):
+    engine = PlaybackEngine(sink=NullSink(realtime=True))
+    monkeypatch.setattr(playback, "player", engine)
+
+    monkeypatch.setattr(playback, "BARGE_IN", False)
+    engine.enqueue(wav_clip(0.3))
+    start = time.monotonic()
+    playback.prepare_to_listen()
+    assert time.monotonic() - start >= 0.25 and not engine.is_playing
+
+    monkeypatch.setattr(playback, "BARGE_IN", True)
+    engine.enqueue(wav_clip(0.3))
+    start = time.monotonic()
+    playback.prepare_to_listen()
+    assert time.monotonic() - start < 0.1
+    # With barge-in, the user starting to speak stops the reply.
+    finished = threading.Event()
+    threading.Thread(target=lambda: (engine.wait(), finished.set()), daemon=True).start()
+    playback.barge_in()
+    assert finished.wait(0.3)
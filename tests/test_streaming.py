@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+import llm_client
+from streaming import FakeStreamingLLM, SentenceSplitter, speak_streaming, split_sentences, stream_chat_completion
+from stubs import DEFAULT_REPLY, MockLLMServer
+
+
+def test_split_sentences_keeps_decimals_and_closes_on_danda():
+    assert split_sentences("It costs 3.5 rupees today. Please pay at the counter.") == [
+        "It costs 3.5 rupees today.", "Please pay at the counter."]
+    # Unlike ".", a danda at the end of a delta closes the sentence without waiting.
+    assert SentenceSplitter().feed("तुमचा राउटर रीस्टार्ट करा।") == ["तुमचा राउटर रीस्टार्ट करा।"]
+
+
+def test_short_sentences_are_merged_into_the_next():
+    assert split_sentences("Ok. Restart the router now.") == ["Ok. Restart the router now."]
+
+
+def test_splitter_waits_for_the_next_delta_before_closing():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Restart the router.") == []
+    assert splitter.feed(" Then wait") == ["Restart the router."]
+    assert splitter.flush() == ["Then wait"]
+
+
+def test_sentences_are_played_in_order_before_the_reply_has_finished():
+    reply = "Restart the router first. Wait for the green light. Then call your provider if needed."
+    played = []
+    first_played = threading.Event()
+
+    def play(audio):
+        played.append((time.perf_counter(), audio))
+        first_played.set()
+
+    llm = FakeStreamingLLM(reply, first_token_delay=0.05, token_delay=0.05)
+    start = time.perf_counter()
+    stats = speak_streaming(llm(), lambda sentence: sentence.upper(), play)
+    total = time.perf_counter() - start
+
+    assert stats["text"] == reply
+    assert [audio for _, audio in played] == [sentence.upper() for sentence in split_sentences(reply)]
+    # The first sentence is spoken while later tokens are still arriving.
+    assert played[0][0] - start < total - 0.2
+    assert stats["time_to_first_audio"] < stats["total"]
+
+
+def test_synthesis_failure_is_raised_without_blocking_the_stream():
+    def synthesize(sentence):
+        raise RuntimeError("tts down")
+
+    reply = " ".join(f"Sentence number {i} is here." for i in range(20))
+    with pytest.raises(RuntimeError, match="tts down"):
+        speak_streaming(FakeStreamingLLM(reply, first_token_delay=0, token_delay=0)(), synthesize, lambda audio: None,
+                        max_pending=1)
+
+
+def test_stream_chat_completion_reads_deltas_from_the_server(monkeypatch):
+    with MockLLMServer(latency=0.01) as server:
+        monkeypatch.setattr(llm_client, "client", llm_client.LLMClient(base_url=server.url, api_key="test"))
+        deltas = list(stream_chat_completion([{"role": "user", "content": "hi"}]))
+    assert len(deltas) > 1
+    assert "".join(deltas) == DEFAULT_REPLY
@@ -0,0 +1,57 @@
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from vad import VADSegmenter, array_chunks, iter_utterances, record_utterance
+
+
+def tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (0.001 * rng.standard_normal(int(SAMPLE_RATE * seconds))).astype(np.float32)
+
+
+def test_utterances_are_cut_at_pauses():
+    audio = np.concatenate((silence(0.5), tone(0.6), silence(1.0), tone(0.8), silence(1.0)))
+    utterances = list(iter_utterances(audio))
+    assert len(utterances) == 2
+    assert 0.6 <= len(utterances[1]) / SAMPLE_RATE <= 0.8 + 0.3 + 0.7 + 0.1
+
+
+def test_blips_are_dropped_and_never_reach_on_speech():
+    fed = []
+    audio = np.concatenate((silence(0.5), tone(0.12), silence(1.0)))
+    assert list(iter_utterances(audio, on_speech=fed.append)) == []
+    assert fed == []
+
+
+def test_speech_start_is_reported_before_the_utterance_ends():
+    events = []
+    segmenter = VADSegmenter(on_speech_start=lambda: events.append("start"))
+    for chunk in array_chunks(np.concatenate((silence(0.5), tone(0.6), silence(1.0)))):
+        for _ in segmenter.process(chunk):
+            events.append("utterance")
+    assert events == ["start", "utterance"]
+
+
+def test_record_utterance_gives_up_after_max_wait():
+    consumed = []
+
+    def endless_silence():
+        while True:
+            chunk = silence(0.1)
+            consumed.append(chunk)
+            yield chunk
+
+    audio = record_utterance(endless_silence(), max_wait_s=1.0)
+    assert len(audio) == 0
+    assert 0.9 <= len(consumed) * 0.1 <= 1.2
+
+
+def test_max_wait_does_not_cut_an_utterance_in_progress():
+    audio = np.concatenate((silence(0.8), tone(2.0), silence(1.0)))
+    utterance = record_utterance(audio, max_wait_s=1.0)
+    assert len(utterance) / SAMPLE_RATE >= 2.0
@@ -1,6 +1,6 @@
-from gtts import gTTS
-from playsound import playsound
-import os
+from tts_cache import cached_gtts
+from tts_chunks import speak_chunked
+from playback import player, wait_for_playback
 
 def text_to_speech(text, lang='mr'):
     """
@@ -10,20 +10,13 @@ def text_to_speech(text, lang='mr'):
         text (str): The text to convert to speech.
         lang (str): The language code (default 'mr' for Marathi).
     """
-    # Create a gTTS object
-    tts = gTTS(text=text, lang=lang)
-    filename = "response.mp3"
-    
-    # Save the audio file
-    tts.save(filename)
-    
-    # Play the audio file
-    playsound(filename)
-    
-    # Optionally, remove the audio file after playing
-    os.remove(filename)
+    # Synthesize sentence chunks with gTTS in parallel (or reuse cached audio for
+    # identical chunks); the first chunk plays while the rest are synthesized.
+    # Playback runs in the background from memory, so no audio file is written
+    speak_chunked(text, lambda chunk: cached_gtts(chunk, lang=lang), player.enqueue, provider="gtts")
 
 # Test the TTS function
 if __name__ == "__main__":
     sample_text = "नमस्कार! तुमचा राउटर रीस्टार्ट करा आणि ३० सेकंद थांबा. मग पुन्हा सुरु करा. जर समस्या कायम राहिली तर, तुमच्या सेवा प्रदात्याशी संपर्क साधा."
-    text_to_speech(sample_text, lang='mr')
\ No newline at end of file
+    text_to_speech(sample_text, lang='mr')
+    wait_for_playback()
\ No newline at end of file
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from singleflight import SingleFlight
+
+# ---------------- Cache Configuration ----------------
+# In-memory byte budget, and where evicted audio is spilled; both can be set from the environment.
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024)
+DISK_BUDGET_BYTES = int(float(os.environ.get("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024)
+CACHE_DIR = os.environ.get(
+    "TTS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"),
+)
+
+
+def audio_key(text: str, language_code: str, voice_gender: str = "", encoding: str = "MP3", backend: str = "gcp") -> str:
+    """
+    Content address of a synthesis request: the SHA-256 of everything that changes the audio.
+    """
+    parts = [backend, language_code, voice_gender.upper(), encoding.upper(), text]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio.
+
+    Recently used clips are kept in memory up to `memory_budget` bytes; clips pushed out
+    of memory are spilled to `cache_dir` (itself pruned to `disk_budget` bytes, oldest
+    first) and promoted back on their next hit. Concurrent requests for the same key
+    share a single synthesis.
+    """
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET_BYTES, cache_dir: str = CACHE_DIR,
+                 disk_budget: int = DISK_BUDGET_BYTES):
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_budget
+        self._memory = OrderedDict()  # key -> audio bytes
+        self._memory_bytes = 0
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_synthesize(self, key: str, synthesize) -> bytes:
+        """
+        Return the audio for `key`, calling `synthesize()` only if no cached or
+        in-flight copy exists.
+        """
+        audio = self._memory_get(key)
+        if audio is not None:
+            return audio
+        audio, shared = self._flight.do(key, lambda: self._load_or_synthesize(key, synthesize))
+        if shared:
+            with self._lock:
+                self.coalesced += 1
+        return audio
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return audio
+
+    def _load_or_synthesize(self, key: str, synthesize) -> bytes:
+        # A previous leader may have stored the clip since our memory check.
+        audio = self._memory_get(key)
+        if audio is not None:
+            return audio
+        audio = self._read_disk(key)
+        with self._lock:
+            if audio is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if audio is None:
+            audio = synthesize()
+        self._store(key, audio)
+        return audio
+
+    def _store(self, key: str, audio: bytes):
+        spilled = []
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+                old_key, old_audio = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old_audio)
+                spilled.append((old_key, old_audio))
+        for old_key, old_audio in spilled:
+            self._write_disk(old_key, old_audio)
+        if spilled:
+            self._prune_disk()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".audio")
+
+    def _read_disk(self, key: str):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except OSError:
+            return None
+        # Drop the spilled copy; it is back in memory now and will be spilled again if evicted.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes):
+        if not self.cache_dir or self.disk_budget <= 0:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+    def _prune_disk(self):
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".audio"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        # Coalesced requests waited on another caller's synthesis, so they count as hits.
+        hits = self.memory_hits + self.disk_hits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+# Shared cache used by every synthesize_and_play / text_to_speech in the project.
+audio_cache = AudioCache()
+
+
+def cached_synthesis(synthesize, text: str, language_code: str, voice_gender: str = "",
+                     encoding: str = "MP3", backend: str = "gcp") -> bytes:
+    """
+    Return synthesized audio for the request from the shared cache, calling
+    `synthesize()` on a miss.
+    """
+    key = audio_key(text, language_code, voice_gender, encoding, backend)
+    return audio_cache.get_or_synthesize(key, synthesize)
+
+
+def cached_gtts(text: str, lang: str = "en", tld: str = "com") -> bytes:
+    """
+    Return gTTS MP3 audio for `text`, served from the shared cache when possible.
+    """
+    def synthesize() -> bytes:
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang, tld=tld).write_to_fp(buffer)
+        return buffer.getvalue()
+
+    return cached_synthesis(synthesize, text, lang, voice_gender=tld, encoding="MP3", backend="gtts")
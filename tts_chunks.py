@@ -0,0 +1,252 @@
+import io
+import os
+import re
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from streaming import split_sentences
+
+# ---------------- Settings ----------------
+# Hard per-request input limits: Google Cloud TTS rejects more than 5000 bytes of text,
+# and gTTS splits anything over 100 characters into serial requests of its own.
+PROVIDER_LIMITS = {
+    "gcp": {"max_bytes": 5000, "max_chars": None},
+    "gtts": {"max_bytes": None, "max_chars": 100},
+}
+# Sentences are packed into chunks of about this many characters (never past the hard
+# limit). Smaller chunks mean more parallel requests; the first chunk is kept short so
+# playback can start as soon as possible.
+CHUNK_CHARS = int(os.environ.get("TTS_CHUNK_CHARS", "250"))
+FIRST_CHUNK_CHARS = int(os.environ.get("TTS_FIRST_CHUNK_CHARS", "80"))
+# Chunk syntheses running at once, shared by every caller in the process so a burst of
+# long replies cannot exceed the provider's rate limits.
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "4"))
+
+# Progressively finer places to break a sentence that is over the hard limit:
+# clause punctuation (including the danda), then whitespace.
+_BREAKS = (
+    re.compile(r"[^,;:।]+[,;:।]*\s*|[,;:।]+\s*"),
+    re.compile(r"\S+\s*|\s+"),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+        return _executor
+
+
+# ---------------- Chunking ----------------
+def _fits(text: str, max_bytes: int = None, max_chars: int = None) -> bool:
+    text = text.strip()
+    if max_chars is not None and len(text) > max_chars:
+        return False
+    return max_bytes is None or len(text.encode("utf-8")) <= max_bytes
+
+
+def _split_to_fit(text: str, fits, level: int = 0) -> list:
+    """
+    Break `text` into pieces that each satisfy `fits`, preferring clause boundaries,
+    then word boundaries, and cutting between characters only as a last resort.
+    """
+    if fits(text):
+        return [text]
+    if level == len(_BREAKS):
+        pieces, current = [], ""
+        for char in text:
+            if current and not fits(current + char):
+                pieces.append(current)
+                current = ""
+            current += char
+        return pieces + [current] if current else pieces
+    pieces = []
+    for piece in _BREAKS[level].findall(text):
+        pieces.extend(_split_to_fit(piece, fits, level + 1))
+    return pieces
+
+
+def chunk_text(text: str, provider: str = "gcp", chunk_chars: int = CHUNK_CHARS,
+               first_chunk_chars: int = FIRST_CHUNK_CHARS) -> list:
+    """
+    Split `text` into chunks for separate TTS requests: whole sentences packed up to
+    `chunk_chars` (`first_chunk_chars` for the first chunk), and over-long sentences
+    broken at clauses or words so no chunk exceeds the provider's input limit.
+    """
+    limits = PROVIDER_LIMITS[provider]
+
+    def fits(piece: str) -> bool:
+        return _fits(piece, limits["max_bytes"], limits["max_chars"])
+
+    pieces = []
+    for sentence in split_sentences(text):
+        pieces.extend(_split_to_fit(sentence + " ", fits))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        target = first_chunk_chars if not chunks else chunk_chars
+        if current and (len((current + piece).strip()) > target or not fits(current + piece)):
+            chunks.append(current.strip())
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+# ---------------- Concatenation ----------------
+def strip_id3(mp3: bytes) -> bytes:
+    """
+    Remove a leading ID3v2 tag and a trailing ID3v1 tag, leaving only MPEG frames.
+    """
+    if mp3[:3] == b"ID3" and len(mp3) >= 10:
+        size = (mp3[6] & 0x7F) << 21 | (mp3[7] & 0x7F) << 14 | (mp3[8] & 0x7F) << 7 | (mp3[9] & 0x7F)
+        footer = 10 if mp3[5] & 0x10 else 0
+        mp3 = mp3[10 + size + footer:]
+    if len(mp3) >= 128 and mp3[-128:-125] == b"TAG":
+        mp3 = mp3[:-128]
+    return mp3
+
+
+def concat_mp3(parts) -> bytes:
+    """
+    Join MP3 files by concatenating their frames. MPEG frames are self-contained, so
+    only the ID3 tags have to go (a tag in the middle would play as a click).
+    """
+    parts = list(parts)
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(strip_id3(part) for part in parts)
+
+
+def _wav_format_and_pcm(wav: bytes):
+    """
+    Return (fmt chunk bytes, PCM data) of a RIFF/WAVE file, reading chunk headers
+    directly since streamed WAVs may carry placeholder sizes.
+    """
+    if wav[:4] != b"RIFF" or wav[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file.")
+    fmt, offset = None, 12
+    while offset + 8 <= len(wav):
+        chunk_id, size = wav[offset:offset + 4], struct.unpack("<I", wav[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = wav[body:body + size]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before its format chunk.")
+            return fmt, wav[body:body + size]
+        offset = body + size + (size & 1)
+    raise ValueError("WAV file has no data chunk.")
+
+
+def concat_wav(parts) -> bytes:
+    """
+    Join LINEAR16 WAV files into one by concatenating their PCM samples.
+    """
+    params, pcm = None, []
+    for part in parts:
+        fmt, data = _wav_format_and_pcm(part)
+        if params is None:
+            params = fmt
+        elif fmt[:16] != params[:16]:
+            raise ValueError("Cannot join WAV chunks with different sample formats.")
+        pcm.append(data)
+    if params is None:
+        return b""
+    channels, sample_rate = struct.unpack("<HI", params[2:8])
+    sample_width = struct.unpack("<H", params[14:16])[0] // 8
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sample_width)
+        w.setframerate(sample_rate)
+        w.writeframes(b"".join(pcm))
+    return out.getvalue()
+
+
+def concat_audio(parts, encoding: str = "MP3") -> bytes:
+    """
+    Join synthesized chunks of the given encoding ("MP3" or "LINEAR16") in order.
+    """
+    if encoding == "MP3":
+        return concat_mp3(parts)
+    if encoding == "LINEAR16":
+        return concat_wav(parts)
+    raise ValueError(f"Cannot join {encoding} audio.")
+
+
+# ---------------- Synthesis ----------------
+def _submit_all(chunks, synthesize) -> list:
+    executor = _get_executor()
+    return [executor.submit(synthesize, chunk) for chunk in chunks]
+
+
+def synthesize_chunks(chunks, synthesize):
+    """
+    Synthesize every chunk on the shared TTS pool and yield the audio in order, each
+    part as soon as it (and everything before it) is ready.
+    """
+    futures = _submit_all(chunks, synthesize)
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def synthesize_long(text: str, synthesize, encoding: str = "MP3", provider: str = "gcp") -> bytes:
+    """
+    Synthesize `text` of any length as one audio file: chunk it, synthesize the chunks
+    in parallel with `synthesize(chunk) -> bytes` and join the results.
+    """
+    chunks = chunk_text(text, provider)
+    if len(chunks) <= 1:
+        return synthesize(chunks[0] if chunks else text)
+    return concat_audio(synthesize_chunks(chunks, synthesize), encoding)
+
+
+def speak_chunked(text: str, synthesize, play, encoding: str = "MP3", provider: str = "gcp") -> dict:
+    """
+    Speak `text` with chunk one playing as soon as it is synthesized while the other
+    chunks are synthesized in parallel. Chunks that are already done when a playback
+    ends are joined and played together, so short chunks do not add gaps.
+
+    `synthesize(chunk) -> bytes` and `play(audio)` are supplied by the caller.
+    Returns the number of chunks and playbacks and time_to_first_audio (seconds).
+    """
+    start = time.perf_counter()
+    chunks = chunk_text(text, provider)
+    stats = {"chunks": len(chunks), "playbacks": 0, "time_to_first_audio": None}
+    if len(chunks) <= 1:
+        audio = synthesize(chunks[0] if chunks else text)
+        stats["time_to_first_audio"] = time.perf_counter() - start
+        play(audio)
+        stats["playbacks"] = 1
+        return stats
+
+    futures = _submit_all(chunks, synthesize)
+    try:
+        i = 0
+        while i < len(futures):
+            ready = [futures[i].result()]
+            i += 1
+            while i < len(futures) and futures[i].done():
+                ready.append(futures[i].result())
+                i += 1
+            if stats["time_to_first_audio"] is None:
+                stats["time_to_first_audio"] = time.perf_counter() - start
+            play(concat_audio(ready, encoding))
+            stats["playbacks"] += 1
+    finally:
+        for future in futures:
+            future.cancel()
+    return stats
@@ -0,0 +1,290 @@
+import queue
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, load_audio
+
+
+class RingBuffer:
+    """
+    Fixed-capacity circular buffer of float32 samples.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._pos = 0
+        self._size = 0
+
+    def write(self, samples: np.ndarray):
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        end = self._pos + n
+        if end <= self.capacity:
+            self._data[self._pos:end] = samples
+        else:
+            first = self.capacity - self._pos
+            self._data[self._pos:] = samples[:first]
+            self._data[:n - first] = samples[first:]
+        self._pos = end % self.capacity
+        self._size = min(self.capacity, self._size + n)
+
+    def read(self) -> np.ndarray:
+        """
+        Return the buffered samples, oldest first.
+        """
+        if self._size < self.capacity:
+            return self._data[:self._size].copy()
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+
+def frame_features(frames: np.ndarray):
+    """
+    Return the energy (dB) and zero-crossing rate of each row of a (frames x samples) array.
+    """
+    energy_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy_db, zcr
+
+
+class VADSegmenter:
+    """
+    Streaming energy/zero-crossing voice activity detector.
+
+    Audio is pushed in arbitrary chunks and cut into fixed frames. The noise floor is
+    calibrated on the first `calibration_ms` and then tracks non-speech frames. An
+    utterance starts after `start_frames` consecutive speech frames (prefixed with
+    `pre_roll_ms` of audio from a ring buffer) and ends after `hangover_ms` of silence,
+    or once it reaches `max_utterance_s`. `on_speech_start()`, if given, is called as
+    soon as an utterance starts (e.g. to stop the assistant talking over the user), and
+    `on_speech(samples)` with the utterance's audio as it arrives (pre-roll first), so it
+    can be transcribed while the user is still talking. Audio is passed to on_speech only
+    once the utterance has `min_speech_ms` of speech, so blips that are later dropped as
+    too short (coughs, clicks) never reach it. With `max_wait_s`, `timed_out` becomes
+    True once that long has passed without an utterance starting (counted from the start
+    of the stream or the end of the previous utterance).
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30, pre_roll_ms: int = 300,
+                 hangover_ms: int = 700, min_speech_ms: int = 250, max_utterance_s: float = 30.0,
+                 energy_margin_db: float = 10.0, zcr_threshold: float = 0.25, calibration_ms: int = 300,
+                 noise_adapt: float = 0.05, start_frames: int = 3, min_energy_db: float = -60.0,
+                 max_wait_s: float = None, on_speech_start=None, on_speech=None):
+        self.sample_rate = sample_rate
+        self.on_speech_start = on_speech_start
+        self.on_speech = on_speech
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_frames = int(max_utterance_s * 1000 / frame_ms)
+        self.max_wait_frames = int(max_wait_s * 1000 / frame_ms) if max_wait_s else None
+        self.calibration_frames = max(1, calibration_ms // frame_ms)
+        self.energy_margin_db = energy_margin_db
+        self.zcr_threshold = zcr_threshold
+        self.noise_adapt = noise_adapt
+        self.start_frames = start_frames
+        self.min_energy_db = min_energy_db
+        self.pre_roll = RingBuffer(int(sample_rate * pre_roll_ms / 1000) + self.frame_len * start_frames)
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+        self._calibration = []
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._utterance = []
+        self._fed = 0
+        self._in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._speech_frames = 0
+        self._waited = 0
+        self.pre_roll.clear()
+
+    def _is_speech(self, energy_db: float, zcr: float) -> bool:
+        if energy_db < self.min_energy_db:
+            return False
+        threshold = self.noise_floor_db + self.energy_margin_db
+        # Unvoiced consonants are quieter but noisy; accept them at a lower energy.
+        return energy_db > threshold or (zcr > self.zcr_threshold and energy_db > threshold - self.energy_margin_db / 2)
+
+    @property
+    def timed_out(self) -> bool:
+        """
+        True once `max_wait_s` has passed with no utterance in progress.
+        """
+        return self.max_wait_frames is not None and not self._in_speech and self._waited >= self.max_wait_frames
+
+    def process(self, chunk: np.ndarray) -> list:
+        """
+        Push a chunk of float32 samples; return the utterances completed by it.
+        """
+        self._pending = np.concatenate((self._pending, np.asarray(chunk, dtype=np.float32).ravel()))
+        n_frames = len(self._pending) // self.frame_len
+        if n_frames == 0:
+            return []
+        frames = self._pending[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        self._pending = self._pending[n_frames * self.frame_len:]
+        energies, zcrs = frame_features(frames)
+
+        utterances = []
+        for frame, energy_db, zcr in zip(frames, energies, zcrs):
+            if not self._in_speech:
+                self._waited += 1
+            if self.noise_floor_db is None:
+                self._calibration.append(energy_db)
+                self.pre_roll.write(frame)
+                if len(self._calibration) >= self.calibration_frames:
+                    self.noise_floor_db = max(float(np.median(self._calibration)), self.min_energy_db)
+                continue
+
+            speech = self._is_speech(energy_db, zcr)
+            if not self._in_speech:
+                self.pre_roll.write(frame)
+                if speech:
+                    self._speech_run += 1
+                    if self._speech_run >= self.start_frames:
+                        self._in_speech = True
+                        self._utterance = [self.pre_roll.read()]
+                        self._speech_frames = self._speech_run
+                        self._silence_run = 0
+                        self._waited = 0
+                        self.pre_roll.clear()
+                        if self.on_speech_start is not None:
+                            self.on_speech_start()
+                else:
+                    self._speech_run = 0
+                    # Track the background level; digital silence must not drag the floor down.
+                    target = max(energy_db, self.min_energy_db)
+                    self.noise_floor_db += self.noise_adapt * (target - self.noise_floor_db)
+                continue
+
+            self._utterance.append(frame)
+            if speech:
+                self._speech_frames += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+            if self._silence_run >= self.hangover_frames or len(self._utterance) >= self.max_frames:
+                self._feed()
+                utterance = self._finish()
+                if utterance is not None:
+                    utterances.append(utterance)
+        if self._in_speech:
+            self._feed()
+        return utterances
+
+    def _feed(self):
+        # Pass on the utterance audio not yet seen by on_speech, once it is long enough.
+        if self.on_speech is None or self._speech_frames < self.min_speech_frames:
+            return
+        if self._fed < len(self._utterance):
+            self.on_speech(np.concatenate(self._utterance[self._fed:]))
+            self._fed = len(self._utterance)
+
+    def _finish(self):
+        audio = np.concatenate(self._utterance) if self._utterance else None
+        long_enough = self._speech_frames >= self.min_speech_frames
+        self._utterance = []
+        self._fed = 0
+        self._in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._speech_frames = 0
+        self._waited = 0
+        return audio if long_enough else None
+
+    def flush(self):
+        """
+        End the stream; return the utterance in progress (if it is long enough).
+        """
+        if not self._in_speech:
+            return None
+        if len(self._pending):
+            self._utterance.append(self._pending)
+            self._feed()
+            self._pending = np.zeros(0, dtype=np.float32)
+        return self._finish()
+
+
+def array_chunks(audio: np.ndarray, chunk_ms: int = 100, sample_rate: int = SAMPLE_RATE):
+    """
+    Yield an array in fixed-size chunks, as a microphone stream would deliver it.
+    """
+    step = int(sample_rate * chunk_ms / 1000)
+    for start in range(0, len(audio), step):
+        yield audio[start:start + step]
+
+
+def microphone_chunks(chunk_ms: int = 100, sample_rate: int = SAMPLE_RATE):
+    """
+    Yield float32 chunks from the default microphone until the generator is closed.
+    """
+    import sounddevice as sd
+    chunks = queue.Queue()
+    blocksize = int(sample_rate * chunk_ms / 1000)
+
+    def callback(indata, frames, time_info, status):
+        chunks.put(indata[:, 0].copy())
+
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype="float32", blocksize=blocksize, callback=callback):
+        while True:
+            yield chunks.get()
+
+
+def iter_utterances(source=None, chunk_ms: int = 100, **vad_options):
+    """
+    Yield each utterance (float32, 16 kHz) as soon as it ends.
+
+    `source` may be a NumPy array, an audio file path, an iterable of chunks, or
+    None for the microphone. With `max_wait_s` (see VADSegmenter), the stream ends
+    once nobody has started speaking for that long.
+    """
+    if source is None:
+        chunks = microphone_chunks(chunk_ms)
+    elif isinstance(source, np.ndarray):
+        chunks = array_chunks(source.astype(np.float32, copy=False), chunk_ms)
+    elif isinstance(source, str):
+        chunks = array_chunks(load_audio(source), chunk_ms)
+    else:
+        chunks = source
+
+    segmenter = VADSegmenter(**vad_options)
+    try:
+        for chunk in chunks:
+            for utterance in segmenter.process(chunk):
+                yield utterance
+            if segmenter.timed_out:
+                return
+        tail = segmenter.flush()
+        if tail is not None:
+            yield tail
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def record_utterance(source=None, **vad_options) -> np.ndarray:
+    """
+    Capture and return the next complete utterance (microphone by default); the array
+    is empty if the source ended, or `max_wait_s` passed, before anyone spoke.
+    """
+    for utterance in iter_utterances(source, **vad_options):
+        return utterance
+    return np.zeros(0, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "recorded_dynamic.wav"
+    audio = load_audio(path)
+    print(f"{path}: {len(audio) / SAMPLE_RATE:.2f}s of audio")
+    for i, utterance in enumerate(iter_utterances(audio)):
+        print(f"Utterance {i + 1}: {len(utterance) / SAMPLE_RATE:.2f}s")
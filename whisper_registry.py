@@ -0,0 +1,240 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from audio_io import load_audio
+from stt_engines import get_engine
+
+# ---------------- Registry Configuration ----------------
+# How many Whisper models (distinct size/device pairs) may stay resident at once, and
+# a memory budget (in MB) across all of them, replicas included. Both can be overridden
+# from the environment. Three leaves room for the STT router's language-ID probe next
+# to the routed model and one escalation size; every worker thread that decodes in
+# parallel adds a replica of each, which only the budget limits. It defaults to half of
+# the machine's memory (4 GB where that is unknown); WHISPER_MEMORY_BUDGET_MB=0 lifts it.
+MAX_RESIDENT_MODELS = int(os.environ.get("WHISPER_MAX_MODELS", "3"))
+
+
+def _default_budget_mb() -> float:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**20 / 2
+    except (AttributeError, ValueError, OSError):
+        return 4096.0
+
+
+MEMORY_BUDGET_MB = float(os.environ.get("WHISPER_MEMORY_BUDGET_MB", "") or _default_budget_mb()) or None
+
+# Short clip used to warm up freshly loaded models.
+WARMUP_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_dynamic.wav")
+
+# Whisper's decoder installs kv-cache hooks on the model for the duration of a call, so
+# one model instance must not decode two inputs at once. Worker threads that transcribe
+# in parallel each use their own replica (see assign_thread_replica).
+_thread_state = threading.local()
+_replica_counter = itertools.count(1)
+
+
+def assign_thread_replica(replica: int = None):
+    """
+    Give the calling thread its own model replica index (pool initializer).
+    """
+    _thread_state.replica = next(_replica_counter) if replica is None else replica
+
+
+def current_replica() -> int:
+    return getattr(_thread_state, "replica", 0)
+
+
+def resolve_device(device=None) -> str:
+    """
+    Resolve the device the shared registry's engine would pick, so "None" and
+    "cuda"/"cpu" share one cache entry.
+    """
+    return registry.engine.resolve_device(device)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models keyed by (model_size, device, replica).
+    Models are loaded by an STT engine (see stt_engines), STT_ENGINE by default.
+
+    Each key is loaded once; later lookups return the resident model. When more than
+    `max_models` size/device pairs are resident, or the combined size of all resident
+    models and replicas exceeds `memory_budget_mb`, the least recently used model (or
+    replica) is evicted.
+    """
+
+    def __init__(self, max_models: int = MAX_RESIDENT_MODELS, memory_budget_mb: float = MEMORY_BUDGET_MB,
+                 engine=None):
+        self.engine = engine or get_engine()
+        self.max_models = max(1, max_models)
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self._models = OrderedDict()  # (size, device, replica) -> (model, bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._use_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_times = {}  # (size, device, replica) -> seconds spent loading the model
+
+    def _key(self, model_size: str, device: str = None, replica: int = None):
+        return (model_size, self.engine.resolve_device(device), current_replica() if replica is None else replica)
+
+    def get(self, model_size: str = "small", device: str = None, replica: int = None):
+        """
+        Return the Whisper model for (model_size, device, replica), loading it on first use.
+        `replica` defaults to the calling thread's replica index.
+        """
+        key = self._key(model_size, device, replica)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; others wait and then reuse it.
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key][0]
+                self.misses += 1
+
+            # The engine imports its backend here: whisper pulls in torch, which would
+            # slow every importer down.
+            print(f"Loading Whisper model '{key[0]}' on {key[1]} ({self.engine.name})...")
+            start = time.perf_counter()
+            model = self.engine.load(key[0], key[1])
+            elapsed = time.perf_counter() - start
+            size_bytes = self.engine.memory_bytes(model)
+            print(f"Loaded Whisper model '{key[0]}' in {elapsed:.2f}s ({size_bytes / 2**20:.0f} MB).")
+
+            with self._lock:
+                self.load_times[key] = elapsed
+                self._models[key] = (model, size_bytes)
+                self._evict_locked()
+            return model
+
+    @contextmanager
+    def use(self, model_size: str = "small", device: str = None, replica: int = None):
+        """
+        Yield the model while holding its lock, so concurrent callers never decode
+        on the same instance at the same time.
+        """
+        key = self._key(model_size, device, replica)
+        with self._lock:
+            use_lock = self._use_locks.setdefault(key, threading.Lock())
+        with use_lock:
+            yield self.get(*key)
+
+    def _evict_locked(self):
+        """
+        Drop least recently used models until the count and memory limits hold.
+        The most recently used model is always kept.
+        """
+        evicted = False
+        while len(self._models) > 1 and (
+            len({key[:2] for key in self._models}) > self.max_models
+            or (self.memory_budget_bytes is not None and self.resident_bytes() > self.memory_budget_bytes)
+        ):
+            key, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            evicted = True
+            print(f"Evicted Whisper model '{key[0]}' on {key[1]}" + (f" (replica {key[2]})." if key[2] else "."))
+        if evicted:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def warm_up(self, model_sizes=("small",), device: str = None, audio_path: str = WARMUP_AUDIO, replica: int = None):
+        """
+        Load each model and run one transcription on a short clip so the first real
+        turn only pays for decoding.
+        """
+        for model_size in model_sizes:
+            with self.use(model_size, device=device, replica=replica) as model:
+                if audio_path and os.path.exists(audio_path):
+                    start = time.perf_counter()
+                    self.engine.transcribe(model, load_audio(audio_path))
+                    print(f"Warmed up Whisper model '{model_size}' in {time.perf_counter() - start:.2f}s.")
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counts, load times and the currently resident models.
+        """
+        def name(key):
+            size, device, replica = key
+            return f"{size}@{device}" + (f"#{replica}" if replica else "")
+
+        with self._lock:
+            return {
+                "engine": self.engine.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident": [name(key) for key in self._models],
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "load_seconds": {name(key): round(t, 3) for key, t in self.load_times.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+# Shared registry used by every transcribe_audio in the project.
+registry = ModelRegistry()
+
+
+def get_model(model_size: str = "small", device: str = None, replica: int = None):
+    """
+    Return a resident Whisper model from the shared registry.
+    """
+    return registry.get(model_size, device=device, replica=replica)
+
+
+def using_model(model_size: str = "small", device: str = None, replica: int = None):
+    """
+    Context manager yielding a resident model with exclusive use (see ModelRegistry.use).
+    """
+    return registry.use(model_size, device=device, replica=replica)
+
+
+def warm_up(model_sizes=("small",), device: str = None, audio_path: str = WARMUP_AUDIO):
+    """
+    Warm up the shared registry (see ModelRegistry.warm_up).
+    """
+    registry.warm_up(model_sizes, device=device, audio_path=audio_path)
+
+
+def warm_up_replicas(executor, workers: int, model_sizes=("small",), device: str = None,
+                     audio_path: str = WARMUP_AUDIO):
+    """
+    Warm up the replicas of every worker thread of `executor` (a pool created with
+    assign_thread_replica as initializer). One job is submitted per worker and each
+    waits at a barrier until all have started, so no worker takes two of them.
+    """
+    barrier = threading.Barrier(workers)
+
+    def job():
+        barrier.wait()
+        registry.warm_up(model_sizes, device=device, audio_path=audio_path)
+
+    for future in [executor.submit(job) for _ in range(workers)]:
+        future.result()
+
+
+def registry_stats() -> dict:
+    return registry.stats()